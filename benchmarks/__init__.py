@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Модули пайплайна лежат в "py_files " и импортируются по имени, как в ноутбуках
+PY_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "py_files ")
+if PY_FILES not in sys.path:
+    sys.path.insert(0, PY_FILES)
@@ -0,0 +1,259 @@
+# run_benchmarks.py
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import inspect
+import importlib.util
+import importlib.metadata
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmarks  # noqa: F401  (добавляет "py_files " в sys.path)
+from headless import set_headless
+from benchmarks.synthetic_city import (
+    SCALES,
+    generate_city,
+    generate_matrix,
+    get_living_population,
+    synthetic_provision,
+    write_living_codes,
+)
+
+# Допустимое замедление стадии относительно базового замера
+REGRESSION_THRESHOLD = 1.2
+
+
+class StageSkipped(Exception):
+    """
+    Стадию нельзя замерить в текущем окружении (нет objectnat или его версия
+    несовместима, слишком большая матрица).
+    """
+
+
+def _objectnat_incompatibility():
+    """
+    Причина, по которой установленный objectnat нельзя вызвать из calculating_provision
+    (get_service_provision принимает adjacency_matrix), или None.
+    """
+    if importlib.util.find_spec("objectnat") is None:
+        return "objectnat не установлен"
+    from objectnat import get_service_provision
+
+    if "adjacency_matrix" not in inspect.signature(get_service_provision).parameters:
+        version = importlib.metadata.version("objectnat")
+        return f"objectnat {version}: get_service_provision не принимает adjacency_matrix"
+    return None
+
+
+def _stage_city_model(state):
+    import city_model_processing
+    city_model_processing.living_codes = None
+    city = state["city"]
+    args = (city["zones"].copy(), city["buildings"].copy(), get_living_population(city), state["living_codes_path"])
+
+    def store(result):
+        state["zones"], state["balanced_buildings"] = result
+    return city_model_processing.process_city_model, args, store
+
+
+def _stage_service_data(state):
+    from service_data_processing import process_service_data
+    city = state["city"]
+    args = (city["school"].copy(), city["kindergarten"].copy(), city["polyclinic"].copy(), state["balanced_buildings"])
+
+    def store(result):
+        state["combined_service"] = result
+    return process_service_data, args, store
+
+
+def _stage_provision(state):
+    # Запасной вариант для следующих стадий, если стадию нельзя замерить
+    state["provision"] = synthetic_provision(state["combined_service"])
+    reason = _objectnat_incompatibility()
+    if reason:
+        raise StageSkipped(reason)
+    from calculating_provision import process_services
+
+    matrix = generate_matrix(state["balanced_buildings"], state["combined_service"])
+    if matrix is None:
+        raise StageSkipped("матрица доступности слишком велика для синтетического замера")
+    args = (matrix, state["combined_service"], state["balanced_buildings"], state["output_path"])
+
+    def store(result):
+        state["provision"] = result
+    return process_services, args, store
+
+
+def _stage_social_infrastructure(state):
+    from social_infrastructure_mapper import process_services
+    school, kindergarten, polyclinic = state["provision"]
+    args = (state["zones"], kindergarten, school, polyclinic)
+
+    def store(result):
+        state["living_zones"] = result
+    return process_services, args, store
+
+
+def _stage_green(state):
+    from green_analytics_1 import calculate_green_analytics
+    city = state["city"]
+    args = (city["green"].copy(), city["park"].copy(), state["living_zones"].copy())
+
+    def store(result):
+        state["living_zones"] = result
+    return calculate_green_analytics, args, store
+
+
+def _stage_density(state):
+    from calculate_density import calculate_density
+
+    def store(result):
+        state["living_zones"] = result
+    return calculate_density, (state["living_zones"].copy(),), store
+
+
+def _stage_potential(state):
+    from calculating_potential_populating import calculate_and_update
+
+    def store(result):
+        state["living_zones"] = result
+    return calculate_and_update, (state["living_zones"].copy(),), store
+
+
+def _stage_total_score(state):
+    from total_score_new_population import analyze_zones
+
+    def store(result):
+        state["zones_0"] = result
+    return analyze_zones, (state["living_zones"].copy(),), store
+
+
+STAGES = [
+    ("process_city_model", _stage_city_model),
+    ("process_service_data", _stage_service_data),
+    ("calculating_provision.process_services", _stage_provision),
+    ("social_infrastructure_mapper.process_services", _stage_social_infrastructure),
+    ("calculate_green_analytics", _stage_green),
+    ("calculate_density", _stage_density),
+    ("calculate_and_update", _stage_potential),
+    ("analyze_zones", _stage_total_score),
+]
+
+
+def measure(func, args, memory=True):
+    """
+    Замер времени выполнения и (вторым прогоном) пикового объёма памяти Python-аллокаций.
+    Вывод функций (print/display) подавляется.
+
+    :return: (result, wall_time_s, peak_memory_mb)
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(*args)
+        wall_time = time.perf_counter() - start
+
+        peak_memory = None
+        if memory:
+            args = tuple(arg.copy() if hasattr(arg, "copy") else arg for arg in args)
+            tracemalloc.start()
+            func(*args)
+            peak_memory = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+
+    return result, wall_time, peak_memory
+
+
+def run_scale(scale, seed=0, memory=True):
+    """
+    Прогон всех стадий пайплайна на синтетическом городе одного масштаба.
+    Ошибка стадии прерывает замер: синтетический город должен проходить все стадии.
+    """
+    set_headless(True)
+    n_buildings = SCALES[scale]
+    city = generate_city(n_buildings, seed=seed)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state = {"city": city, "living_codes_path": write_living_codes(tmp), "output_path": tmp}
+        for name, stage in STAGES:
+            record = {"scale": scale, "n_buildings": n_buildings, "n_zones": len(city["zones"]), "stage": name}
+            try:
+                func, args, store = stage(state)
+                result, wall_time, peak_memory = measure(func, args, memory)
+                store(result)
+                record.update(status="ok", wall_time_s=round(wall_time, 4),
+                              peak_memory_mb=None if peak_memory is None else round(peak_memory, 2))
+            except StageSkipped as e:
+                record.update(status="skipped", error=str(e))
+            except Exception as e:
+                raise RuntimeError(f"❌ Стадия {name} упала на масштабе {scale} (seed={seed})") from e
+            print(f"{scale:>5} | {name:<48} | {record['status']:<7} | "
+                  f"{record.get('wall_time_s', '-')} s | {record.get('peak_memory_mb', '-')} MB")
+            results.append(record)
+    return results
+
+
+def compare(results, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """
+    Сравнение с базовым JSON: стадии, замедлившиеся более чем в threshold раз.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scale"], r["stage"]): r for r in json.load(f)["results"] if r["status"] == "ok"}
+
+    regressions = []
+    for record in results:
+        base = baseline.get((record["scale"], record["stage"]))
+        if base is None or record["status"] != "ok" or not base["wall_time_s"]:
+            continue
+        ratio = record["wall_time_s"] / base["wall_time_s"]
+        if ratio > threshold:
+            regressions.append({**record, "baseline_wall_time_s": base["wall_time_s"], "ratio": round(ratio, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности стадий пайплайна на синтетическом городе")
+    parser.add_argument("--scales", nargs="+", default=["1k", "10k"], choices=list(SCALES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--no-memory", action="store_true", help="не замерять пиковую память (без второго прогона)")
+    parser.add_argument("--baseline", help="JSON предыдущего замера для поиска регрессий")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        results += run_scale(scale, seed=args.seed, memory=not args.no_memory)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Результаты сохранены: {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline)
+        for r in regressions:
+            print(f"⚠️ Регрессия: {r['scale']} {r['stage']}: {r['baseline_wall_time_s']} -> {r['wall_time_s']} s (x{r['ratio']})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# synthetic_city.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Масштабы синтетического города (число зданий)
+SCALES = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+# Проекция построения (UTM 37N, как в модулях пайплайна) и центр города (Ярославль)
+BUILD_CRS = "EPSG:32637"
+CENTER = (39.87, 57.63)
+
+ZONE_SIZE = 250          # сторона квартала, м
+BUILDINGS_PER_ZONE = 40
+LIVING_SHARE = 0.75      # доля жилых кварталов
+LIVING_CODES = ["Ж.1", "Ж.2", "Ж.3", "Ж.4", "ОЖ", "ОД", "Ц.1", "Ц.2", "Ц.3"]
+OTHER_CODES = ["П.1", "П.2", "Р.1", "МЦ", "ДУ", "СЦ"]
+CITY_MODELS = ["medium", "low_rise", "central"]
+
+# Число жителей на здание, зданий на один сервис и минимум сервисов каждого типа
+# (в малом городе сервисы должны перекрывать жилые кварталы, иначе analyze_zones
+# не получает зон для оценки)
+PEOPLE_PER_BUILDING = 8
+BUILDINGS_PER_SERVICE = {"school": 700, "kindergarten": 400, "polyclinic": 2500}
+MIN_SERVICES = 8
+WALK_SPEED = 5000 / 60   # м/мин
+MAX_MATRIX_CELLS = 50_000_000
+
+# Доля сервисов без свободных мест в synthetic_provision
+FULL_LOAD_SHARE = 0.05
+
+
+def _grid(n_zones):
+    side = int(np.ceil(np.sqrt(n_zones)))
+    cx, cy = gpd.GeoSeries.from_xy([CENTER[0]], [CENTER[1]], crs=4326).to_crs(BUILD_CRS).iloc[0].coords[0]
+    origin = np.array([cx, cy]) - side * ZONE_SIZE / 2
+    ix, iy = np.divmod(np.arange(n_zones), side)
+    return origin[0] + ix * ZONE_SIZE, origin[1] + iy * ZONE_SIZE
+
+
+def generate_city(n_buildings, seed=0):
+    """
+    Синтетический город заданного масштаба: зоны ПЗЗ, здания, сервисы и зелёные зоны.
+
+    :param n_buildings: int — число зданий
+    :param seed: int — зерно генератора (одинаковое зерно даёт одинаковый город)
+    :return: dict — {имя слоя: GeoDataFrame в EPSG:4326}
+    """
+    rng = np.random.default_rng(seed)
+    n_zones = max(16, n_buildings // BUILDINGS_PER_ZONE)
+
+    # Зоны: регулярная сетка кварталов
+    zx, zy = _grid(n_zones)
+    is_living = rng.random(n_zones) < LIVING_SHARE
+    code_pzz = np.where(is_living, rng.choice(LIVING_CODES, n_zones), rng.choice(OTHER_CODES, n_zones))
+    city_model = rng.choice(CITY_MODELS, n_zones, p=[0.5, 0.35, 0.15]).astype(object)
+    city_model[rng.random(n_zones) < 0.1] = None
+    zones = gpd.GeoDataFrame(
+        {"code_pzz": code_pzz, "city_model": city_model},
+        geometry=shapely.box(zx, zy, zx + ZONE_SIZE, zy + ZONE_SIZE),
+        crs=BUILD_CRS,
+    )
+
+    # Здания: прямоугольники внутри случайных кварталов
+    zone_idx = rng.integers(0, n_zones, n_buildings)
+    width = rng.uniform(10, 40, n_buildings)
+    height = rng.uniform(10, 40, n_buildings)
+    bx = zx[zone_idx] + rng.uniform(0, ZONE_SIZE - width)
+    by = zy[zone_idx] + rng.uniform(0, ZONE_SIZE - height)
+    floors = rng.integers(1, 17, n_buildings).astype(float)
+    floors[rng.random(n_buildings) < 0.05] = np.nan
+    buildings = gpd.GeoDataFrame(
+        {"is_living": (rng.random(n_buildings) < 0.7).astype(int), "number_of_floors": floors},
+        geometry=shapely.box(bx, by, bx + width, by + height),
+        crs=BUILD_CRS,
+    )
+
+    # Сервисы: точки внутри зданий и немного точек вне зданий
+    layers = {"zones": zones, "buildings": buildings}
+    for service_type, per_service in BUILDINGS_PER_SERVICE.items():
+        count = max(MIN_SERVICES, n_buildings // per_service)
+        idx = rng.integers(0, n_buildings, count)
+        points = buildings.geometry.iloc[idx].centroid.to_numpy()
+        outside = rng.random(count) < 0.2
+        points[outside] = shapely.points(bx[idx][outside] - 15, by[idx][outside] - 15)
+        layers[service_type] = gpd.GeoDataFrame({"type": [service_type] * count}, geometry=points, crs=BUILD_CRS)
+
+    # Зелёные зоны и парки: полигоны на части нежилых кварталов
+    for name, share in (("green", 0.15), ("park", 0.03)):
+        idx = rng.choice(n_zones, max(2, int(n_zones * share)), replace=False)
+        size = rng.uniform(0.3, 0.9, len(idx)) * ZONE_SIZE
+        layers[name] = gpd.GeoDataFrame(
+            {"name": [f"{name}_{i}" for i in range(len(idx))]},
+            geometry=shapely.box(zx[idx], zy[idx], zx[idx] + size, zy[idx] + size),
+            crs=BUILD_CRS,
+        )
+
+    return {name: gdf.to_crs(4326) for name, gdf in layers.items()}
+
+
+def get_living_population(city):
+    return len(city["buildings"]) * PEOPLE_PER_BUILDING
+
+
+def write_living_codes(folder):
+    """
+    Запись living_codes.json для синтетического города.
+    """
+    path = os.path.join(folder, "living_codes.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"living_codes": LIVING_CODES}, f, ensure_ascii=False)
+    return path
+
+
+def generate_matrix(buildings, services):
+    """
+    Матрица времени в пути здания -> сервисы (мин) по евклидову расстоянию.
+    Для слишком больших городов возвращает None.
+    """
+    if len(buildings) * len(services) > MAX_MATRIX_CELLS:
+        return None
+    b = buildings.to_crs(BUILD_CRS).geometry.centroid
+    s = services.to_crs(BUILD_CRS).geometry.centroid
+    dx = b.x.to_numpy()[:, None] - s.x.to_numpy()[None, :]
+    dy = b.y.to_numpy()[:, None] - s.y.to_numpy()[None, :]
+    times = (np.hypot(dx, dy) / WALK_SPEED).astype(np.float32)
+    return pd.DataFrame(times, index=buildings.index, columns=services.index)
+
+
+def synthetic_provision(combined_service, seed=0):
+    """
+    Слои обеспеченности (как результат calculating_provision.process_services)
+    со случайной загрузкой сервисов — для замеров стадий без objectnat.
+
+    :return: кортеж GeoDataFrame: (school, kindergarten, polyclinic)
+    """
+    rng = np.random.default_rng(seed)
+    result = []
+    for service_type in ("school", "kindergarten", "polyclinic"):
+        services = combined_service[combined_service["type"] == service_type].copy()
+        capacity = services["capacity"].fillna(0).to_numpy()
+        within = np.floor(capacity * rng.uniform(0, 1, len(services)))
+        services["carried_capacity_within"] = within
+        services["carried_capacity_without"] = np.where(rng.random(len(services)) < FULL_LOAD_SHARE, 0, capacity - within)
+        result.append(services)
+    return tuple(result)
@@ -0,0 +1,261 @@
+# batch_runner.py
+
+import os
+import logging
+import re
+import glob
+import json
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from instrumentation import collect, instrument, recorded
+
+# Порог времени для матрицы доступности (мин), как в 02_house_analysis
+MATRIX_THRESHOLD = 45
+
+# Слои, без которых расчёт города невозможен
+REQUIRED_LAYERS = ["buildings", "zones", "school", "kindergarten", "polyclinic", "green", "park"]
+# Прочие обязательные файлы папки города
+REQUIRED_FILES = ["required_columns.json", "living_codes.json"]
+
+
+def discover_city_folders(root):
+    """
+    Поиск папок городов вида data_N в корне проекта.
+    """
+    folders = [p for p in glob.glob(os.path.join(root, "data_*")) if os.path.isdir(p)]
+    return sorted(folders, key=lambda p: int(re.sub(r"\D", "", os.path.basename(p)) or 0))
+
+
+def get_result_folder(root, folder):
+    """
+    Папка результатов для города: data_N -> result/data_result_N.
+    """
+    suffix = os.path.basename(os.path.normpath(folder)).split("_", 1)[1]
+    return os.path.join(root, "result", f"data_result_{suffix}")
+
+
+def validate_city_folder(folder):
+    """
+    Проверка наличия обязательных файлов города до загрузки слоёв.
+
+    :param folder: str — папка города data_N
+    :raises FileNotFoundError: если каких-либо файлов нет
+    """
+    names = REQUIRED_FILES + [f"{name}.geojson" for name in REQUIRED_LAYERS]
+    missing = [name for name in names if not os.path.exists(os.path.join(folder, name))]
+    if missing:
+        raise FileNotFoundError(f"В папке {folder} отсутствуют файлы: {', '.join(missing)}")
+
+
+def load_living_population(folder, default=None):
+    """
+    Численность населения из city_params.json папки города или значение по умолчанию.
+    """
+    path = os.path.join(folder, "city_params.json")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["living_population"]
+    if default is None:
+        raise ValueError(f"Не задана численность населения: нет {path} и параметра --living-population")
+    return default
+
+
+def load_matrix(folder, balanced_buildings, combined_service):
+    """
+    Матрица доступности здания -> сервисы: matrix.csv из папки города
+    или построение по интермодальному графу objectnat.
+    """
+    path = os.path.join(folder, "matrix.csv")
+    if os.path.exists(path):
+        matrix = pd.read_csv(path, index_col=0)
+    else:
+        from shapely.ops import unary_union
+        from objectnat import get_adj_matrix_gdf_to_gdf, get_intermodal_graph
+
+        services = combined_service.to_crs(4326)
+        buildings = balanced_buildings.to_crs(4326)
+        polygon = unary_union(buildings.geometry.tolist() + services.geometry.tolist()).convex_hull.buffer(0.001)
+        graph = get_intermodal_graph(polygon=polygon, clip_by_bounds=True)
+        matrix = get_adj_matrix_gdf_to_gdf(
+            gdf_from=balanced_buildings,
+            gdf_to=combined_service,
+            nx_graph=graph,
+            weight="time_min",
+            threshold=MATRIX_THRESHOLD
+        )
+        matrix.to_csv(path)
+
+    matrix.index = matrix.index.astype(int)
+    matrix.columns = matrix.columns.astype(int)
+    return matrix
+
+
+def score_stats(df):
+    """
+    Сводная статистика total_score (как в 03_data_df_analysis).
+    """
+    return {
+        "Кол-во объектов": len(df),
+        "Среднее": round(df["total_score"].mean(), 2),
+        "Ст. отклонение": round(df["total_score"].std(), 2),
+        "Кол-во > 0": (df["total_score"] > 0).sum(),
+        "Кол-во < 0": (df["total_score"] < 0).sum(),
+        "Кол-во = 0": (df["total_score"] == 0).sum()
+    }
+
+
+def city_model_stats(df):
+    """
+    Статистика total_score по типам городской среды (как в 03_data_df_analysis).
+    """
+    grouped = df.groupby("city_model")["total_score"]
+    return pd.DataFrame({
+        "Кол-во объектов": grouped.count(),
+        "Среднее": grouped.mean().round(2),
+        "Ст. отклонение": grouped.std().round(2),
+        "Кол-во > 0": grouped.apply(lambda x: (x > 0).sum()),
+        "Кол-во = 0": grouped.apply(lambda x: (x == 0).sum()),
+        "Кол-во < 0": grouped.apply(lambda x: (x < 0).sum())
+    }).reset_index()
+
+
+@instrument
+def run_city(folder, result_folder, living_population):
+    """
+    Полный расчёт для одного города: модель города, сервисы, обеспеченность,
+    озеленение, плотность, потенциал населения и итоговые оценки.
+
+    :return: dict — статистика по zones_0 и zones_dop
+    """
+    from headless import set_headless
+    set_headless(True)
+
+    import city_model_processing
+    from check_geojson import check_geojson
+    from service_data_processing import process_service_data
+    from calculating_provision import process_services as process_provision
+    from social_infrastructure_mapper import process_services
+    from green_analytics_1 import calculate_green_analytics
+    from calculate_density import calculate_density
+    from calculating_potential_populating import calculate_and_update
+    from total_score_new_population import analyze_zones, save_to_geojson
+    from total_score_new_population_dop import analyze_zones as analyze_zones_dop
+
+    validate_city_folder(folder)
+    data = check_geojson(folder)
+
+    os.makedirs(result_folder, exist_ok=True)
+
+    # Коды жилых зон кэшируются в модуле — сбрасываем их для каждого города
+    city_model_processing.living_codes = None
+    zones, balanced_buildings = city_model_processing.process_city_model(
+        data["zones"], data["buildings"], living_population,
+        living_codes_path=os.path.join(folder, "living_codes.json")
+    )
+
+    combined_service = process_service_data(data["school"], data["kindergarten"], data["polyclinic"], balanced_buildings)
+    matrix = load_matrix(folder, balanced_buildings, combined_service)
+    school, kindergarten, polyclinic = process_provision(matrix, combined_service, balanced_buildings, result_folder)
+
+    living_zones = process_services(zones, kindergarten, school, polyclinic)
+    living_zones = calculate_green_analytics(data["green"], data["park"], living_zones)
+    living_zones = calculate_density(living_zones)
+    living_zones = calculate_and_update(living_zones)
+
+    zones_0 = analyze_zones(living_zones)
+    zones_dop = analyze_zones_dop(living_zones)
+
+    save_to_geojson(zones_0, os.path.join(result_folder, "zones_0.geojson"))
+    save_to_geojson(zones_dop, os.path.join(result_folder, "zones_dop.geojson"))
+
+    model_stats = pd.merge(city_model_stats(zones_dop), city_model_stats(zones_0),
+                           on="city_model", suffixes=("_dop", "_0"))
+    return {
+        "zones_0": score_stats(zones_0),
+        "zones_dop": score_stats(zones_dop),
+        "city_model_stats": model_stats.to_dict("records"),
+    }
+
+
+def _run_city_safe(folder, result_folder, living_population):
+    try:
+        return {"status": "ok", **run_city(folder, result_folder, living_population)}
+    except Exception as e:
+        return {"status": "error", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+
+
+def run_batch(root, living_population=None, max_workers=None):
+    """
+    Пакетный расчёт всех городов data_N в пуле процессов.
+    Ошибка в одном городе не прерывает расчёт остальных.
+
+    :param root: str — корень проекта с папками data_N и result
+    :param living_population: int — численность населения, если в папке нет city_params.json
+    :param max_workers: int — число процессов
+    :return: (score_summary, city_model_summary) — сводные таблицы по городам
+    """
+    folders = discover_city_folders(root)
+    print(f"🔹 Найдено городов: {len(folders)}")
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for folder in folders:
+            city = os.path.basename(folder)
+            try:
+                validate_city_folder(folder)
+                population = load_living_population(folder, living_population)
+            except (FileNotFoundError, ValueError) as e:
+                results[city] = {"status": "error", "error": str(e)}
+                continue
+            future = executor.submit(recorded(_run_city_safe), folder, get_result_folder(root, folder), population)
+            futures[future] = city
+
+        for future in as_completed(futures):
+            city = futures[future]
+            results[city] = collect(future.result())
+            if results[city]["status"] == "ok":
+                print(f"✅ {city}: расчёт завершён")
+            else:
+                print(f"⚠️ {city}: ошибка — {results[city]['error']}")
+
+    score_rows, model_rows = [], []
+    for city in sorted(results):
+        result = results[city]
+        if result["status"] != "ok":
+            score_rows.append({"city": city, "status": result["status"], "error": result["error"]})
+            continue
+        for variant in ("zones_0", "zones_dop"):
+            score_rows.append({"city": city, "status": "ok", "variant": variant, **result[variant]})
+        model_rows += [{"city": city, **row} for row in result["city_model_stats"]]
+
+    score_summary = pd.DataFrame(score_rows)
+    city_model_summary = pd.DataFrame(model_rows)
+
+    result_root = os.path.join(root, "result")
+    os.makedirs(result_root, exist_ok=True)
+    score_summary.to_csv(os.path.join(result_root, "summary_score_stats.csv"), index=False)
+    city_model_summary.to_csv(os.path.join(result_root, "summary_city_model_stats.csv"), index=False)
+
+    return score_summary, city_model_summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный расчёт оценки территорий по папкам data_N")
+    parser.add_argument("--root", default=os.getcwd(), help="корень проекта с папками data_N")
+    parser.add_argument("--living-population", type=int, default=None,
+                        help="численность населения для городов без city_params.json")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    score_summary, _ = run_batch(args.root, args.living_population, args.workers)
+    print(score_summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,37 @@
 import geopandas as gpd
 import pandas as pd
-from IPython.display import display
 
+from headless import display
+
+from instrumentation import instrument
+
+# Лимиты плотности (в чел/м²)
+DENSITY_LIMITS = {
+    "low_rise": 0.008,   # 80 чел/га
+    "medium":   0.035,   # 350 чел/га
+    "central":  0.045    # 450 чел/га
+}
+
+
+def density_columns(city_model: pd.Series, sum_population: pd.Series, area_zone: pd.Series) -> pd.DataFrame:
+    """
+    Лимит, фактическая плотность населения и дефицит плотности зон.
+
+    :param city_model: pd.Series — тип городской среды
+    :param sum_population: pd.Series — население зоны
+    :param area_zone: pd.Series — площадь зоны (м²)
+    :return: DataFrame с колонками limit_density, area_zone, density_population, deficit_density
+    """
+    limit_density = city_model.map(DENSITY_LIMITS)
+    density_population = sum_population / area_zone
+    return pd.DataFrame({
+        "limit_density": limit_density,
+        "area_zone": area_zone,
+        "density_population": density_population,
+        "deficit_density": limit_density - density_population,
+    })
+
+@instrument
 def calculate_density(living_zones: gpd.GeoDataFrame, crs_epsg: int = 32637) -> gpd.GeoDataFrame:
     """
     Расчёт плотности населения и дефицита плотности для жилых зон.
@@ -21,17 +51,10 @@ def calculate_density(living_zones: gpd.GeoDataFrame, crs_epsg: int = 32637) ->
 
     print(f"[DEBUG] Текущая CRS: {living_zones.crs}")
 
-    # Лимиты плотности (в чел/м²)
-    density_limits = {
-        "low_rise": 0.008,   # 80 чел/га
-        "medium":   0.035,   # 350 чел/га
-        "central":  0.045    # 450 чел/га
-    }
-
-    living_zones["limit_density"] = living_zones["city_model"].map(density_limits)
-    living_zones["area_zone"] = living_zones.geometry.area
-    living_zones["density_population"] = living_zones["sum_population"] / living_zones["area_zone"]
-    living_zones["deficit_density"] = living_zones["limit_density"] - living_zones["density_population"]
+    density = density_columns(living_zones["city_model"], living_zones["sum_population"],
+                              living_zones.geometry.area)
+    for col in density.columns:
+        living_zones[col] = density[col]
 
     display(living_zones[[
         "city_model", "area_zone", "sum_population", "density_population",
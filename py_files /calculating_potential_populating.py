@@ -2,6 +2,9 @@ import geopandas as gpd
 import pandas as pd
 import numpy as np
 
+from headless import is_headless
+from instrumentation import instrument
+
 def calculate_population(row):
     """
     Расчёт возможного нового населения и потребности в дополнительной социальной инфраструктуре.
@@ -42,6 +45,7 @@ def calculate_population(row):
     return pd.Series([new_population, new_population_dop, need_dop_service])
 
 
+@instrument
 def calculate_and_update(living_zones):
     """
     Расчёт и перезапись значений в столбцах на основе определённых условий.
@@ -85,6 +89,9 @@ def visualize_by_need_service(living_zones):
     if not isinstance(living_zones, gpd.GeoDataFrame):
         raise ValueError("Input must be a GeoDataFrame")
 
+    if is_headless():
+        return
+
     # Дополнительная фильтрация перед визуализацией
     living_zones.loc[living_zones["new_population_dop"] == 0, "need_dop_service"] = "no feasible service placement"
 
@@ -1,9 +1,23 @@
 import os
 import geopandas as gpd
 import pandas as pd
-from objectnat import get_service_provision, clip_provision
 
-def process_services(matrix, combined_service, balanced_buildings, output_path):
+from id_scheme import format_id_columns, parse_id_columns
+from instrumentation import instrument, stage
+
+# Перевод увеличенного радиуса буфера в порог времени матрицы (м/мин)
+THRESHOLD_SPEED = 50
+
+
+def get_buffer_threshold(services):
+    """
+    Порог времени (мин) для сервисов одного типа: средний увеличенный буфер / 50.
+    """
+    return int((services["buffer_zone"] * 1.2).mean()) // THRESHOLD_SPEED
+
+
+@instrument
+def process_services(matrix, combined_service, balanced_buildings, output_path, thresholds=None):
     """
     Обрабатывает данные обеспеченности по разным типам сервисов, 
     рассчитывает покрытие, делает clip и сохраняет результаты.
@@ -12,8 +26,10 @@ def process_services(matrix, combined_service, balanced_buildings, output_path):
     :param combined_service: GeoDataFrame — объединённый слой с сервисами
     :param buildings: GeoDataFrame — здания с населением
     :param output_path: str — путь к директории, куда будут сохранены выходные файлы
+    :param thresholds: dict — пороги времени по типам сервисов (по умолчанию get_buffer_threshold)
     :return: кортеж GeoDataFrame: (school, kindergarten, polyclinic)
     """
+    from objectnat import get_service_provision, clip_provision
 
     # --- Подготовка зданий ---
     adjacency_matrix = matrix
@@ -50,15 +66,19 @@ def process_services(matrix, combined_service, balanced_buildings, output_path):
             services["capacity"] = services["non_living_area"]
         services["demand"] = services["capacity"]
 
-        buffer_threshold = int(services["adjusted_buffer"].mean()) // 50
+        if thresholds and service_type in thresholds:
+            buffer_threshold = thresholds[service_type]
+        else:
+            buffer_threshold = get_buffer_threshold(services)
         print(f"📏 Threshold: {buffer_threshold}")
 
-        build_prov, services_prov, links_prov = get_service_provision(
-            buildings=cleaned_buildings,
-            services=services,
-            adjacency_matrix=adjacency_matrix,
-            threshold=buffer_threshold
-        )
+        with stage(f"get_service_provision.{service_type}", len(services)):
+            build_prov, services_prov, links_prov = get_service_provision(
+                buildings=cleaned_buildings,
+                services=services,
+                adjacency_matrix=adjacency_matrix,
+                threshold=buffer_threshold
+            )
 
         print(f"🏥 Сервисов до clip: {len(services_prov)}")
 
@@ -66,14 +86,15 @@ def process_services(matrix, combined_service, balanced_buildings, output_path):
         to_clip_gdf["geometry"] = to_clip_gdf.geometry.buffer(int(services["adjusted_buffer"].mean()))
         to_clip_gdf = to_clip_gdf.to_crs(combined_crs)
 
-        build_prov_clipped, services_prov_clipped, links_prov_clipped = clip_provision(
-            build_prov, services_prov, links_prov, to_clip_gdf
-        )
+        with stage(f"clip_provision.{service_type}", len(services_prov)):
+            build_prov_clipped, services_prov_clipped, links_prov_clipped = clip_provision(
+                build_prov, services_prov, links_prov, to_clip_gdf
+            )
 
         print(f"✂️ Сервисов после clip: {len(services_prov_clipped)}")
 
         services_file = os.path.join(output_path, f"{service_type}_services_prov_CLIPPED.geojson")
-        services_prov_clipped.to_file(services_file, driver="GeoJSON")
+        format_id_columns(services_prov_clipped).to_file(services_file, driver="GeoJSON")
         print(f"✅ Сохранено: {services_file}")
 
         clipped_proj = services_prov_clipped.to_crs(projected_crs)
@@ -82,7 +103,7 @@ def process_services(matrix, combined_service, balanced_buildings, output_path):
         centroids = centroids.to_crs(combined_crs)
 
         centroid_file = os.path.join(output_path, f"{service_type}_services_centroids_CLIPPED.geojson")
-        centroids.to_file(centroid_file, driver="GeoJSON")
+        format_id_columns(centroids).to_file(centroid_file, driver="GeoJSON")
         print(f"📍 Центроиды сохранены: {centroid_file}")
 
     # --- Загрузка центроидов для ключевых типов ---
@@ -93,7 +114,7 @@ def process_services(matrix, combined_service, balanced_buildings, output_path):
         centroid_file = os.path.join(output_path, f"{service_type}_services_centroids_CLIPPED.geojson")
 
         if os.path.exists(centroid_file):
-            gdf = gpd.read_file(centroid_file)
+            gdf = parse_id_columns(gpd.read_file(centroid_file))
             centroid_vars[service_type] = gdf
             print(f"📥 Загружено: {service_type} — {len(gdf)} объектов")
         else:
@@ -1,9 +1,116 @@
 import os
-import geopandas as gpd
 import json
-def check_geojson(folder):
-    layers = ["boundary", "buildings", "zones", "school", "polyclinic", "kindergarten", "green", "park"]
-    
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import geopandas as gpd
+
+from instrumentation import instrument
+
+try:
+    import pyogrio
+except ImportError:  # без pyogrio схема читается по первой строке слоя
+    pyogrio = None
+
+LAYERS = ["boundary", "buildings", "zones", "school", "polyclinic", "kindergarten", "green", "park"]
+
+# Кэш загруженных слоёв: {папка: {слой: ((mtime_ns, size), GeoDataFrame)}}
+_layer_cache = {}
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_layer_columns(path):
+    """
+    Чтение только схемы слоя (список атрибутивных столбцов) без загрузки геометрий.
+    """
+    if pyogrio is not None:
+        return list(pyogrio.read_info(path)["fields"])
+    return list(gpd.read_file(path, rows=1).columns)
+
+
+def validate_layer_columns(name, columns, columns_info):
+    """
+    Проверка наличия обязательных и рекомендуемых столбцов слоя.
+    Возвращает True, если все обязательные столбцы на месте.
+    """
+    missing_required = [col for col in columns_info.get(name, {}).get('required', []) if col not in columns]
+    if missing_required:
+        print(f"Ошибка: в слое '{name}' отсутствуют обязательные столбцы: {', '.join(missing_required)}")
+
+    missing_recommended = [col for col in columns_info.get(name, {}).get('recommended', []) if col not in columns]
+    if missing_recommended:
+        print(f"Предупреждение: в слое '{name}' отсутствуют рекомендуемые столбцы: {', '.join(missing_recommended)}")
+
+    return not missing_required
+
+
+def valid_geometry_mask(gdf):
+    """
+    Векторная маска корректных геометрий: не пустые, не null и is_valid.
+    """
+    geometry = gdf.geometry
+    not_null = geometry.notna().to_numpy()
+    mask = not_null.copy()
+    mask[not_null] = ~geometry[not_null].is_empty.to_numpy() & geometry[not_null].is_valid.to_numpy()
+    return mask
+
+
+def filter_valid_geometries(gdf, name=None):
+    """
+    Удаление пустых, null и невалидных геометрий за один векторный проход.
+    """
+    mask = valid_geometry_mask(gdf)
+    dropped = int((~mask).sum())
+    if dropped and name:
+        print(f"Предупреждение: в слое '{name}' удалено некорректных геометрий: {dropped}")
+    return gdf[mask]
+
+
+def load_layer(folder, name):
+    """
+    Загрузка слоя с кэшированием по времени изменения и размеру файла.
+    Возвращает копию, чтобы изменения в пайплайне не портили кэш.
+    """
+    folder = os.path.abspath(folder)
+    path = os.path.join(folder, f"{name}.geojson")
+    key = _file_key(path)
+
+    cached = _layer_cache.get(folder, {}).get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1].copy()
+
+    gdf = gpd.read_file(path)
+    _layer_cache.setdefault(folder, {})[name] = (key, gdf)
+    return gdf.copy()
+
+
+def clear_layer_cache(folder=None):
+    """
+    Очистка кэша слоёв для одной папки или целиком.
+    """
+    if folder is None:
+        _layer_cache.clear()
+    else:
+        _layer_cache.pop(os.path.abspath(folder), None)
+
+
+@instrument
+def check_geojson(folder, load=True, max_workers=None):
+    """
+    Проверка слоёв проекта и их загрузка.
+
+    Проверка столбцов выполняется только по схеме файлов (без чтения геометрий),
+    загрузка слоёв — параллельно в пуле потоков с кэшем неизменённых файлов.
+
+    :param folder: str — папка с required_columns.json и слоями
+    :param load: bool — загружать ли слои после проверки схемы
+    :param max_workers: int — число потоков для загрузки (по умолчанию — по числу слоёв)
+    :return: dict — {имя слоя: GeoDataFrame} (пустой при load=False)
+    """
     required_columns_path = os.path.join(folder, 'required_columns.json')
     if not os.path.exists(required_columns_path):
         print(f"Ошибка: файл {required_columns_path} не найден")
@@ -12,22 +119,25 @@ def check_geojson(folder):
     with open(required_columns_path, 'r', encoding='utf-8') as f:
         columns_info = json.load(f)
 
-    data = {}  # Храним GeoDataFrame тут
-
-    for name in layers:
+    available = []
+    for name in LAYERS:
         path = os.path.join(folder, f"{name}.geojson")
         if os.path.exists(path):
-            gdf = gpd.read_file(path)
-            data[name] = gdf
-
-            missing_required = [col for col in columns_info.get(name, {}).get('required', []) if col not in gdf.columns]
-            if missing_required:
-                print(f"Ошибка: в слое '{name}' отсутствуют обязательные столбцы: {', '.join(missing_required)}")
-
-            missing_recommended = [col for col in columns_info.get(name, {}).get('recommended', []) if col not in gdf.columns]
-            if missing_recommended:
-                print(f"Предупреждение: в слое '{name}' отсутствуют рекомендуемые столбцы: {', '.join(missing_recommended)}")
+            validate_layer_columns(name, read_layer_columns(path), columns_info)
+            available.append(name)
         else:
             print(f"Ошибка: файл {path} не найден")
 
+    if not load or not available:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(available)) as executor:
+        frames = executor.map(lambda name: load_layer(folder, name), available)
+        data = dict(zip(available, frames))
+
+    for name, gdf in data.items():
+        invalid = int(np.count_nonzero(~valid_geometry_mask(gdf)))
+        if invalid:
+            print(f"Предупреждение: в слое '{name}' некорректных геометрий (пустые, null, невалидные): {invalid}")
+
     return data
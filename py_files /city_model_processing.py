@@ -2,13 +2,15 @@ import pandas as pd
 import geopandas as gpd
 import numpy as np
 import json
-from objectnat import get_balanced_buildings
 import logging
 from shapely.geometry import Polygon
 from shapely.errors import TopologicalError
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from id_scheme import make_ids
+from instrumentation import instrument, stage
+from population_balancing import get_balanced_buildings
+
+logger = logging.getLogger(__name__)
 
 # Системы координат
 AREA_CRS = "EPSG:3857"  # Web Mercator (метры, используется в онлайн-картах)
@@ -16,88 +18,107 @@ GEO_CRS = "EPSG:4326"   # Географическая система (град
 
 living_codes = None  # Глобально
 
+# Коды зон, для которых city_model заполняется по соседним зонам
+TARGET_CODES = {"МЦ", "ДУ", "ДС", "ЖР", "Р.1", "Р.2", "Р.3", "СЦ", "УЦ", "П.5", "П.6", "П.7"}
+CITY_MODELS = {"medium", "low_rise", "central"}
+
 def load_living_codes(file_path="living_codes.json"):
     with open(file_path, "r", encoding="utf-8") as f:
         data = json.load(f)
     return set(data.get("living_codes", []))
 
+def get_neighbor_zones(zones):
+    """
+    Зоны с заданной city_model — источники для заполнения (в порядке просмотра).
+    """
+    neighbor_zone = zones[zones["city_model"].notnull() & (zones["city_model"] != "")]
+    neighbor_zone = neighbor_zone[neighbor_zone["city_model"].isin(CITY_MODELS)]
+    return neighbor_zone.sort_values("geometry", ascending=False).reset_index(drop=True)
+
+def find_neighbor(geometry, neighbor_zone):
+    """
+    Индекс зоны-источника city_model: первая соседняя зона в пределах 20 единиц СК,
+    иначе — ближайшая по центроиду.
+    """
+    buffer_geom = geometry.buffer(20)
+    buffer_matches = neighbor_zone.index[neighbor_zone.geometry.intersects(buffer_geom)]
+
+    if len(buffer_matches):
+        return buffer_matches[0]
+
+    dists = neighbor_zone.geometry.centroid.distance(geometry.centroid)
+    return dists.idxmin()
+
+@instrument
 def add_zone_attributes(zones, living_codes):
     zones = zones.to_crs(GEO_CRS)
     zones["is_living_zones"] = zones["code_pzz"].isin(living_codes)
-    zones["id_zones"] = ["1." + str(i + 1) for i in range(len(zones))]
+    zones["id_zones"] = make_ids(zones, "zones")
 
     # Внедряем код city_model_service_from_gdf
-    TARGET_CODES = {"МЦ", "ДУ", "ДС", "ЖР", "Р.1", "Р.2", "Р.3", "СЦ", "УЦ", "П.5", "П.6", "П.7"}
     CITY_FIELD = "city_model"
     CODE_FIELD = "code_pzz"
 
     zones = zones.copy()
     zones[CODE_FIELD] = zones[CODE_FIELD].astype(str).str.strip().str.upper()
 
-    def find_model(row, neighbor_zone):
-        buffer_geom = row.geometry.buffer(20)
-        buffer_matches = neighbor_zone[neighbor_zone.geometry.intersects(buffer_geom)]
-
-        if not buffer_matches.empty:
-            return buffer_matches.iloc[0][CITY_FIELD]
-
-        dists = neighbor_zone.geometry.centroid.distance(row.geometry.centroid)
-        return neighbor_zone.loc[dists.idxmin(), CITY_FIELD]
-
     targets = zones[(zones[CODE_FIELD].isin(TARGET_CODES)) & 
                     (zones[CITY_FIELD].isnull() | (zones[CITY_FIELD].str.strip() == ""))]
 
-    logging.info(f"Найдено зон для обработки: {len(targets)}")
+    logger.info(f"Найдено зон для обработки: {len(targets)}")
 
-    neighbor_zone = zones[zones[CITY_FIELD].notnull() & (zones[CITY_FIELD] != "")]
-    neighbor_zone = neighbor_zone[neighbor_zone[CITY_FIELD].isin({"medium", "low_rise", "central"})]
-    neighbor_zone = neighbor_zone.sort_values("geometry", ascending=False).reset_index(drop=True)
+    neighbor_zone = get_neighbor_zones(zones)
 
     for idx, row in targets.iterrows():
-        zones.loc[row.name, CITY_FIELD] = find_model(row, neighbor_zone)
+        zones.loc[row.name, CITY_FIELD] = neighbor_zone.at[find_neighbor(row.geometry, neighbor_zone), CITY_FIELD]
 
     filled_count = zones.loc[targets.index, CITY_FIELD].notnull().sum()
-    logging.info(f"Заполнено city_model для {filled_count} из {len(targets)} зон")
+    logger.info(f"Заполнено city_model для {filled_count} из {len(targets)} зон")
 
     zones = zones[["id_zones", "code_pzz", "city_model", "is_living_zones", "geometry"]]
     return zones
 
+@instrument
 def prepare_building_data(buildings):
     buildings = buildings.to_crs(AREA_CRS)
     buildings['is_living'] = buildings['is_living'].replace({1: True, 0: False}).fillna(False).astype(bool)
     buildings['number_of_floors'] = buildings['number_of_floors'].fillna(1)
     buildings['footprint_area'] = buildings.geometry.area
     buildings['build_floor_area'] = buildings['footprint_area'] * buildings['number_of_floors']
-    buildings['living_area'] = buildings.apply(
-        lambda row: row['build_floor_area'] * 0.8 if row['is_living'] else 0, axis=1)
+    buildings['living_area'] = np.where(buildings['is_living'], buildings['build_floor_area'] * 0.8, 0)
     buildings['non_living_area'] = buildings['build_floor_area'] - buildings['living_area']
     return buildings.to_crs(GEO_CRS)
 
-def assign_population_to_buildings(buildings, living_population):
+@instrument
+def assign_population_to_buildings(buildings, living_population, strategy="living_area"):
     buildings = buildings.to_crs(AREA_CRS)
     living_buildings = buildings[buildings['is_living']]
-    living_buildings = get_balanced_buildings(living_buildings=living_buildings, population=living_population)
+    living_buildings = get_balanced_buildings(living_buildings, living_population, strategy=strategy)
 
     non_living_buildings = buildings[~buildings['is_living']]
     non_living_buildings['number_of_floors'] = non_living_buildings['number_of_floors'].fillna(1)
 
     all_buildings = pd.concat([non_living_buildings, living_buildings], ignore_index=True)
     all_buildings['population'] = all_buildings['population'].fillna(0)
-    all_buildings['id_build'] = ["2." + str(i + 1) for i in range(len(all_buildings))]
+    all_buildings['id_build'] = make_ids(all_buildings, "buildings")
 
     return all_buildings.to_crs(GEO_CRS)
 
+@instrument
 def join_zones_to_buildings(buildings, zones):
     buildings = buildings.to_crs(AREA_CRS)
     zones = zones.to_crs(AREA_CRS)
 
     centroids = buildings.copy()
     centroids['geometry'] = centroids.geometry.centroid
-    joined = gpd.sjoin(centroids, zones[['id_zones', 'city_model', 'geometry']], how='left', predicate='within')
+    with stage("join_zones_to_buildings.sjoin", len(centroids)):
+        joined = gpd.sjoin(centroids, zones[['id_zones', 'city_model', 'geometry']], how='left', predicate='within')
     
-    buildings['id_zones'], buildings['city_model'] = joined[['id_zones', 'city_model']].T.values
+    buildings['id_zones'] = joined['id_zones'].astype("Int64").array
+    buildings['city_model'] = joined['city_model'].to_numpy()
     return buildings.to_crs(GEO_CRS)
 
+@instrument
 def aggregate_zone_data(buildings, zones):
     buildings = buildings.to_crs(AREA_CRS)
     zones = zones.to_crs(AREA_CRS)
@@ -117,6 +138,7 @@ def aggregate_zone_data(buildings, zones):
     zones = zones.merge(aggregated, on="id_zones", how="left").fillna(0)
     return zones.to_crs(GEO_CRS)
 
+@instrument
 def distribute_population_across_zones(zones):
     zones = zones.to_crs(AREA_CRS)
 
@@ -143,7 +165,9 @@ def distribute_population_across_zones(zones):
     zones = zones.drop(columns=["sum_population_x"]).rename(columns={"sum_population_y": "sum_population"})
     return zones.to_crs(GEO_CRS)
 
-def process_city_model(zones, buildings, living_population, living_codes_path="living_codes.json"):
+@instrument
+def process_city_model(zones, buildings, living_population, living_codes_path="living_codes.json",
+                       balancing_strategy="living_area"):
     global living_codes
     if living_codes is None:
         living_codes = load_living_codes(living_codes_path)
@@ -152,8 +176,9 @@ def process_city_model(zones, buildings, living_population, living_codes_path="l
 
     zones = add_zone_attributes(zones, living_codes)
     buildings = prepare_building_data(buildings)
-    balanced_buildings = assign_population_to_buildings(buildings, living_population)
-    balanced_buildings = join_zones_to_buildings(balanced_buildings, zones)
+    # Привязка к зонам до балансировки: floor_weighted учитывает city_model здания
+    buildings = join_zones_to_buildings(buildings, zones)
+    balanced_buildings = assign_population_to_buildings(buildings, living_population, balancing_strategy)
     zones = aggregate_zone_data(balanced_buildings, zones)
     zones = distribute_population_across_zones(zones)
 
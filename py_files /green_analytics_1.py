@@ -1,7 +1,11 @@
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-from IPython.display import display  # Для вывода в Jupyter
+
+from headless import display  # Для вывода в Jupyter
+
+from id_scheme import make_ids
+from instrumentation import instrument
 
 # Нормативы по типам городской среды (м²/чел.)
 normatives = {
@@ -10,6 +14,42 @@ normatives = {
     "central": 6,
 }
 
+
+def allocate_green(sum_population: pd.Series, city_model: pd.Series, green_space_total: float) -> pd.DataFrame:
+    """
+    Распределение площади зелёных насаждений по зонам: сначала между типами
+    городской среды пропорционально их населению, затем внутри типа — по населению зоны.
+
+    :param sum_population: pd.Series — население зоны
+    :param city_model: pd.Series — тип городской среды
+    :param green_space_total: float — общая площадь зелёных насаждений (м²)
+    :return: DataFrame с колонками green_allocated, green_per_capita, difference_from_normative
+    """
+    total_population = sum_population.sum()
+    population_by_type = sum_population.groupby(city_model).sum().to_dict()
+    green_by_type = {
+        t: (population_by_type[t] / total_population) * green_space_total
+        for t in population_by_type
+    }
+
+    pop = sum_population.to_numpy(dtype=float)
+    pop = np.where(pop == 0, 1, pop)
+    type_population = city_model.map(population_by_type).fillna(0).to_numpy(dtype=float)
+    type_green = city_model.map(green_by_type).fillna(0).to_numpy(dtype=float)
+    normative = city_model.map(normatives).fillna(0).to_numpy(dtype=float)
+
+    # Для типа среды без населения зелень не распределяется
+    has_type = type_population != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        allocated = type_green * (pop / type_population)
+        per_capita = allocated / pop
+    return pd.DataFrame({
+        "green_allocated": np.where(has_type, allocated, 0),
+        "green_per_capita": np.where(has_type, per_capita, 0),
+        "difference_from_normative": np.where(has_type, per_capita - normative, 0),
+    }, index=sum_population.index)
+
+@instrument
 def calculate_green_analytics(green, park, living_zones, crs_epsg: int = 3395):
     """
     Расчет обеспеченности зелеными насаждениями для каждого квартала.
@@ -22,10 +62,10 @@ def calculate_green_analytics(green, park, living_zones, crs_epsg: int = 3395):
     """
 
     # Добавим ID зелёных зон
-    green['id_green_zone'] = ["9." + str(i + 1) for i in range(len(green))]
+    green['id_green_zone'] = make_ids(green, "green")
     green.insert(0, 'id_green_zone', green.pop('id_green_zone'))
 
-    park['id_green_zone'] = ["6." + str(i + 1) for i in range(len(park))]
+    park['id_green_zone'] = make_ids(park, "park")
     park.insert(0, 'id_green_zone', park.pop('id_green_zone'))
 
     # Объединяем зелёные зоны
@@ -41,39 +81,10 @@ def calculate_green_analytics(green, park, living_zones, crs_epsg: int = 3395):
     living_zones["sum_population"] = living_zones["sum_population"].astype(float)
     total_population = living_zones["sum_population"].sum()
 
-    # Население по типам городской среды
-    population_by_type = living_zones.groupby("city_model")["sum_population"].sum().to_dict()
-
-    # Зелень по типам среды
-    green_by_type = {
-        t: (population_by_type[t] / total_population) * green_space_total
-        for t in population_by_type
-    }
-
-    def calculate_zone_green_simple(row):
-        city_type = row["city_model"]
-        pop = row["sum_population"]
-        type_population = population_by_type.get(city_type, 0)
-        type_green = green_by_type.get(city_type, 0)
-
-        if pop == 0:
-            pop = 1
-        if type_population == 0:
-            return pd.Series([0, 0, 0])
-
-        share = pop / type_population
-        allocated_green = type_green * share
-        per_capita = allocated_green / pop
-        normative = normatives.get(city_type, 0)
-        difference = per_capita - normative
-
-        return pd.Series([allocated_green, per_capita, difference])
-
-    living_zones[[
-        "green_allocated",
-        "green_per_capita",
-        "difference_from_normative"
-    ]] = living_zones.apply(calculate_zone_green_simple, axis=1)
+    # Зелень по типам среды и по зонам
+    allocation = allocate_green(living_zones["sum_population"], living_zones["city_model"], green_space_total)
+    for col in allocation.columns:
+        living_zones[col] = allocation[col]
 
     # Вывод по каждому типу городской среды
     city_stats = []
@@ -0,0 +1,30 @@
+# headless.py
+
+import os
+
+# Безголовый режим: без display / plt.show / explore (пакетные расчёты, серверы).
+# Включается переменной окружения URBAN_HEADLESS=1 или set_headless()
+_config = {"headless": os.environ.get("URBAN_HEADLESS", "") not in ("", "0")}
+
+
+def set_headless(value=True):
+    _config["headless"] = value
+
+
+def is_headless():
+    return _config["headless"]
+
+
+def display(obj):
+    """
+    Вывод в Jupyter через IPython.display; без IPython — print,
+    в безголовом режиме — ничего.
+    """
+    if _config["headless"]:
+        return
+    try:
+        from IPython.display import display as ipython_display
+    except ImportError:
+        print(obj)
+        return
+    ipython_display(obj)
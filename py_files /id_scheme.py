@@ -0,0 +1,172 @@
+# id_scheme.py
+
+import numpy as np
+import pandas as pd
+import shapely
+
+# Префиксы слоёв (как в прежних строковых идентификаторах "1.N", "2.N", ...)
+LAYER_PREFIXES = {
+    "zones": 1,
+    "buildings": 2,
+    "school": 3,
+    "kindergarten": 4,
+    "polyclinic": 5,
+    "park": 6,
+    "green": 9,
+}
+
+# id = префикс * PREFIX_BASE + хэш геометрии; все значения меньше 2**53
+# и без потерь проходят через GeoJSON
+PREFIX_BASE = 10 ** 14
+ID_DTYPE = "int64"
+
+# Столбцы с идентификаторами, которые переводятся в строки при экспорте
+ID_COLUMNS = ["id_zones", "id_build", "id_service", "id_green_zone",
+              "school_id_service", "kindergarten_id_service", "polyclinic_id_service"]
+
+# Шаг квантования координат для хэша (градусы EPSG:4326, ~1 см)
+COORD_PRECISION = 1e-7
+
+_MIX_X = np.uint64(0x9E3779B97F4A7C15)
+_MIX_Y = np.uint64(0xC2B2AE3D27D4EB4F)
+_MIX_POS = np.uint64(0x165667B19E3779F9)
+
+
+def _splitmix64(values):
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def geometry_hash(geometry):
+    """
+    Векторный 64-битный хэш геометрий по квантованным координатам в EPSG:4326.
+    Не зависит от порядка строк, поэтому сохраняется между перезапусками.
+
+    :param geometry: GeoSeries — геометрии слоя
+    :return: np.ndarray[uint64]
+    """
+    if geometry.crs is not None:
+        geometry = geometry.to_crs(4326)
+    geoms = geometry.values
+
+    coords, index = shapely.get_coordinates(geoms, return_index=True)
+    quantized = np.round(coords / COORD_PRECISION).astype(np.int64).view(np.uint64)
+
+    starts = np.searchsorted(index, np.arange(len(geoms)))
+    position = (np.arange(len(index)) - starts[index] + 1).astype(np.uint64)
+
+    with np.errstate(over="ignore"):
+        coord_hash = _splitmix64(quantized[:, 0] * _MIX_X ^ quantized[:, 1] * _MIX_Y ^ position * _MIX_POS)
+        result = np.zeros(len(geoms), dtype=np.uint64)
+        np.bitwise_xor.at(result, index, coord_hash)
+
+        type_ids = (shapely.get_type_id(geoms).astype(np.int64) + 2).astype(np.uint64)
+        counts = np.bincount(index, minlength=len(geoms)).astype(np.uint64)
+        return _splitmix64(result ^ _splitmix64(type_ids * _MIX_X + counts))
+
+
+def _tie_break_keys(gdf, positions):
+    """
+    Ключи упорядочения строк с совпавшими хэшами: WKB геометрии и хэш атрибутов.
+    """
+    rows = gdf.iloc[positions]
+    wkb = shapely.to_wkb(rows.geometry.values, hex=True)
+    attributes = pd.DataFrame(rows.drop(columns=rows.geometry.name)).astype(str)
+    if attributes.columns.empty:
+        return wkb, np.zeros(len(rows), dtype=np.uint64)
+    return wkb, pd.util.hash_pandas_object(attributes, index=False).to_numpy()
+
+
+def make_ids(gdf, layer):
+    """
+    Стабильные целочисленные идентификаторы слоя: префикс слоя и хэш геометрии.
+    Совпадающие хэши (в т.ч. одинаковые геометрии) разводятся сдвигом на ранг
+    строки внутри группы, упорядоченной по WKB геометрии и атрибутам, — результат
+    не зависит от порядка строк.
+
+    :param gdf: GeoDataFrame — слой
+    :param layer: str — ключ LAYER_PREFIXES
+    :return: np.ndarray[int64]
+    """
+    prefix = LAYER_PREFIXES[layer] * PREFIX_BASE
+    local = (geometry_hash(gdf.geometry) % np.uint64(PREFIX_BASE)).astype(np.int64)
+    shift = np.zeros(len(local), dtype=np.int64)
+
+    # Сдвиг может попасть на чужой хэш — тогда разводим ещё раз; строка
+    # с меньшим сдвигом сохраняет значение
+    duplicated = pd.Series(local).duplicated(keep=False).to_numpy()
+    while duplicated.any():
+        positions = np.flatnonzero(duplicated)
+        wkb, attributes = _tie_break_keys(gdf, positions)
+        group = pd.DataFrame({"local": local[positions], "shift": shift[positions],
+                              "wkb": wkb, "attributes": attributes, "position": positions})
+        group = group.sort_values(["local", "shift", "wkb", "attributes"], kind="mergesort")
+        rank = group.groupby("local").cumcount().to_numpy()
+        local[group["position"]] = (group["local"].to_numpy() + rank) % PREFIX_BASE
+        shift[group["position"]] += rank
+        duplicated = pd.Series(local).duplicated(keep=False).to_numpy()
+
+    return (local + prefix).astype(ID_DTYPE)
+
+
+def as_id_key(series):
+    """
+    Приведение столбца идентификаторов к ключу для соединений: целые числа
+    (Int64 при пропусках) или категориальный тип для строковых id старых выгрузок.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("Int64")
+    numeric = pd.to_numeric(series, errors="coerce")
+    if numeric.notna().sum() == series.notna().sum() and (numeric.dropna() % 1 == 0).all():
+        return numeric.astype("Int64")
+    return series.astype("category")
+
+
+def format_ids(series):
+    """
+    Строковое представление идентификаторов "префикс.хэш" для экспорта.
+    """
+    if not pd.api.types.is_numeric_dtype(series):
+        return series
+    ids = series.astype("Int64")
+    text = (ids // PREFIX_BASE).astype(str) + "." + (ids % PREFIX_BASE).astype(str)
+    return text.where(ids.notna(), None)
+
+
+def parse_ids(series):
+    """
+    Обратное преобразование format_ids: строки "префикс.хэш" в целые id (Int64).
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("Int64")
+    parts = series.astype("string").str.split(".", n=1, expand=True)
+    if parts.shape[1] < 2:
+        return pd.to_numeric(parts[0], errors="coerce").astype("Int64")
+    prefix = pd.to_numeric(parts[0], errors="coerce").astype("Int64")
+    value = pd.to_numeric(parts[1], errors="coerce").astype("Int64")
+    return (prefix * PREFIX_BASE + value).where(value.notna(), prefix)
+
+
+def format_id_columns(gdf):
+    """
+    Копия слоя со всеми столбцами идентификаторов в строковом виде.
+    """
+    gdf = gdf.copy()
+    for col in ID_COLUMNS:
+        if col in gdf.columns:
+            gdf[col] = format_ids(gdf[col])
+    return gdf
+
+
+def parse_id_columns(gdf):
+    """
+    Обратное преобразование format_id_columns для слоя, прочитанного из файла.
+    """
+    gdf = gdf.copy()
+    for col in ID_COLUMNS:
+        if col in gdf.columns:
+            gdf[col] = parse_ids(gdf[col])
+    return gdf
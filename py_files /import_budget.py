@@ -0,0 +1,67 @@
+# import_budget.py
+
+import os
+import sys
+import subprocess
+
+# Допустимое время импорта модулей поверх geopandas (мс)
+IMPORT_BUDGET_MS = {
+    "check_geojson": 150,
+    "city_model_processing": 150,
+    "service_data_processing": 150,
+    "social_infrastructure_mapper": 150,
+    "green_analytics_1": 150,
+    "calculate_density": 150,
+    "calculating_potential_populating": 150,
+    "calculating_provision": 150,
+    "total_score_new_population": 150,
+    "total_score_new_population_dop": 150,
+}
+
+# Тяжёлые зависимости, которые не должны загружаться при импорте модулей
+HEAVY_MODULES = ["matplotlib", "seaborn", "sklearn", "objectnat", "IPython", "folium"]
+
+_PROBE = """
+import sys, time, importlib
+import geopandas
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [name for name in sys.argv[2:] if name in sys.modules]
+print(elapsed, ",".join(heavy))
+"""
+
+
+def measure_import_time(module):
+    """
+    Время импорта модуля в чистом интерпретаторе (мс) после импорта geopandas
+    и список загруженных при этом тяжёлых зависимостей.
+    """
+    folder = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE, module, *HEAVY_MODULES],
+        cwd=folder, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": folder, "URBAN_HEADLESS": "1"},
+    ).stdout.split()
+    return float(output[0]), output[1].split(",") if len(output) > 1 else []
+
+
+def check_import_budget(budget=None):
+    """
+    Проверка времени импорта основных модулей.
+
+    :return: list — нарушения бюджета: (модуль, время в мс, бюджет, тяжёлые зависимости)
+    """
+    budget = budget or IMPORT_BUDGET_MS
+    failures = []
+    for module, limit in budget.items():
+        elapsed, heavy = measure_import_time(module)
+        status = "✅" if elapsed <= limit and not heavy else "⚠️"
+        print(f"{status} {module}: {elapsed:.0f} мс (бюджет {limit} мс)" + (f", загружены: {', '.join(heavy)}" if heavy else ""))
+        if elapsed > limit or heavy:
+            failures.append((module, elapsed, limit, heavy))
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check_import_budget() else 0)
@@ -0,0 +1,599 @@
+# incremental_recompute.py
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from calculate_density import calculate_density, density_columns
+from calculating_potential_populating import calculate_and_update
+from city_model_processing import (
+    AREA_CRS,
+    TARGET_CODES,
+    add_zone_attributes,
+    aggregate_zone_data,
+    assign_population_to_buildings,
+    distribute_population_across_zones,
+    find_neighbor,
+    get_neighbor_zones,
+    join_zones_to_buildings,
+    load_living_codes,
+    prepare_building_data,
+)
+from green_analytics_1 import allocate_green, calculate_green_analytics
+from id_scheme import as_id_key
+from instrumentation import instrument, stage
+from population_balancing import building_weights, largest_remainder
+from service_data_processing import BUFFER_SIZES
+from social_infrastructure_mapper import intersect_and_aggregate, process_and_buffer, process_services
+from total_score_new_population import (
+    CORE_COLS,
+    EXTRA_COLS,
+    correlation_weights,
+    min_max_scale,
+    negative_score,
+    positive_score,
+    score_category,
+    score_mask,
+)
+
+SERVICE_LABELS = ["kindergarten", "school", "polyclinic"]
+CATCHMENT_COLUMNS = [f"{label}_{col}" for label in SERVICE_LABELS
+                     for col in ("free_places", "employed_places", "id_service")]
+SUM_COLUMNS = ["footprint_area", "build_floor_area", "living_area", "non_living_area", "population"]
+BUILDING_COLUMNS = ["is_living", "number_of_floors", "footprint_area", "build_floor_area", "living_area",
+                    "non_living_area", "city_model"]
+
+# СК площади зелёных зон (как в calculate_green_analytics)
+GREEN_CRS = 3395
+
+# Если изменилась большая доля оцениваемых зон, статистики корреляции считаются заново
+REFIT_SHARE = 0.5
+
+
+class _CorrelationStats:
+    """
+    Достаточные статистики корреляции признаков: число строк, суммы и попарные
+    произведения отклонений от фиксированного сдвига. Строки добавляются
+    и удаляются без пересчёта по всей таблице.
+    """
+
+    def __init__(self, values):
+        self.shift = values.mean(axis=0) if len(values) else np.zeros(values.shape[1])
+        self.n = 0
+        self.sums = np.zeros(values.shape[1])
+        self.products = np.zeros((values.shape[1], values.shape[1]))
+        self.add(values)
+
+    def add(self, values, sign=1):
+        centered = values - self.shift
+        self.n += sign * len(centered)
+        self.sums += sign * centered.sum(axis=0)
+        self.products += sign * (centered.T @ centered)
+
+    def remove(self, values):
+        self.add(values, sign=-1)
+
+    def corr(self):
+        """
+        Матрица корреляции Пирсона (как DataFrame.corr); для постоянных признаков — NaN.
+        """
+        if self.n < 2:
+            return np.full(self.products.shape, np.nan)
+        cov = self.products - np.outer(self.sums, self.sums) / self.n
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = np.clip(cov / np.outer(std, std), -1, 1)
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return corr
+
+
+class IncrementalModel:
+    """
+    Модель города с инкрементальным пересчётом итогового балла после правок
+    зон (code_pzz, city_model), зданий (is_living, number_of_floors)
+    или численности населения.
+
+    Начальный расчёт выполняется функциями пайплайна; затем правки помечают
+    зоны как изменённые, и по зависимостям пересчитываются только затронутые строки:
+
+    - city_model целевых зон, заполняемых по соседям, city_model и веса их зданий,
+      радиусы сервисов, расположенных в этих зданиях;
+    - население зданий (перераспределение за O(n) по сохранённым весам),
+      суммы по зонам с изменившимися зданиями, перераспределение населения
+      нежилых зон к ближайшей жилой;
+    - зоны обслуживания — только для зон, затронутых изменёнными буферами;
+    - озеленение, плотность и потенциал заселения — по изменённым строкам;
+    - нормализация analyze_zones: статистики корреляции обновляются по изменившимся строкам.
+
+    Загрузка сервисов (calculating_provision) считается неизменной:
+    пересчитываются только радиусы и зоны обслуживания.
+    """
+
+    def __init__(self, zones, buildings, living_population, living_codes, green, park,
+                 school, kindergarten, polyclinic, balancing_strategy="living_area"):
+        """
+        :param zones: GeoDataFrame — территориальные зоны (code_pzz, city_model)
+        :param buildings: GeoDataFrame — здания (is_living, number_of_floors)
+        :param living_population: int — численность населения
+        :param living_codes: set | str — коды жилых зон или путь к living_codes.json
+        :param green: GeoDataFrame — зелёные насаждения общего пользования
+        :param park: GeoDataFrame — парки
+        :param school: GeoDataFrame — результат calculating_provision
+        :param kindergarten: GeoDataFrame — результат calculating_provision
+        :param polyclinic: GeoDataFrame — результат calculating_provision
+        :param balancing_strategy: str — стратегия population_balancing
+        """
+        if isinstance(living_codes, str):
+            living_codes = load_living_codes(living_codes)
+        self.living_codes = living_codes
+        self.living_population = int(living_population)
+        self.strategy = balancing_strategy
+        self.services = {"school": school.copy(), "kindergarten": kindergarten.copy(), "polyclinic": polyclinic.copy()}
+
+        self._dirty_zones = set()
+        self._dirty_buildings = set()
+        self._population_changed = False
+
+        with stage("IncrementalModel.initial"):
+            self._initial_run(zones, buildings, green, park)
+
+    # --- Начальный расчёт ---
+
+    def _initial_run(self, zones, buildings, green, park):
+        raw = zones.reset_index(drop=True)
+        self.raw_code = raw["code_pzz"].copy()
+        self.raw_model = raw["city_model"].astype(object).copy()
+
+        self.zones = add_zone_attributes(raw, self.living_codes)
+        self.is_living = self.zones["is_living_zones"].to_numpy(dtype=bool).copy()
+        self.id_to_pos = pd.Series(np.arange(len(self.zones)), index=self.zones["id_zones"].to_numpy())
+        self.area_geoms = self.zones.to_crs(AREA_CRS).geometry.values
+        self.zone_tree = shapely.STRtree(self.area_geoms)
+        self.hull_tree = shapely.STRtree(shapely.convex_hull(self.area_geoms))
+        self._init_sources()
+
+        # Здания в порядке prepare_building_data; balanced — нежилые, затем жилые
+        prepared = join_zones_to_buildings(prepare_building_data(buildings.reset_index(drop=True)), self.zones)
+        balanced = assign_population_to_buildings(prepared, self.living_population, self.strategy)
+        living = prepared["is_living"].to_numpy()
+        order = np.concatenate([np.flatnonzero(~living), np.flatnonzero(living)])
+
+        self.buildings = pd.DataFrame(prepared[BUILDING_COLUMNS]).reset_index(drop=True)
+        self.buildings["id_build"] = np.zeros(len(order), dtype=np.int64)
+        self.buildings.loc[order, "id_build"] = balanced["id_build"].to_numpy()
+        zone = as_id_key(prepared["id_zones"]).map(self.id_to_pos)
+        self.buildings["zone"] = zone.astype(float).fillna(-1).astype(int).to_numpy()
+        self.buildings["weight"] = np.zeros(len(order), dtype=np.int64)
+        self.buildings.loc[living, "weight"] = building_weights(self.buildings[living], self.strategy)
+        self.buildings["population"] = np.zeros(len(order), dtype=np.int64)
+        self.buildings.loc[order, "population"] = balanced["population"].to_numpy(dtype=np.int64)
+
+        aggregated = aggregate_zone_data(balanced, self.zones)
+        self.aggregates = pd.DataFrame(aggregated[[f"sum_{col}" for col in SUM_COLUMNS] + ["avg_number_of_floors"]])
+        self.own_population = self.aggregates["sum_population"].to_numpy(dtype=float).copy()
+        self.area_zone = aggregated.to_crs(AREA_CRS).geometry.area.to_numpy()
+
+        distributed = distribute_population_across_zones(aggregated)
+        self.nearest = self._nearest_living()
+        self.population = distributed["sum_population"].to_numpy(dtype=float).copy()
+
+        self.buffered = {label: process_and_buffer(layer) for label, layer in self.services.items()}
+        living_zones = process_services(distributed, self.services["kindergarten"], self.services["school"],
+                                        self.services["polyclinic"])
+        self.catchments = pd.DataFrame(index=self.zones.index, columns=CATCHMENT_COLUMNS, dtype=object)
+        self.catchments.loc[living_zones.index] = living_zones[CATCHMENT_COLUMNS].astype(object).to_numpy()
+
+        green_combined = gpd.GeoDataFrame(pd.concat([green, park], ignore_index=True), crs=green.crs)
+        self.green_total = green_combined.to_crs(epsg=GREEN_CRS).geometry.area.sum()
+        living_zones = calculate_green_analytics(green.copy(), park.copy(), living_zones)
+        living_zones = calculate_density(living_zones)
+        self.living = calculate_and_update(living_zones)
+        self.columns = list(self.living.columns)
+
+        self._scored = None
+        self.zones_0 = self._score()
+
+    def _init_sources(self):
+        """
+        Зона-источник city_model для каждой целевой зоны (как в add_zone_attributes).
+        """
+        geoms = self.zones.geometry.values
+        self.target_buffers = shapely.buffer(geoms, 20)
+        self.target_tree = shapely.STRtree(self.target_buffers)
+
+        neighbor_zone = self._neighbor_zones()
+        self.neighbor_order = neighbor_zone["position"].to_numpy()
+        self.is_target = self._target_mask()
+        self.source = np.full(len(self.zones), -1, dtype=np.int64)
+        self.fallback = np.zeros(len(self.zones), dtype=bool)
+        self._fill_sources(np.flatnonzero(self.is_target), neighbor_zone)
+
+    def _neighbor_zones(self):
+        zones = self.zones.assign(city_model=self.raw_model, position=np.arange(len(self.zones)))
+        return get_neighbor_zones(zones)
+
+    def _target_mask(self):
+        code = self.raw_code.astype(str).str.strip().str.upper()
+        empty = self.raw_model.isnull() | (self.raw_model.str.strip() == "")
+        return (code.isin(TARGET_CODES) & empty).to_numpy()
+
+    def _fill_sources(self, positions, neighbor_zone):
+        """
+        Поиск зоны-источника для целевых зон и признак поиска по центроиду
+        (буфер не пересекает ни одну соседнюю зону).
+        """
+        geoms = self.zones.geometry.values
+        for pos in positions:
+            self.source[pos] = neighbor_zone.at[find_neighbor(geoms[pos], neighbor_zone), "position"]
+        self.fallback[positions] = ~shapely.intersects(self.target_buffers[positions], geoms[self.source[positions]])
+
+    # --- Правки ---
+
+    def edit_zones(self, changes):
+        """
+        Изменение code_pzz и/или city_model зон (геометрия не меняется).
+
+        :param changes: dict — {id_zones: {"code_pzz": ..., "city_model": ...}}
+        """
+        for id_zone, values in changes.items():
+            pos = int(self.id_to_pos[id_zone])
+            if "code_pzz" in values:
+                self.raw_code.iat[pos] = values["code_pzz"]
+            if "city_model" in values:
+                self.raw_model.iat[pos] = values["city_model"]
+            self._dirty_zones.add(pos)
+
+    def edit_buildings(self, changes):
+        """
+        Изменение is_living и/или number_of_floors зданий (геометрия не меняется).
+
+        :param changes: dict — {id_build: {"is_living": ..., "number_of_floors": ...}}
+        """
+        positions = pd.Series(self.buildings.index, index=self.buildings["id_build"].to_numpy())
+        for id_build, values in changes.items():
+            pos = int(positions[id_build])
+            for col in ("is_living", "number_of_floors"):
+                if col in values:
+                    self.buildings.at[pos, col] = values[col]
+            self._dirty_buildings.add(pos)
+
+    def set_living_population(self, living_population):
+        self.living_population = int(living_population)
+        self._population_changed = True
+
+    # --- Пересчёт ---
+
+    @instrument(name="IncrementalModel.update")
+    def update(self):
+        """
+        Пересчёт после правок только для затронутых зон.
+
+        :return: GeoDataFrame — как результат analyze_zones
+        """
+        model_changed, living_changed = self._update_zones()
+        area_dirty = set(self.buildings.loc[sorted(self._dirty_buildings), "zone"]) - {-1}
+
+        weights_changed = self._update_buildings(model_changed)
+        catchment_dirty = set(living_changed) | self._update_service_buffers(model_changed)
+
+        population_dirty = self._rebalance() if weights_changed or self._population_changed else set()
+        self._update_aggregates(area_dirty | population_dirty)
+        distribution_dirty = self._update_distribution(area_dirty | population_dirty, living_changed)
+
+        self._update_catchments(catchment_dirty)
+        self._update_living_rows(distribution_dirty | set(model_changed), catchment_dirty)
+
+        self._dirty_zones.clear()
+        self._dirty_buildings.clear()
+        self._population_changed = False
+        self.zones_0 = self._score()
+        return self.zones_0
+
+    def _update_zones(self):
+        """
+        code_pzz, is_living_zones и city_model. Заполнение по соседям пересчитывается
+        только для целевых зон, у которых могла смениться зона-источник.
+
+        :return: (позиции зон с новой city_model, позиции зон, сменивших признак жилой)
+        """
+        if not self._dirty_zones:
+            return [], []
+        edited = np.array(sorted(self._dirty_zones))
+        n_zones = len(self.zones)
+
+        neighbor_zone = self._neighbor_zones()
+        order = neighbor_zone["position"].to_numpy()
+        rank = np.full(n_zones, -1, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+
+        is_target = self._target_mask()
+        refill = is_target & (~self.is_target | np.isin(np.arange(n_zones), edited))
+
+        if not np.array_equal(order, self.neighbor_order):
+            previous = self.neighbor_order
+            if not np.array_equal(previous[np.isin(previous, order)], order[np.isin(order, previous)]):
+                # Сменился порядок просмотра соседей (он зависит от границ набора) — заполнение заново
+                refill = is_target.copy()
+            else:
+                refill |= is_target & (self.fallback | (rank[np.maximum(self.source, 0)] < 0))
+
+                # Изменённые соседние зоны, стоящие в порядке раньше текущего источника
+                candidates = edited[rank[edited] >= 0]
+                neighbor_idx, target_idx = self.target_tree.query(self.zones.geometry.values[candidates],
+                                                                  predicate="intersects")
+                keep = is_target[target_idx] & ~refill[target_idx]
+                candidate_rank = rank[candidates[neighbor_idx[keep]]]
+                target_idx = target_idx[keep]
+                earlier = candidate_rank < rank[self.source[target_idx]]
+                best = pd.Series(candidate_rank[earlier]).groupby(target_idx[earlier]).min()
+                self.source[best.index.to_numpy()] = order[best.to_numpy()]
+        self.neighbor_order = order
+        self.is_target = is_target
+        self._fill_sources(np.flatnonzero(refill), neighbor_zone)
+
+        new_model = self.raw_model.copy()
+        new_model[is_target] = self.raw_model.to_numpy()[self.source[is_target]]
+        old_model = self.zones["city_model"]
+        same = (old_model == new_model) | (old_model.isnull() & new_model.isnull())
+        is_living = self.raw_code.isin(self.living_codes).to_numpy()
+        living_changed = np.flatnonzero(is_living != self.is_living)
+
+        self.zones["code_pzz"] = self.raw_code.astype(str).str.strip().str.upper()
+        self.zones["city_model"] = new_model
+        self.zones["is_living_zones"] = is_living
+        self.is_living = is_living
+        return list(np.flatnonzero(~same.to_numpy())), list(living_changed)
+
+    def _update_buildings(self, model_changed):
+        """
+        Площади изменённых зданий, city_model зданий в зонах с новой моделью и веса.
+
+        :return: bool — изменились ли веса
+        """
+        changed = set(self._dirty_buildings)
+        if model_changed:
+            in_zones = self.buildings["zone"].isin(model_changed).to_numpy()
+            models = self.zones["city_model"].to_numpy(dtype=object)
+            self.buildings.loc[in_zones, "city_model"] = models[self.buildings.loc[in_zones, "zone"].to_numpy()]
+            if self.strategy == "floor_weighted":
+                changed |= set(np.flatnonzero(in_zones & self.buildings["is_living"].to_numpy(dtype=bool)))
+        if not changed:
+            return False
+
+        # Те же формулы, что в prepare_building_data
+        rows = sorted(changed)
+        b = self.buildings.loc[rows]
+        is_living = b["is_living"].replace({1: True, 0: False}).fillna(False).astype(bool)
+        floors = b["number_of_floors"].fillna(1).astype(float)
+        build_floor_area = b["footprint_area"] * floors
+        living_area = np.where(is_living, build_floor_area * 0.8, 0)
+        self.buildings.loc[rows, "is_living"] = is_living.to_numpy()
+        self.buildings.loc[rows, "number_of_floors"] = floors.to_numpy()
+        self.buildings.loc[rows, "build_floor_area"] = build_floor_area.to_numpy()
+        self.buildings.loc[rows, "living_area"] = living_area
+        self.buildings.loc[rows, "non_living_area"] = build_floor_area.to_numpy() - living_area
+
+        b = self.buildings.loc[rows]
+        living = b["is_living"].to_numpy(dtype=bool)
+        weights = np.zeros(len(rows), dtype=np.int64)
+        if living.any():
+            weights[living] = building_weights(b[living], self.strategy)
+        self.buildings.loc[rows, "weight"] = weights
+        return True
+
+    def _update_service_buffers(self, model_changed):
+        """
+        Радиусы сервисов в зданиях зон с новой city_model (как в process_service_data).
+
+        :return: set — зоны, пересекающие старый или новый буфер изменённых сервисов
+        """
+        dirty = set()
+        if not model_changed:
+            return dirty
+        building_model = pd.Series(self.buildings["city_model"].to_numpy(), index=self.buildings["id_build"].to_numpy())
+        for label, layer in self.services.items():
+            if "id_build" not in layer.columns:
+                continue
+            model = as_id_key(layer["id_build"]).astype(object).map(building_model)
+            model = model.where(model.notna() & (model != 0), "medium")
+            buffer_zone = (layer["type"].astype(str) + "_" + model.astype(str)).map(BUFFER_SIZES)
+            changed = ((buffer_zone != layer["buffer_zone"]) & buffer_zone.notna()).to_numpy()
+            if not changed.any():
+                continue
+
+            old = self.buffered[label].geometry.values[changed]
+            layer = layer.copy()
+            layer.loc[changed, "city_model"] = model[changed]
+            layer.loc[changed, "buffer_zone"] = buffer_zone[changed]
+            self.services[label] = layer
+            self.buffered[label] = process_and_buffer(layer)
+
+            # Часть буфера в зоне и её центроид лежат в выпуклой оболочке буфера
+            new = self.buffered[label].geometry.values[changed]
+            hulls = gpd.GeoSeries(shapely.convex_hull(np.concatenate([old, new])),
+                                  crs=self.buffered[label].crs).to_crs(AREA_CRS).values
+            dirty |= set(np.unique(self.zone_tree.query(hulls, predicate="intersects")[1]))
+        return dirty
+
+    def _rebalance(self):
+        """
+        Население жилых зданий по сохранённым весам.
+
+        :return: set — зоны, в которых изменилось население зданий
+        """
+        living = self.buildings["is_living"].to_numpy(dtype=bool)
+        population = np.zeros(len(self.buildings), dtype=np.int64)
+        population[living] = largest_remainder(self.buildings.loc[living, "weight"].to_numpy(dtype=np.int64),
+                                               self.living_population)
+        changed = population != self.buildings["population"].to_numpy()
+        self.buildings["population"] = population
+        zones = self.buildings.loc[changed, "zone"].to_numpy()
+        return set(zones[zones >= 0])
+
+    def _update_aggregates(self, dirty):
+        """
+        sum_* и avg_number_of_floors зон с изменёнными зданиями. Здания берутся в порядке
+        assign_population_to_buildings (нежилые, затем жилые), поэтому суммы
+        совпадают с aggregate_zone_data.
+        """
+        dirty = sorted(dirty)
+        if not dirty:
+            return
+        b = self.buildings[self.buildings["zone"].isin(dirty)]
+        b = b.iloc[np.argsort(b["is_living"].to_numpy(dtype=bool), kind="stable")]
+        aggregated = (
+            b.groupby("zone")[SUM_COLUMNS + ["number_of_floors"]]
+            .agg({**{col: "sum" for col in SUM_COLUMNS}, "number_of_floors": "mean"})
+            .round(2)
+            .rename(columns=lambda c: f"sum_{c}" if c in SUM_COLUMNS else f"avg_{c}")
+        )
+        aggregated["avg_number_of_floors"] = aggregated["avg_number_of_floors"].round().astype(int)
+        aggregated = aggregated.reindex(dirty).fillna(0)
+        for col in aggregated.columns:
+            self.aggregates.loc[dirty, col] = aggregated[col].to_numpy()
+        self.own_population[dirty] = aggregated["sum_population"].to_numpy(dtype=float)
+
+    def _nearest_living(self):
+        """
+        Ближайшая жилая зона для каждой нежилой (при равенстве — первая по порядку,
+        как idxmin в distribute_population_across_zones).
+        """
+        nearest = np.full(len(self.zones), -1, dtype=np.int64)
+        living = np.flatnonzero(self.is_living)
+        other = np.flatnonzero(~self.is_living)
+        if not len(living) or not len(other):
+            return nearest
+        tree = shapely.STRtree(self.area_geoms[living])
+        source, target = tree.query_nearest(self.area_geoms[other], all_matches=True)
+        first = pd.Series(target).groupby(source).min()
+        nearest[other[first.index.to_numpy()]] = living[first.to_numpy()]
+        return nearest
+
+    def _update_distribution(self, aggregate_dirty, living_changed):
+        """
+        Население жилых зон с учётом нежилых зон, для которых они ближайшие.
+
+        :return: set — жилые зоны с пересчитанным населением
+        """
+        previous = self.nearest
+        if len(living_changed):
+            self.nearest = self._nearest_living()
+        moved = np.flatnonzero(previous != self.nearest)
+
+        dirty = set(aggregate_dirty) | set(living_changed) | set(self.nearest[sorted(aggregate_dirty)])
+        dirty |= set(previous[moved]) | set(self.nearest[moved])
+        dirty = sorted(pos for pos in dirty if pos >= 0 and self.is_living[pos])
+
+        # Вклад нежилых зон прибавляется в порядке строк, как в distribute_population_across_zones
+        for pos in dirty:
+            value = self.own_population[pos]
+            for source in np.flatnonzero(self.nearest == pos):
+                value += self.own_population[source] / self.area_zone[pos] * self.area_zone[pos]
+            self.population[pos] = value
+        return set(dirty)
+
+    def _update_catchments(self, dirty):
+        """
+        Зоны обслуживания затронутых жилых зон. Наложение буферов выполняется
+        только для них и для зон, центроиды частей которых могут в них попасть.
+        """
+        dirty = np.array(sorted(pos for pos in dirty if self.is_living[pos]), dtype=np.int64)
+        if not len(dirty):
+            return
+        subset = np.union1d(dirty, self.hull_tree.query(self.area_geoms[dirty], predicate="intersects")[1])
+        for label in SERVICE_LABELS:
+            result = intersect_and_aggregate(self.buffered[label], self.zones.iloc[subset], label)
+            result.index = subset
+            columns = [f"{label}_free_places", f"{label}_employed_places", f"{label}_id_service"]
+            values = result.loc[dirty, columns]
+            values[columns[:2]] = values[columns[:2]].fillna(0)
+            values[columns[2]] = as_id_key(values[columns[2]])
+            self.catchments.loc[dirty, columns] = values.astype(object).to_numpy()
+
+    def _update_living_rows(self, population_rows, catchment_rows):
+        """
+        Таблица жилых зон: население и суммы, зоны обслуживания, озеленение
+        (зависит только от итогов по типам среды), плотность и потенциал заселения.
+        """
+        living = np.flatnonzero(self.is_living)
+        table = self.living.loc[self.living.index.isin(living)]
+        added = np.setdiff1d(living, table.index)
+        if len(added):
+            new_rows = self.zones.iloc[added][["id_zones", "geometry"]].to_crs(table.crs)
+            table = pd.concat([table, new_rows]).sort_index()
+        table = table.copy()
+
+        table.loc[living, "code_pzz"] = self.zones["code_pzz"].to_numpy()[living]
+        table.loc[living, "city_model"] = self.zones["city_model"].to_numpy(dtype=object)[living]
+        table["city_model"] = table["city_model"].fillna(0)
+        table["is_living_zones"] = True
+
+        rows = sorted((set(population_rows) | set(added)) & set(living))
+        if rows:
+            for col in self.aggregates.columns.drop("sum_population"):
+                table.loc[rows, col] = self.aggregates.loc[rows, col].to_numpy()
+            table.loc[rows, "sum_population"] = self.population[rows]
+
+        catchment = sorted((set(catchment_rows) | set(added)) & set(living))
+        if catchment:
+            table.loc[catchment, CATCHMENT_COLUMNS] = self.catchments.loc[catchment, CATCHMENT_COLUMNS].to_numpy()
+
+        # Озеленение (зависит от итогов по типам среды, поэтому пересчитывается целиком)
+        table["sum_population"] = table["sum_population"].astype(float)
+        allocation = allocate_green(table["sum_population"], table["city_model"], self.green_total)
+        for col in allocation.columns:
+            table[col] = allocation[col]
+
+        # Плотность
+        if rows:
+            density = density_columns(table.loc[rows, "city_model"], table.loc[rows, "sum_population"],
+                                      table.loc[rows].geometry.area)
+            table.loc[rows, density.columns] = density.to_numpy()
+
+        # Потенциал заселения зависит только от мест в сервисах
+        if catchment:
+            updated = calculate_and_update(gpd.GeoDataFrame(table.loc[catchment].copy(), crs=table.crs))
+            for col in ["new_population", "new_population_dop", "need_dop_service"]:
+                table[col] = table[col].astype(object)
+                table.loc[catchment, col] = updated[col].astype(object).to_numpy()
+
+        self.living = gpd.GeoDataFrame(table[self.columns], geometry="geometry", crs=self.living.crs)
+
+    # --- Итоговый балл ---
+
+    def _score(self):
+        """
+        Итоговый балл и категория как в analyze_zones. Статистики корреляции
+        обновляются только по оцениваемым зонам, у которых изменились признаки;
+        минимумы и максимумы признаков — векторным проходом по таблице.
+        """
+        zones_0 = self.living.copy()
+        zones_0[CORE_COLS + EXTRA_COLS] = zones_0[CORE_COLS + EXTRA_COLS].apply(pd.to_numeric, errors="coerce")
+
+        mask = score_mask(zones_0).to_numpy()
+        scored = zones_0.loc[mask, CORE_COLS].astype(float)
+
+        previous = self._scored
+        if previous is not None:
+            common = scored.index.intersection(previous.index)
+            changed = common[~(scored.loc[common] == previous.loc[common]).all(axis=1).to_numpy()]
+            removed = previous.index.difference(scored.index).union(changed)
+            added = scored.index.difference(previous.index).union(changed)
+        if previous is None or len(removed) + len(added) > REFIT_SHARE * max(len(scored), 1):
+            self._stats = _CorrelationStats(scored.to_numpy())
+        else:
+            self._stats.remove(previous.loc[removed].to_numpy())
+            self._stats.add(scored.loc[added].to_numpy())
+        self._scored = scored
+
+        weights = correlation_weights(pd.DataFrame(self._stats.corr()))
+
+        total_score = pd.Series(np.nan, index=zones_0.index)
+        if mask.any():
+            total_score[mask] = positive_score(min_max_scale(scored), weights)
+        if (~mask).any():
+            total_score[~mask] = negative_score(zones_0.loc[~mask, EXTRA_COLS])
+        zones_0["total_score"] = total_score
+        zones_0["score_category"] = score_category(total_score)
+        return zones_0
@@ -0,0 +1,316 @@
+# instrumentation.py
+
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+import contextlib
+import multiprocessing
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: пиковая память через psutil, если он установлен
+    resource = None
+
+# Включение через переменные окружения:
+#   URBAN_PROFILE=1                               — запись стадий
+#   URBAN_PROFILE_OUTPUT=stages.json | trace.json — файл для записи при выходе
+#   URBAN_PROFILE_PROFILER=cprofile | pyinstrument — профилирование стадий
+#   URBAN_PROFILE_STAGES=имя1,имя2                 — профилировать только эти стадии
+# Стадии в рабочих процессах пулов записываются, если задача обёрнута в recorded():
+# записи возвращаются в основной процесс вместе с результатом (collect)
+_state = threading.local()
+_config = {
+    "enabled": os.environ.get("URBAN_PROFILE", "") not in ("", "0"),
+    "profiler": os.environ.get("URBAN_PROFILE_PROFILER") or None,
+    "profile_dir": os.environ.get("URBAN_PROFILE_DIR", "profiles"),
+    "profile_stages": set(filter(None, os.environ.get("URBAN_PROFILE_STAGES", "").split(","))) or None,
+}
+_records = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def enable(profiler=None, profile_dir="profiles", profile_stages=None, output=None):
+    """
+    Включение записи стадий.
+
+    Профилировщик запускается на внешней профилируемой стадии: вложенные
+    стадии попадают в её профиль (два профилировщика одновременно не работают).
+
+    :param profiler: str — None, "cprofile" или "pyinstrument"
+    :param profile_dir: str — папка для профилей стадий
+    :param profile_stages: list — имена стадий для профилирования (по умолчанию — все)
+    :param output: str — файл, в который записи сохраняются при выходе
+                    (*.trace.json — формат Chrome trace, иначе — JSON-лог)
+    """
+    _config.update(enabled=True, profiler=profiler, profile_dir=profile_dir,
+                   profile_stages=set(profile_stages) if profile_stages else None)
+    if output:
+        atexit.register(save, output)
+
+
+def disable():
+    _config["enabled"] = False
+
+
+def is_enabled():
+    return _config["enabled"]
+
+
+def get_records():
+    with _lock:
+        return list(_records)
+
+
+def reset():
+    with _lock:
+        _records.clear()
+
+
+def _is_worker():
+    return multiprocessing.parent_process() is not None
+
+
+def _rss_mb():
+    """
+    Текущий RSS процесса (МБ).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        return None
+
+
+def _peak_rss_mb():
+    """
+    Пиковый RSS процесса за всё время его работы (МБ).
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    except (ImportError, AttributeError):
+        return None
+
+
+def count_rows(obj):
+    """
+    Число строк таблиц в аргументах или результате стадии
+    (int для одной таблицы, список — для нескольких, None — если таблиц нет).
+    """
+    if isinstance(obj, pd.DataFrame):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        rows = [len(item) for item in obj if isinstance(item, pd.DataFrame)]
+        if rows:
+            return rows[0] if len(rows) == 1 else rows
+    return None
+
+
+def _start_profiler(name):
+    if getattr(_state, "profiling", False):
+        return None
+    if _config["profile_stages"] is not None and name not in _config["profile_stages"]:
+        return None
+    if _config["profiler"] == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if _config["profiler"] == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    return None
+
+
+def _stop_profiler(profiler, name, number):
+    os.makedirs(_config["profile_dir"], exist_ok=True)
+    suffix = f"_{os.getpid()}" if _is_worker() else ""
+    base = os.path.join(_config["profile_dir"], f"{number:04d}_{name}{suffix}")
+    if _config["profiler"] == "cprofile":
+        profiler.disable()
+        profiler.dump_stats(base + ".prof")
+        return base + ".prof"
+    profiler.stop()
+    with open(base + ".html", "w", encoding="utf-8") as f:
+        f.write(profiler.output_html())
+    return base + ".html"
+
+
+class _Stage:
+    def __init__(self, name, rows_in=None):
+        self.record = {"stage": name, "rows_in": rows_in}
+
+    def __enter__(self):
+        stack = getattr(_state, "stack", None)
+        if stack is None:
+            stack = _state.stack = []
+        self.record["parent"] = stack[-1] if stack else None
+        self.record["depth"] = len(stack)
+        stack.append(self.record["stage"])
+
+        self.profiler = _start_profiler(self.record["stage"])
+        if self.profiler is not None:
+            _state.profiling = True
+        self.rss = _rss_mb()
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        rss = _rss_mb()
+        peak = _peak_rss_mb()
+        _state.stack.pop()
+
+        with _lock:
+            number = len(_records)
+            self.record.update(
+                start_s=round(self.start - _origin, 6),
+                wall_time_s=round(wall, 6),
+                cpu_time_s=round(cpu, 6),
+                rss_delta_mb=None if rss is None or self.rss is None else round(rss - self.rss, 2),
+                process_peak_rss_mb=None if peak is None else round(peak, 2),
+                thread=threading.get_ident(),
+                pid=os.getpid(),
+                status="error" if exc_type else "ok",
+            )
+            _records.append(self.record)
+        if self.profiler is not None:
+            self.record["profile"] = _stop_profiler(self.profiler, self.record["stage"], number)
+            _state.profiling = False
+        return False
+
+
+def stage(name, rows_in=None):
+    """
+    Контекстный менеджер для замера участка кода (sjoin, overlay и т.п.).
+    При выключенной записи возвращает пустой контекст.
+    """
+    if not _config["enabled"]:
+        return _NULL_STAGE
+    return _Stage(name, rows_in)
+
+
+def instrument(func=None, name=None):
+    """
+    Декоратор стадии пайплайна: время, CPU, изменение RSS за стадию,
+    пиковый RSS процесса на момент окончания, число строк на входе и выходе. При выключенной записи вызывает
+    функцию напрямую.
+    """
+    if func is None:
+        return functools.partial(instrument, name=name)
+
+    stage_name = name or f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _config["enabled"]:
+            return func(*args, **kwargs)
+        with _Stage(stage_name, count_rows(args)) as record:
+            result = func(*args, **kwargs)
+            record["rows_out"] = count_rows(result)
+        return result
+
+    return wrapper
+
+
+def _run_recorded(func, config, *args, **kwargs):
+    global _origin
+    if config is not None:
+        _config.update(config["config"])
+        _origin = config["origin"]
+    with _lock:
+        start = len(_records)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        with _lock:
+            records = _records[start:]
+            del _records[start:]
+    return result, records
+
+
+def recorded(func):
+    """
+    Обёртка задачи для пула процессов: стадии, записанные в рабочем процессе,
+    возвращаются вместе с результатом. Результат задачи распаковывается collect().
+    Настройки записи и начало отсчёта времени передаются из основного процесса.
+    """
+    config = None
+    if _config["enabled"]:
+        config = {"config": dict(_config), "origin": _origin}
+    return functools.partial(_run_recorded, func, config)
+
+
+def collect(payload):
+    """
+    Результат задачи, обёрнутой recorded(); записи её стадий добавляются к записям процесса.
+    """
+    result, records = payload
+    with _lock:
+        _records.extend(records)
+    return result
+
+
+def save_json_log(path):
+    """
+    Запись стадий в JSON-лог (одна запись на строку).
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for record in get_records():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def save_chrome_trace(path):
+    """
+    Запись стадий в формате Chrome trace (chrome://tracing, Perfetto).
+    """
+    events = [
+        {
+            "name": record["stage"],
+            "ph": "X",
+            "ts": record["start_s"] * 1e6,
+            "dur": record["wall_time_s"] * 1e6,
+            "pid": record["pid"],
+            "tid": record["thread"],
+            "args": {key: record.get(key) for key in
+                     ("rows_in", "rows_out", "cpu_time_s", "rss_delta_mb", "process_peak_rss_mb", "status")},
+        }
+        for record in get_records()
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+def save(path):
+    # Рабочие процессы пулов не пишут файл: их записи собираются в основном процессе
+    if _is_worker():
+        return
+    if path.endswith(".trace.json"):
+        save_chrome_trace(path)
+    else:
+        save_json_log(path)
+
+
+if _config["enabled"] and os.environ.get("URBAN_PROFILE_OUTPUT"):
+    atexit.register(save, os.environ["URBAN_PROFILE_OUTPUT"])
@@ -0,0 +1,186 @@
+# map_rendering.py
+
+import os
+
+import numpy as np
+import shapely
+
+from id_scheme import format_id_columns
+from instrumentation import instrument
+
+RENDER_CRS = "EPSG:3857"
+GEO_CRS = "EPSG:4326"
+
+# Размер пикселя Web Mercator на нулевом уровне масштаба (м)
+ZOOM0_PIXEL_SIZE = 156543.03392804097
+# Допуск упрощения в долях пикселя
+PIXEL_TOLERANCE = 0.5
+# Число знаков координат в HTML (6 знаков — ~10 см)
+COORD_DECIMALS = 6
+
+# Слои итоговых карт: (файл, столбец, палитра, категориальный, симметричная шкала, подсказки)
+MAP_LAYERS = {
+    "deficit_density": ("calculate_density_population", "deficit_density", "RdYlGn", False, True,
+                        ["id_zones", "city_model", "sum_population", "density_population", "limit_density", "deficit_density"]),
+    "difference_from_normative": ("difference_from_normative_green", "difference_from_normative", "RdYlGn", False, True,
+                                  ["id_zones", "city_model", "green_per_capita", "difference_from_normative"]),
+    "need_dop_service": ("calculating_potential_populating", "need_dop_service", "Set1", True, False,
+                         ["id_zones", "need_dop_service", "new_population", "new_population_dop"]),
+    "total_score": ("total_score_new_population1", "total_score", "YlGnBu", False, False,
+                    ["id_zones", "need_dop_service", "new_population", "total_score", "score_category"]),
+}
+
+
+def zoom_tolerance(zoom):
+    """
+    Допуск упрощения (м в EPSG:3857) для уровня масштаба веб-карты.
+    """
+    return ZOOM0_PIXEL_SIZE / 2 ** zoom * PIXEL_TOLERANCE
+
+
+def simplify_geometries(gdf, tolerance):
+    """
+    Упрощение геометрий с сохранением топологии покрытия: общие границы
+    соседних зон упрощаются одинаково (shapely.coverage_simplify). Если покрытие
+    некорректно или shapely старше 2.1 — поэлементное упрощение с preserve_topology.
+    """
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty].to_crs(RENDER_CRS)
+    geoms = gdf.geometry.values
+    polygonal = np.isin(shapely.get_type_id(geoms), [3, 6]).all()
+
+    # coverage_simplify не проверяет покрытие сам и на перекрытиях даёт битую топологию
+    if polygonal and hasattr(shapely, "coverage_simplify") and shapely.coverage_is_valid(geoms):
+        simplified = shapely.coverage_simplify(geoms, tolerance)
+    else:
+        simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+
+    gdf = gdf.copy()
+    gdf.geometry = simplified
+    return gdf
+
+
+def quantize_coordinates(gdf, decimals=COORD_DECIMALS):
+    """
+    Округление координат в EPSG:4326 до заданного числа знаков.
+    """
+    gdf = gdf.to_crs(GEO_CRS).copy()
+    gdf.geometry = shapely.set_precision(gdf.geometry.values, 10 ** -decimals, mode="pointwise")
+    return gdf
+
+
+def prepare_layer(gdf, columns, zoom):
+    """
+    Облегчённый слой для веб-карты: только нужные столбцы, упрощение
+    под уровень масштаба, квантованные координаты и строковые id.
+    """
+    columns = [col for col in dict.fromkeys(columns) if col in gdf.columns]
+    layer = gdf[columns + [gdf.geometry.name]]
+    layer = simplify_geometries(layer, zoom_tolerance(zoom))
+    return format_id_columns(quantize_coordinates(layer))
+
+
+def _color_limits(gdf, column, symmetric):
+    if not symmetric:
+        return None, None
+    vmax = np.nanmax(np.abs(gdf[column].astype(float).to_numpy()))
+    return -vmax, vmax
+
+
+@instrument
+def export_interactive_map(gdf, column, path, cmap="YlGnBu", categorical=False, symmetric=False,
+                           tooltip=None, zoom=13):
+    """
+    Интерактивная HTML-карта (folium) по облегчённому слою.
+
+    :param zoom: int — уровень масштаба, под который упрощаются геометрии
+    """
+    tooltip = tooltip or [column]
+    layer = prepare_layer(gdf, [column] + tooltip, zoom)
+    vmin, vmax = _color_limits(layer, column, symmetric)
+
+    kwargs = {} if categorical else {"vmin": vmin, "vmax": vmax}
+    m = layer.explore(
+        column=column,
+        cmap=cmap,
+        categorical=categorical,
+        legend=True,
+        tooltip=[col for col in tooltip if col in layer.columns],
+        style_kwds={"color": "grey", "weight": 0.5, "fillOpacity": 0.65},
+        tiles="CartoDB positron",
+        **kwargs,
+    )
+    m.save(path)
+    return path
+
+
+@instrument
+def render_static_png(gdf, column, path, cmap="YlGnBu", categorical=False, symmetric=False,
+                      title=None, width_px=1920, height_px=1200, dpi=150):
+    """
+    Статическая PNG-карта без браузера: геометрии упрощаются до размера
+    пикселя итогового изображения и рисуются одной коллекцией matplotlib.
+    """
+    # Отдельная фигура с Agg-холстом: глобальный backend (inline в ноутбуках) не меняется
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    layer = gdf[[column, gdf.geometry.name]].to_crs(RENDER_CRS)
+    minx, miny, maxx, maxy = layer.total_bounds
+    pixel_size = max((maxx - minx) / width_px, (maxy - miny) / height_px)
+    layer = simplify_geometries(layer, pixel_size * PIXEL_TOLERANCE)
+    vmin, vmax = _color_limits(layer, column, symmetric)
+
+    fig = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    layer.plot(
+        column=column,
+        cmap=cmap,
+        categorical=categorical,
+        vmin=vmin,
+        vmax=vmax,
+        legend=True,
+        linewidth=0.1,
+        edgecolor="grey",
+        missing_kwds={"color": "lightgrey"},
+        ax=ax,
+    )
+    ax.set_axis_off()
+    if title:
+        ax.set_title(title)
+    fig.savefig(path, dpi=dpi, bbox_inches="tight")
+    return path
+
+
+@instrument
+def export_city_maps(living_zones, zones_0, output_folder, zones_dop=None, html=True, png=True, zoom=13):
+    """
+    Пакетный экспорт итоговых карт города (HTML и PNG) без браузера.
+
+    :param living_zones: GeoDataFrame — жилые зоны с deficit_density, difference_from_normative, need_dop_service
+    :param zones_0: GeoDataFrame — результат total_score_new_population.analyze_zones
+    :param output_folder: str — папка для карт
+    :param zones_dop: GeoDataFrame — результат total_score_new_population_dop.analyze_zones
+    :return: list — пути созданных файлов
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    sources = {name: living_zones for name in MAP_LAYERS}
+    sources["total_score"] = zones_0
+    jobs = [(name, sources[name], MAP_LAYERS[name][0]) for name in MAP_LAYERS]
+    if zones_dop is not None:
+        jobs.append(("total_score", zones_dop, "total_score_new_population_dop1"))
+
+    paths = []
+    for name, gdf, filename in jobs:
+        _, column, cmap, categorical, symmetric, tooltip = MAP_LAYERS[name]
+        if column not in gdf.columns:
+            print(f"⚠️ Пропущено: нет столбца {column}")
+            continue
+        base = os.path.join(output_folder, filename)
+        if html:
+            paths.append(export_interactive_map(gdf, column, base + ".html", cmap, categorical, symmetric, tooltip, zoom))
+        if png:
+            paths.append(render_static_png(gdf, column, base + ".png", cmap, categorical, symmetric, title=column))
+        print(f"✅ Сохранено: {filename}")
+    return paths
@@ -0,0 +1,112 @@
+# population_balancing.py
+
+import logging
+
+import numpy as np
+
+from instrumentation import instrument
+
+logger = logging.getLogger(__name__)
+
+# Стратегии распределения населения по жилым зданиям
+STRATEGIES = ("living_area", "floor_weighted")
+
+# Предельная этажность, учитываемая в весе здания, по модели города
+# (для зданий без city_model этажность не ограничивается)
+FLOOR_CAPS = {
+    "low_rise": 4,
+    "medium": 9,
+    "central": 16,
+}
+
+# Веса хранятся целыми числами в сотых долях м²: распределение считается
+# в целочисленной арифметике и не зависит от порядка и разбиения на части
+WEIGHT_SCALE = 100
+
+
+def building_weights(living_buildings, strategy="living_area", floor_caps=None):
+    """
+    Целочисленные веса жилых зданий.
+
+    living_area    — пропорционально жилой площади;
+    floor_weighted — площадь застройки × этажность, ограниченная по city_model.
+
+    :return: np.ndarray[int64]
+    """
+    if strategy == "living_area":
+        area = living_buildings["living_area"].to_numpy(dtype=float)
+    elif strategy == "floor_weighted":
+        caps = FLOOR_CAPS if floor_caps is None else floor_caps
+        floors = living_buildings["number_of_floors"].fillna(1).to_numpy(dtype=float)
+        if "city_model" in living_buildings.columns:
+            cap = living_buildings["city_model"].map(caps).to_numpy(dtype=float)
+            floors = np.where(np.isnan(cap), floors, np.minimum(floors, cap))
+        else:
+            logger.warning("Нет столбца city_model: этажность не ограничивается")
+        area = living_buildings["footprint_area"].to_numpy(dtype=float) * floors
+    else:
+        raise ValueError(f"Неизвестная стратегия балансировки: {strategy}. Доступны: {', '.join(STRATEGIES)}")
+
+    area = np.nan_to_num(area, nan=0.0)
+    return np.round(np.clip(area, 0, None) * WEIGHT_SCALE).astype(np.int64)
+
+
+def largest_remainder(weights, population, total_weight=None):
+    """
+    Целочисленное распределение population пропорционально весам методом
+    наибольших остатков: сумма результата в точности равна population.
+    Равные остатки разрешаются в порядке следования зданий. Сложность O(n).
+
+    :param weights: np.ndarray[int64] — веса
+    :param population: int — распределяемое население
+    :param total_weight: int — сумма весов (если уже известна)
+    :return: np.ndarray[int64]
+    """
+    population = int(population)
+    total_weight = int(weights.sum()) if total_weight is None else total_weight
+    if total_weight <= 0:
+        raise ValueError("Нет жилых зданий с ненулевым весом")
+
+    result, remainder = np.divmod(weights * population, total_weight)
+
+    deficit = population - int(result.sum())
+    if deficit > 0:
+        n = len(weights)
+        threshold = np.partition(remainder, n - deficit)[n - deficit]
+        take = remainder > threshold
+        ties = np.flatnonzero(remainder == threshold)[:deficit - int(take.sum())]
+        take[ties] = True
+        result[take] += 1
+    return result
+
+
+def balance_population(living_buildings, population, strategy="living_area", floor_caps=None):
+    """
+    Население жилых зданий для заданной численности. Для пересчёта с другой
+    численностью веса building_weights передаются напрямую в largest_remainder.
+
+    :return: np.ndarray[int64] — население в порядке строк living_buildings
+    """
+    return largest_remainder(building_weights(living_buildings, strategy, floor_caps), population)
+
+
+@instrument
+def get_balanced_buildings(living_buildings, population, strategy="living_area", floor_caps=None):
+    """
+    Распределение населения города по жилым зданиям.
+
+    :param living_buildings: GeoDataFrame — жилые здания (living_area; для floor_weighted —
+                             footprint_area, number_of_floors и, по возможности, city_model)
+    :param population: int — численность населения
+    :param strategy: str — "living_area" или "floor_weighted"
+    :param floor_caps: dict — предельная этажность по city_model (по умолчанию FLOOR_CAPS)
+    :return: GeoDataFrame — копия living_buildings со столбцом population
+    """
+    if population is None:
+        raise ValueError("Не задана численность населения")
+    if living_buildings.empty:
+        raise ValueError("Нет жилых зданий")
+
+    living_buildings = living_buildings.copy()
+    living_buildings["population"] = balance_population(living_buildings, population, strategy, floor_caps)
+    return living_buildings
@@ -4,6 +4,9 @@ import pandas as pd
 import geopandas as gpd
 import numpy as np
 
+from id_scheme import make_ids
+from instrumentation import instrument, stage
+
 # Данные для типов сервисов
 SERVICE_TYPES = [
     {
@@ -58,6 +61,7 @@ BUFFER_SIZES = {
     "polyclinic_low_rise": 1000,
 }
 
+@instrument
 def process_service_data(school, kindergarten, polyclinic, balanced_buildings):
     """
     Обработка данных о сервисах и их интеграция с данными зданий.
@@ -73,15 +77,15 @@ def process_service_data(school, kindergarten, polyclinic, balanced_buildings):
     """
 
     # 1. Обработка столбцов с id_service для разных типов объектов
-    school['id_service'] = ["3." + str(i+1) for i in range(len(school))]
+    school['id_service'] = make_ids(school, "school")
     col_3 = school.pop('id_service')
     school.insert(0, 'id_service', col_3)
 
-    kindergarten['id_service'] = ["4." + str(i+1) for i in range(len(kindergarten))]
+    kindergarten['id_service'] = make_ids(kindergarten, "kindergarten")
     col_4 = kindergarten.pop('id_service')
     kindergarten.insert(0, 'id_service', col_4)
 
-    polyclinic['id_service'] = ["5." + str(i+1) for i in range(len(polyclinic))]
+    polyclinic['id_service'] = make_ids(polyclinic, "polyclinic")
     col_4 = polyclinic.pop('id_service')
     polyclinic.insert(0, 'id_service', col_4)
 
@@ -92,7 +96,8 @@ def process_service_data(school, kindergarten, polyclinic, balanced_buildings):
     combined_service = combined_service.to_crs(balanced_buildings.crs)
 
     service_filtered = balanced_buildings[["id_build", "id_zones", "is_living", "city_model", "build_floor_area", "geometry"]]
-    joined = gpd.sjoin(combined_service, service_filtered, how="left", predicate="within").drop(columns=["index_right"], errors="ignore")
+    with stage("process_service_data.sjoin", len(combined_service)):
+        joined = gpd.sjoin(combined_service, service_filtered, how="left", predicate="within").drop(columns=["index_right"], errors="ignore")
     joined["source"] = np.where(joined["id_build"].notna(), "within", np.nan)
 
     # Фильтрация точек без совпадений
@@ -106,15 +111,17 @@ def process_service_data(school, kindergarten, polyclinic, balanced_buildings):
         return balanced_buildings.loc[nearest_building_idx]
 
     # Перенос атрибутов ближайших зданий
-    for idx, row in missing.iterrows():
-        nearest_building = find_nearest_building(row)
-        for col in ["id_build", "id_zones", "is_living", "city_model", "build_floor_area"]:
-            missing.at[idx, col] = nearest_building[col]
-        missing.at[idx, "source"] = "nearest"
+    with stage("process_service_data.nearest_buildings", len(missing)):
+        for idx, row in missing.iterrows():
+            nearest_building = find_nearest_building(row)
+            for col in ["id_build", "id_zones", "is_living", "city_model", "build_floor_area"]:
+                missing.at[idx, col] = nearest_building[col]
+            missing.at[idx, "source"] = "nearest"
 
     # Объединение всех точек обратно в основной датафрейм
     combined_service = pd.concat([joined[joined["id_build"].notna()], missing], ignore_index=True)
     combined_service = combined_service[combined_service.geometry.notna()].copy()
+    combined_service[["id_build", "id_zones"]] = combined_service[["id_build", "id_zones"]].astype("Int64")
 
     # Присваиваем столбцы, связанные с интеграцией
     combined_service["is_integrated"] = combined_service["is_living"] == True
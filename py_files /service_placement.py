@@ -0,0 +1,199 @@
+# service_placement.py
+
+import heapq
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from instrumentation import instrument, stage
+from population_balancing import largest_remainder
+from service_data_processing import SERVICE_TYPES, BUFFER_SIZES
+
+# Метрическая СК, как в social_infrastructure_mapper
+PLACEMENT_CRS = 32637
+
+# Радиус обслуживания увеличивается так же, как буфер в process_and_buffer
+COVERAGE_FACTOR = 1.2
+
+# Жителей на одно место (обратное к коэффициенту 2.8 в calculate_population)
+PEOPLE_PER_PLACE = {
+    "school": 2.8,
+    "kindergarten": 2.8,
+    "polyclinic": 1.0,
+}
+
+PLACEABLE_SERVICES = list(PEOPLE_PER_PLACE)
+
+
+def site_capacity(service, area, is_integrated=False):
+    """
+    Вместимость объекта по bricks из SERVICE_TYPES: первый brick
+    подходящего типа размещения, площадь которого не меньше area.
+    """
+    service_type = next(s for s in SERVICE_TYPES if s["name"] == service)
+    bricks = [b for b in service_type["bricks"] if b["is_integrated"] == bool(is_integrated)]
+    for brick in bricks:
+        if area <= brick["area"]:
+            return brick["capacity"]
+    return bricks[-1]["capacity"]
+
+
+def prepare_candidates(candidates):
+    """
+    Площадки-кандидаты: свободные участки или здания. Площадь берётся из area,
+    build_floor_area или площади геометрии; встроенное размещение — для жилых зданий.
+    """
+    candidates = candidates.to_crs(PLACEMENT_CRS).reset_index(drop=True)
+    candidates = candidates[candidates.geometry.notna() & ~candidates.geometry.is_empty].reset_index(drop=True)
+
+    for col in ("area", "build_floor_area"):
+        if col in candidates.columns:
+            area = candidates[col].astype(float)
+            break
+    else:
+        area = candidates.geometry.area
+    candidates["site_area"] = area.fillna(pd.Series(candidates.geometry.area, index=candidates.index))
+    candidates["is_integrated"] = (candidates["is_living"] == True) if "is_living" in candidates.columns else False
+    return candidates
+
+
+@instrument
+def build_coverage_matrix(candidates, zones, service):
+    """
+    Разреженная матрица покрытия: кандидат i покрывает зону j, если расстояние
+    до зоны не больше радиуса BUFFER_SIZES для city_model зоны.
+
+    :return: scipy.sparse.csr_matrix (кандидаты × зоны), bool
+    """
+    from scipy.sparse import csr_matrix
+
+    rows, cols = [], []
+    zone_geoms = zones.geometry.values
+    for city_model, positions in zones.groupby("city_model").indices.items():
+        radius = BUFFER_SIZES.get(f"{service}_{city_model}")
+        if radius is None:
+            continue
+        tree = shapely.STRtree(zone_geoms[positions])
+        with stage(f"build_coverage_matrix.query.{service}", len(candidates)):
+            candidate_idx, zone_idx = tree.query(candidates.geometry.values, predicate="dwithin",
+                                                 distance=radius * COVERAGE_FACTOR)
+        rows.append(candidate_idx)
+        cols.append(positions[zone_idx])
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    return csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(len(candidates), len(zones)))
+
+
+def greedy_max_coverage(coverage, demand, max_sites=None, available=None):
+    """
+    Жадный алгоритм максимального покрытия с ленивым пересчётом выигрыша:
+    выигрыш кандидата только убывает по мере покрытия зон, поэтому пересчитывается
+    лишь кандидат с вершины очереди.
+
+    :param coverage: csr_matrix — матрица покрытия (кандидаты × зоны)
+    :param demand: np.ndarray — вес зон (население)
+    :param max_sites: int — ограничение числа площадок (по умолчанию — до полного покрытия)
+    :param available: np.ndarray[bool] — доступные кандидаты
+    :return: list — (кандидат, индексы вновь покрытых зон)
+    """
+    demand = np.asarray(demand, dtype=float)
+    uncovered = demand > 0
+    gains = coverage @ demand
+    if available is not None:
+        gains = np.where(available, gains, 0)
+
+    heap = [(-gain, i) for i, gain in enumerate(gains) if gain > 0]
+    heapq.heapify(heap)
+
+    selected = []
+    while heap and (max_sites is None or len(selected) < max_sites):
+        neg_gain, i = heapq.heappop(heap)
+        row = coverage.indices[coverage.indptr[i]:coverage.indptr[i + 1]]
+        newly = row[uncovered[row]]
+        gain = demand[newly].sum()
+        if gain <= 0:
+            continue
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, i))
+            continue
+        selected.append((i, newly))
+        uncovered[newly] = False
+    return selected
+
+
+@instrument
+def place_services(living_zones, candidates, max_sites=None):
+    """
+    Подбор площадок для недостающих сервисов в зонах с need_dop_service.
+
+    Для каждого сервиса площадки выбираются жадным максимальным покрытием
+    населения зон (sum_population + new_population_dop), ещё не обеспеченных
+    сервисом. Вместимость площадки определяется по bricks и делится между
+    покрытыми зонами пропорционально населению; каждый кандидат используется
+    не более одного раза.
+
+    :param living_zones: GeoDataFrame — результат calculate_and_update
+    :param candidates: GeoDataFrame — свободные участки или здания-кандидаты
+    :param max_sites: int | dict — ограничение числа площадок (общее или по сервисам)
+    :return: (sites, added_places) — площадки и добавляемые места по зонам
+             (DataFrame с индексом living_zones и столбцами {service}_free_places)
+    """
+    zones = living_zones.to_crs(PLACEMENT_CRS)
+    candidates = prepare_candidates(candidates)
+    available = np.ones(len(candidates), dtype=bool)
+
+    population = (zones["sum_population"].fillna(0) + zones["new_population_dop"].fillna(0)).to_numpy(dtype=float)
+    added_places = pd.DataFrame(0, index=living_zones.index,
+                                columns=[f"{service}_free_places" for service in PLACEABLE_SERVICES])
+    sites = []
+
+    for service in PLACEABLE_SERVICES:
+        demand = np.where(zones["need_dop_service"] == service, population, 0)
+        if not demand.any():
+            continue
+
+        coverage = build_coverage_matrix(candidates, zones, service)
+        limit = max_sites.get(service) if isinstance(max_sites, dict) else max_sites
+        with stage(f"place_services.greedy.{service}", len(candidates)):
+            selected = greedy_max_coverage(coverage, demand, limit, available)
+
+        for i, covered in selected:
+            available[i] = False
+            capacity = site_capacity(service, candidates.at[i, "site_area"], candidates.at[i, "is_integrated"])
+            weights = np.round(demand[covered]).astype(np.int64)
+            places = largest_remainder(weights, capacity) if weights.sum() > 0 else np.zeros(len(covered), dtype=np.int64)
+            added_places.iloc[covered, added_places.columns.get_loc(f"{service}_free_places")] += places
+
+            sites.append({
+                "service": service,
+                "capacity": capacity,
+                "covered_zones": len(covered),
+                "covered_population": int(demand[covered].sum()),
+                "required_places": int(np.ceil(demand[covered].sum() / PEOPLE_PER_PLACE[service])),
+                "is_integrated": bool(candidates.at[i, "is_integrated"]),
+                "site_area": candidates.at[i, "site_area"],
+                "geometry": candidates.geometry.iat[i],
+            })
+        print(f"🔹 {service}: площадок {len(selected)}, покрыто зон {int(sum(len(c) for _, c in selected))}")
+
+    sites = gpd.GeoDataFrame(sites, columns=["service", "capacity", "covered_zones", "covered_population",
+                                             "required_places", "is_integrated", "site_area", "geometry"],
+                             geometry="geometry", crs=PLACEMENT_CRS)
+    return sites, added_places
+
+
+@instrument
+def apply_placement(living_zones, added_places):
+    """
+    Добавление мест новых площадок к {service}_free_places и пересчёт
+    new_population / new_population_dop / need_dop_service.
+    """
+    from calculating_potential_populating import calculate_and_update
+
+    living_zones = living_zones.copy()
+    for col in added_places.columns:
+        living_zones[col] = living_zones[col].fillna(0) + added_places[col]
+    return calculate_and_update(living_zones)
@@ -1,7 +1,40 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
+from id_scheme import as_id_key
+from instrumentation import instrument, stage
 
+# Режимы зоны обслуживания: круговой буфер или доступность по матрице времени
+CATCHMENT_MODES = ("buffer", "network")
+
+# Порог времени для сервиса: buffer_zone * 1.2 / 50 (мин), как в calculating_provision
+METERS_PER_MINUTE = 50
+
+
+def get_sparse_matrix(matrix):
+    """
+    Разреженная матрица времени здания -> сервисы (CSR): хранятся только
+    достижимые пары. Собирается по столбцам DataFrame без плотной копии всей
+    матрицы; готовая scipy.sparse-матрица только приводится к CSR.
+    """
+    from scipy.sparse import csc_matrix, issparse
+
+    if issparse(matrix):
+        return matrix.tocsr()
+
+    data, indices, indptr = [np.empty(0)], [np.empty(0, dtype=np.int64)], [0]
+    for _, column in matrix.items():
+        values = column.to_numpy(dtype=float)
+        rows = np.flatnonzero(np.isfinite(values))
+        data.append(values[rows])
+        indices.append(rows)
+        indptr.append(indptr[-1] + len(rows))
+    sparse = csc_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=matrix.shape)
+    return sparse.tocsr()
+
+
+@instrument
 def process_and_buffer(gdf):
     """
     Подготовка слоя учреждений: переименование колонок, перевод СК и создание буферов.
@@ -16,10 +49,13 @@ def process_and_buffer(gdf):
         if col not in gdf.columns:
             raise ValueError(f"Отсутствует обязательный столбец: {col}")
 
+    gdf['id_service'] = as_id_key(gdf['id_service'])
+
     gdf['geometry'] = gdf.buffer(gdf['buffer_zone'] * 1.2)
     return gdf[['id_service', 'free_places', 'employed_places', 'geometry']].to_crs(32637)
 
 
+@instrument
 def intersect_and_aggregate(buffer_gdf, zones_gdf, label):
     """
     Определяет учреждения, буфер которых пересекается с жилыми зонами,
@@ -28,11 +64,13 @@ def intersect_and_aggregate(buffer_gdf, zones_gdf, label):
     buffer_gdf = buffer_gdf.to_crs(3857)
     zones_gdf = zones_gdf.to_crs(3857)
 
-    intersected = gpd.overlay(buffer_gdf, zones_gdf, how='intersection')
+    with stage(f"intersect_and_aggregate.overlay.{label}", len(buffer_gdf)):
+        intersected = gpd.overlay(buffer_gdf, zones_gdf, how='intersection')
     intersected['intersection_area'] = intersected.area
 
     intersected['centroid'] = intersected.centroid
-    joined = gpd.sjoin(intersected.set_geometry('centroid'), zones_gdf, predicate='within')
+    with stage(f"intersect_and_aggregate.sjoin.{label}", len(intersected)):
+        joined = gpd.sjoin(intersected.set_geometry('centroid'), zones_gdf, predicate='within')
 
     idx_max_area = joined.groupby('index_right')['intersection_area'].idxmax()
     selected = joined.loc[idx_max_area]
@@ -53,11 +91,92 @@ def intersect_and_aggregate(buffer_gdf, zones_gdf, label):
     ]
 
 
-def process_services(zones, kindergarten, school, polyclinic):
+@instrument
+def network_catchment(services, zones_gdf, label, matrix, balanced_buildings, combined_service, sparse_matrix=None):
+    """
+    Зоны обслуживания по матрице времени вместо буферов: сервис обслуживает
+    зону, если из её зданий он достижим за buffer_zone * 1.2 / 50 минут.
+    Для каждой зоны выбирается сервис, достижимый для наибольшего населения
+    (при равенстве — для большего числа зданий). Без наложения полигонов.
+
+    :param services: GeoDataFrame — слой учреждений (результат calculating_provision)
+    :param matrix: DataFrame — матрица времени: индекс — здания, столбцы — combined_service
+    :param balanced_buildings: GeoDataFrame — здания с id_zones (join_zones_to_buildings) и population
+    :param combined_service: GeoDataFrame — объединённый слой сервисов (столбцы матрицы)
+    :param sparse_matrix: scipy.sparse — готовая разреженная матрица в порядке строк и столбцов matrix
+    """
+    services = services.rename(columns={
+        'carried_capacity_without': 'free_places',
+        'carried_capacity_within': 'employed_places'
+    })
+    services['id_service'] = as_id_key(services['id_service'])
+    services = services.drop_duplicates('id_service')
+
+    sparse = get_sparse_matrix(matrix if sparse_matrix is None else sparse_matrix).tocoo()
+
+    # Строки матрицы -> зоны и население зданий, столбцы -> id_service и порог времени
+    buildings = balanced_buildings.reindex(matrix.index.astype(int))
+    row_zone = as_id_key(buildings['id_zones']).array
+    row_population = buildings['population'].fillna(0).to_numpy(dtype=float)
+
+    columns = combined_service.reindex(matrix.columns.astype(int))
+    col_service = as_id_key(columns['id_service'])
+    thresholds = services.set_index('id_service')['buffer_zone'] * 1.2 / METERS_PER_MINUTE
+    col_threshold = col_service.map(thresholds).astype(float).to_numpy(na_value=np.nan)
+
+    with stage(f"network_catchment.{label}", sparse.nnz):
+        reachable = sparse.data <= col_threshold[sparse.col]
+        rows, cols = sparse.row[reachable], sparse.col[reachable]
+        links = pd.DataFrame({
+            'id_zones': row_zone[rows],
+            'id_service': col_service.array[cols],
+            'population': row_population[rows],
+        }).dropna(subset=['id_zones', 'id_service'])
+
+        selected = (
+            links.groupby(['id_zones', 'id_service'], observed=True)
+            .agg(population=('population', 'sum'), buildings=('population', 'size'))
+            .reset_index()
+            .sort_values(['id_zones', 'population', 'buildings', 'id_service'],
+                         ascending=[True, False, False, True])
+            .drop_duplicates('id_zones')
+        )
+    selected = selected.merge(services[['id_service', 'free_places', 'employed_places']], on='id_service', how='left')
+
+    result = zones_gdf[['id_zones']].reset_index(drop=True).assign(id_zones=lambda df: as_id_key(df['id_zones']))
+    result = result.merge(selected, on='id_zones', how='left')
+
+    result.rename(columns={
+        'free_places': f'{label}_free_places',
+        'employed_places': f'{label}_employed_places',
+        'id_service': f'{label}_id_service'
+    }, inplace=True)
+
+    return result[
+        [f'{label}_free_places', f'{label}_employed_places', f'{label}_id_service']
+    ]
+
+
+@instrument
+def process_services(zones, kindergarten, school, polyclinic, catchment_mode="buffer",
+                     matrix=None, balanced_buildings=None, combined_service=None, sparse_matrix=None):
     """
     Основной цикл обработки: буферизация, пересечение и агрегирование для всех типов учреждений.
     Возвращает GeoDataFrame с информацией по свободным/занятым местам в пределах жилых зон.
+
+    :param catchment_mode: str — "buffer" (круговые буферы) или "network" (доступность по matrix;
+                           нужны matrix, balanced_buildings и combined_service)
+    :param sparse_matrix: scipy.sparse — готовая разреженная матрица для режима network
+                          (по умолчанию строится из matrix один раз на все слои)
     """
+    if catchment_mode not in CATCHMENT_MODES:
+        raise ValueError(f"Неизвестный режим зоны обслуживания: {catchment_mode}")
+    if catchment_mode == "network" and any(x is None for x in (matrix, balanced_buildings, combined_service)):
+        raise ValueError("Для режима network нужны matrix, balanced_buildings и combined_service")
+
+    if catchment_mode == "network":
+        sparse_matrix = get_sparse_matrix(matrix if sparse_matrix is None else sparse_matrix)
+
     zones_out = zones.copy()
 
     layers = {
@@ -68,24 +187,26 @@ def process_services(zones, kindergarten, school, polyclinic):
 
     for label, gdf in layers.items():
         print(f"🔹 Обработка слоя: {label}")
-        buffered = process_and_buffer(gdf)
-        agg = intersect_and_aggregate(buffered, zones, label)
+        if catchment_mode == "network":
+            agg = network_catchment(gdf, zones, label, matrix, balanced_buildings, combined_service, sparse_matrix)
+        else:
+            buffered = process_and_buffer(gdf)
+            agg = intersect_and_aggregate(buffered, zones, label)
 
         # Инициализация колонок по умолчанию
         for col in [f'{label}_free_places', f'{label}_employed_places', f'{label}_id_service']:
-            zones_out[col] = None if 'id_service' in col else pd.NA
+            zones_out[col] = pd.array([pd.NA] * len(zones_out), dtype="Int64") if 'id_service' in col else pd.NA
 
         living_mask = zones_out['is_living_zones'] == True
 
         # Заполняем значения только для жилых зон
         zones_out.loc[living_mask, f'{label}_free_places'] = agg.loc[living_mask, f'{label}_free_places']
         zones_out.loc[living_mask, f'{label}_employed_places'] = agg.loc[living_mask, f'{label}_employed_places']
-        zones_out.loc[living_mask, f'{label}_id_service'] = agg.loc[living_mask, f'{label}_id_service']
+        zones_out.loc[living_mask, f'{label}_id_service'] = as_id_key(agg.loc[living_mask, f'{label}_id_service'])
 
         # Остальным проставляем нули и None
         zones_out[f'{label}_free_places'] = zones_out[f'{label}_free_places'].fillna(0)
         zones_out[f'{label}_employed_places'] = zones_out[f'{label}_employed_places'].fillna(0)
-        zones_out[f'{label}_id_service'] = zones_out[f'{label}_id_service'].replace('', None)
 
     living_zones = zones_out[zones_out["is_living_zones"] == True].copy()
     return living_zones
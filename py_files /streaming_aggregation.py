@@ -0,0 +1,211 @@
+# streaming_aggregation.py
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from city_model_processing import (
+    AREA_CRS,
+    GEO_CRS,
+    add_zone_attributes,
+    distribute_population_across_zones,
+    load_living_codes,
+    prepare_building_data,
+)
+from instrumentation import instrument, stage
+from population_balancing import building_weights
+
+# Число зданий в одной порции чтения
+CHUNK_SIZE = 100_000
+
+# Столбцы зданий, которые нужны для расчёта
+BUILDING_COLUMNS = ["is_living", "number_of_floors"]
+
+SUM_COLUMNS = ["footprint_area", "build_floor_area", "living_area", "non_living_area"]
+
+# Число корзин гистограммы остатков на проход при поиске порога округления
+HIST_BINS = 2 ** 16
+
+
+def iter_building_chunks(path, chunk_size=CHUNK_SIZE, columns=BUILDING_COLUMNS):
+    """
+    Чтение слоя зданий порциями: пакеты Arrow (pyogrio + pyarrow)
+    или, без pyarrow, read_dataframe со сдвигом skip_features.
+
+    :return: генератор GeoDataFrame
+    """
+    try:
+        import pyarrow  # noqa: F401
+        from pyogrio.raw import open_arrow
+    except ImportError:  # без pyarrow чтение частями через read_dataframe
+        open_arrow = None
+
+    if open_arrow is not None:
+        with open_arrow(path, columns=list(columns), batch_size=chunk_size, use_pyarrow=True) as (meta, reader):
+            geometry_name = meta["geometry_name"] or "wkb_geometry"
+            for batch in reader:
+                table = batch.to_pandas()
+                geometry = shapely.from_wkb(table.pop(geometry_name).to_numpy())
+                yield gpd.GeoDataFrame(table, geometry=geometry, crs=meta["crs"])
+        return
+
+    offset = 0
+    while True:
+        chunk = gpd.read_file(path, columns=list(columns), skip_features=offset, max_features=chunk_size)
+        if chunk.empty:
+            return
+        yield chunk
+        offset += len(chunk)
+
+
+def build_zone_tree(zones):
+    """
+    Пространственный индекс зон в AREA_CRS (как в join_zones_to_buildings).
+    """
+    return shapely.STRtree(zones.to_crs(AREA_CRS).geometry.values)
+
+
+def assign_zones(buildings, zone_tree):
+    """
+    Позиция зоны для каждого здания по центроиду (predicate="within");
+    -1 — здание вне зон. При нескольких зонах берётся первая.
+    """
+    centroids = buildings.to_crs(AREA_CRS).geometry.centroid.values
+    building_idx, zone_idx = zone_tree.query(centroids, predicate="within")
+    order = np.lexsort((zone_idx, building_idx))
+    building_idx, zone_idx = building_idx[order], zone_idx[order]
+    first = np.unique(building_idx, return_index=True)[1]
+
+    positions = np.full(len(buildings), -1, dtype=np.int64)
+    positions[building_idx[first]] = zone_idx[first]
+    return positions
+
+
+def _scan(path, zones, zone_tree, strategy, chunk_size):
+    """
+    Проход по слою зданий: подготовленная порция, позиции зон
+    и целочисленные веса жилых зданий (в порядке следования).
+    """
+    city_model = zones["city_model"].to_numpy(dtype=object)
+    for chunk in iter_building_chunks(path, chunk_size):
+        buildings = prepare_building_data(chunk)
+        positions = assign_zones(buildings, zone_tree)
+        buildings["city_model"] = np.where(positions >= 0, city_model[positions], None)
+        living = buildings["is_living"].to_numpy()
+        weights = building_weights(buildings[living], strategy)
+        yield buildings, positions, living, weights
+
+
+def _select_threshold(scan, total_weight, population, deficit):
+    """
+    Порог остатков для метода наибольших остатков без хранения всех остатков:
+    k-й по величине остаток ищется по гистограммам за несколько проходов.
+
+    :return: (порог, сколько зданий с остатком, равным порогу, получают +1)
+    """
+    low, high, k = 0, total_weight, deficit
+    while high - low > 1:
+        width = -(-(high - low) // HIST_BINS)
+        counts = np.zeros(HIST_BINS, dtype=np.int64)
+        for _, _, _, weights in scan():
+            remainder = weights * population % total_weight
+            inside = remainder[(remainder >= low) & (remainder < high)]
+            counts += np.bincount((inside - low) // width, minlength=HIST_BINS)
+
+        above = np.cumsum(counts[::-1])
+        bucket = HIST_BINS - 1 - int(np.searchsorted(above, k))
+        k -= int(above[HIST_BINS - 2 - bucket]) if bucket < HIST_BINS - 1 else 0
+        low, high = low + bucket * width, min(low + (bucket + 1) * width, high)
+    return low, k
+
+
+@instrument
+def aggregate_zone_data_streaming(buildings_path, zones, living_population, strategy="living_area",
+                                  chunk_size=CHUNK_SIZE):
+    """
+    Потоковый аналог prepare_building_data → join_zones_to_buildings →
+    assign_population_to_buildings → aggregate_zone_data: здания читаются
+    порциями, агрегаты накапливаются в массивах по зонам. Память не зависит
+    от числа зданий; результат совпадает с расчётом в памяти.
+
+    Население распределяется тем же методом наибольших остатков: первый
+    проход даёт сумму весов, затем порог остатков находится по гистограммам,
+    последний проход начисляет население зонам.
+
+    :param buildings_path: str — файл слоя зданий
+    :param zones: GeoDataFrame — зоны после add_zone_attributes
+    :param living_population: int — численность населения
+    :param strategy: str — стратегия population_balancing
+    :param chunk_size: int — число зданий в порции
+    :return: GeoDataFrame — зоны с sum_* и avg_number_of_floors
+    """
+    zones = zones.to_crs(AREA_CRS)
+    zone_tree = build_zone_tree(zones)
+    n_zones = len(zones)
+
+    def scan():
+        return _scan(buildings_path, zones, zone_tree, strategy, chunk_size)
+
+    # 1. Площади, этажность и сумма весов жилых зданий
+    sums = np.zeros((n_zones, len(SUM_COLUMNS)), dtype=np.longdouble)
+    floors = np.zeros(n_zones, dtype=np.longdouble)
+    counts = np.zeros(n_zones, dtype=np.int64)
+    total_weight = 0
+    with stage("aggregate_zone_data_streaming.areas"):
+        for buildings, positions, _, weights in scan():
+            inside = positions >= 0
+            np.add.at(sums, positions[inside], buildings.loc[inside, SUM_COLUMNS].to_numpy(dtype=float))
+            np.add.at(floors, positions[inside], buildings.loc[inside, "number_of_floors"].to_numpy(dtype=float))
+            counts += np.bincount(positions[inside], minlength=n_zones)
+            total_weight += int(weights.sum())
+
+    if total_weight <= 0:
+        raise ValueError("Нет жилых зданий с ненулевым весом")
+    population = int(living_population)
+
+    # 2. Целые части долей и порог остатков
+    with stage("aggregate_zone_data_streaming.population"):
+        base_total = sum(int((weights * population // total_weight).sum()) for _, _, _, weights in scan())
+        deficit = population - base_total
+        threshold, ties = _select_threshold(scan, total_weight, population, deficit) if deficit > 0 else (total_weight, 0)
+
+        # 3. Население зданий и суммы по зонам
+        zone_population = np.zeros(n_zones, dtype=np.int64)
+        for buildings, positions, living, weights in scan():
+            result, remainder = np.divmod(weights * population, total_weight)
+            extra = remainder > threshold
+            tied = np.flatnonzero(remainder == threshold)[:ties]
+            extra[tied] = True
+            ties -= len(tied)
+            result += extra
+
+            living_positions = positions[living]
+            inside = living_positions >= 0
+            np.add.at(zone_population, living_positions[inside], result[inside])
+
+    # Итог в том же виде, что aggregate_zone_data
+    present = counts > 0
+    aggregated = pd.DataFrame(sums[present].astype(float), columns=[f"sum_{col}" for col in SUM_COLUMNS])
+    aggregated.insert(0, "id_zones", zones["id_zones"].to_numpy()[present])
+    aggregated["sum_population"] = zone_population[present].astype(float)
+    aggregated["avg_number_of_floors"] = (floors[present] / counts[present]).astype(float)
+    aggregated = aggregated.sort_values("id_zones").round(2).reset_index(drop=True)
+    aggregated["avg_number_of_floors"] = aggregated["avg_number_of_floors"].round().astype(int)
+
+    zones = zones.merge(aggregated, on="id_zones", how="left").fillna(0)
+    return zones.to_crs(GEO_CRS)
+
+
+@instrument
+def process_city_model_streaming(zones, buildings_path, living_population, living_codes_path="living_codes.json",
+                                 balancing_strategy="living_area", chunk_size=CHUNK_SIZE):
+    """
+    Потоковый вариант process_city_model для слоёв зданий, не помещающихся в память.
+    Здания по отдельности не возвращаются.
+
+    :return: GeoDataFrame — зоны с населением
+    """
+    zones = add_zone_attributes(zones, load_living_codes(living_codes_path))
+    zones = aggregate_zone_data_streaming(buildings_path, zones, living_population, balancing_strategy, chunk_size)
+    return distribute_population_across_zones(zones)
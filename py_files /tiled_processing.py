@@ -0,0 +1,242 @@
+# tiled_processing.py
+
+import os
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+
+from city_model_processing import (
+    AREA_CRS,
+    GEO_CRS,
+    load_living_codes,
+    add_zone_attributes,
+    prepare_building_data,
+    assign_population_to_buildings,
+    join_zones_to_buildings,
+    aggregate_zone_data,
+    distribute_population_across_zones,
+)
+from service_data_processing import process_service_data
+from instrumentation import collect, instrument, recorded
+from window_processing import get_halo_size
+
+# Размер стороны тайла по умолчанию (м)
+TILE_SIZE = 5000
+
+# Число задач в обработке на один процесс: данные тайлов передаются в пул
+# по мере освобождения процессов, а не все сразу
+TASKS_PER_WORKER = 2
+
+# Служебные столбцы порядка сервисов при тайловой обработке
+LAYER_COL = "_layer"
+POSITION_COL = "_position"
+
+
+def make_tiles(layers, tile_size=TILE_SIZE):
+    """
+    Разбиение территории на квадратные тайлы в локальной UTM-проекции.
+    Возвращаются только тайлы, в которые попадает хотя бы один объект.
+
+    :param layers: list — GeoDataFrame, по охвату которых строится сетка
+    :param tile_size: float — сторона тайла в метрах
+    :return: GeoDataFrame — тайлы с id_tile в UTM-проекции
+    """
+    layers = [gdf.to_crs(GEO_CRS) for gdf in layers if gdf is not None and not gdf.empty]
+    if not layers:
+        raise ValueError("Нет объектов для разбиения на тайлы: все слои пусты")
+    utm_crs = layers[0].estimate_utm_crs()
+    points = gpd.GeoSeries(
+        pd.concat([gdf.to_crs(utm_crs).geometry.representative_point() for gdf in layers], ignore_index=True),
+        crs=utm_crs,
+    )
+
+    # Не меньше одного тайла по каждой оси, в том числе для вырожденного охвата (один объект)
+    minx, miny, maxx, maxy = points.total_bounds
+    xs = minx + np.arange(max(1, int(np.ceil((maxx - minx) / tile_size)))) * tile_size
+    ys = miny + np.arange(max(1, int(np.ceil((maxy - miny) / tile_size)))) * tile_size
+    grid = gpd.GeoSeries([box(x, y, x + tile_size, y + tile_size) for x in xs for y in ys], crs=utm_crs)
+
+    occupied = np.unique(grid.sindex.query(points, predicate="intersects")[1])
+    tiles = gpd.GeoDataFrame({"id_tile": np.arange(len(occupied))}, geometry=grid.iloc[occupied].values, crs=utm_crs)
+    print(f"🔹 Тайлов с данными: {len(tiles)} (сторона {tile_size} м)")
+    return tiles
+
+
+def assign_to_tiles(gdf, tiles):
+    """
+    Номер тайла для каждого объекта по его внутренней точке.
+    Объект на границе тайлов относится к первому найденному тайлу.
+    """
+    points = gdf.to_crs(tiles.crs).geometry.representative_point()
+    input_idx, tile_idx = tiles.sindex.query(points, predicate="intersects")
+    _, first = np.unique(input_idx, return_index=True)
+
+    result = np.full(len(gdf), -1)
+    result[input_idx[first]] = tiles["id_tile"].to_numpy()[tile_idx[first]]
+    return result
+
+
+def expand_tiles(tiles, halo):
+    """
+    Расширение тайлов на зону перекрытия halo (м).
+    """
+    return tiles.buffer(halo)
+
+
+def run_tiles(func, tasks, max_workers=None):
+    """
+    Запуск обработки тайлов в пуле процессов (max_workers=1 — последовательно в текущем процессе).
+    Задачи берутся из итератора tasks лениво: одновременно в пуле не больше
+    TASKS_PER_WORKER задач на процесс. Результаты возвращаются в порядке задач.
+    """
+    if max_workers == 1:
+        return [func(task) for task in tasks]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = enumerate(tasks)
+    task_func = recorded(func)
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(task_func, task): i
+                   for i, task in itertools.islice(tasks, max_workers * TASKS_PER_WORKER)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = collect(future.result())
+            for i, task in itertools.islice(tasks, len(done)):
+                pending[executor.submit(task_func, task)] = i
+    return [results[i] for i in range(len(results))]
+
+
+def _prepare_tile(task):
+    buildings, zones = task
+    buildings = prepare_building_data(buildings)
+    return join_zones_to_buildings(buildings, zones)
+
+
+def _aggregate_tile(task):
+    buildings, zones = task
+    return aggregate_zone_data(buildings, zones)
+
+
+def _services_tile(task):
+    school, kindergarten, polyclinic, buildings = task
+    return process_service_data(school, kindergarten, polyclinic, buildings)
+
+
+@instrument
+def process_city_model_tiled(zones, buildings, living_population, living_codes_path="living_codes.json",
+                             tile_size=TILE_SIZE, max_workers=None, balancing_strategy="living_area"):
+    """
+    Тайловый расчёт модели города в пуле процессов.
+
+    Здания делятся между тайлами по внутренней точке (без пересечений); зоны-кандидаты
+    тайла отбираются по центроидам его зданий (как в join_zones_to_buildings), так что
+    вогнутое здание с центроидом вне своего тайла тоже получает зону. Зона относится
+    к тайлу своей внутренней точки и агрегирует все здания, чьи центроиды в неё попали,
+    поэтому агрегаты совпадают с process_city_model. Балансировка
+    населения и перераспределение между зонами выполняются глобально.
+
+    :param zones: GeoDataFrame — территориальные зоны
+    :param buildings: GeoDataFrame — здания
+    :param living_population: int — численность населения города
+    :param living_codes_path: str — путь к living_codes.json
+    :param tile_size: float — сторона тайла в метрах
+    :param max_workers: int — число процессов (по умолчанию — по числу ядер)
+    :param balancing_strategy: str — стратегия population_balancing ("living_area", "floor_weighted")
+    :return: (zones, balanced_buildings)
+    """
+    zones = add_zone_attributes(zones, load_living_codes(living_codes_path))
+    tiles = make_tiles([zones, buildings], tile_size)
+
+    # 1. Подготовка зданий и привязка к зонам по тайлам
+    building_tile = assign_to_tiles(buildings, tiles)
+    zones_index = zones.to_crs(AREA_CRS).sindex
+    centroids = buildings.to_crs(AREA_CRS).geometry.centroid
+
+    def prepare_tasks():
+        for id_tile in tiles["id_tile"]:
+            in_tile = building_tile == id_tile
+            if not in_tile.any():
+                continue
+            zone_idx = zones_index.query(centroids[in_tile].values, predicate="intersects")[1]
+            yield buildings[in_tile], zones.iloc[np.unique(zone_idx)]
+
+    prepared = pd.concat(run_tiles(_prepare_tile, prepare_tasks(), max_workers), ignore_index=True)
+    prepared = gpd.GeoDataFrame(prepared, geometry="geometry", crs=GEO_CRS)
+    print(f"🔹 Подготовлено зданий: {len(prepared)}")
+
+    # 2. Балансировка населения по всему городу
+    balanced_buildings = assign_population_to_buildings(prepared, living_population, balancing_strategy)
+
+    # 3. Агрегация зданий в зоны по тайлам
+    zone_tile = pd.Series(assign_to_tiles(zones, tiles), index=zones["id_zones"])
+    building_owner = balanced_buildings["id_zones"].map(zone_tile)
+
+    def aggregate_tasks():
+        for id_tile in tiles["id_tile"]:
+            tile_zones = zones[zone_tile.to_numpy() == id_tile]
+            if tile_zones.empty:
+                continue
+            yield balanced_buildings[building_owner == id_tile], tile_zones
+
+    aggregated = pd.concat(run_tiles(_aggregate_tile, aggregate_tasks(), max_workers), ignore_index=True)
+    aggregated = aggregated.drop_duplicates("id_zones").set_index("id_zones").loc[zones["id_zones"]].reset_index()
+    aggregated = gpd.GeoDataFrame(aggregated, geometry="geometry", crs=GEO_CRS)
+
+    zones = distribute_population_across_zones(aggregated)
+    return zones, balanced_buildings
+
+
+@instrument
+def process_service_data_tiled(school, kindergarten, polyclinic, balanced_buildings,
+                               tile_size=TILE_SIZE, halo=None, max_workers=None):
+    """
+    Тайловая обработка сервисов: сервисы делятся по тайлам, здания берутся
+    из тайла с зоной перекрытия (по умолчанию — максимальный буфер обслуживания),
+    в пределах которой ищется ближайшее здание для точек вне зданий.
+
+    :return: GeoDataFrame — объединённый слой сервисов
+    """
+    halo = get_halo_size() if halo is None else halo
+    # Служебные столбцы порядка: слой и позиция сервиса в нём — чтобы собрать
+    # результат тайлов в том же порядке строк, что и process_service_data
+    layers = [gdf.to_crs(GEO_CRS).assign(**{LAYER_COL: layer, POSITION_COL: np.arange(len(gdf))})
+              for layer, gdf in enumerate((school, kindergarten, polyclinic))]
+    buildings = balanced_buildings.to_crs(GEO_CRS)
+
+    tiles = make_tiles(layers, tile_size)
+    tiles_halo = expand_tiles(tiles, halo)
+    layer_tiles = [assign_to_tiles(gdf, tiles) for gdf in layers]
+    buildings_index = buildings.to_crs(tiles.crs).sindex
+
+    def service_tasks():
+        for id_tile, halo_geom in zip(tiles["id_tile"], tiles_halo):
+            tile_layers = [gdf[owner == id_tile].copy() for gdf, owner in zip(layers, layer_tiles)]
+            if all(gdf.empty for gdf in tile_layers):
+                continue
+            tile_buildings = buildings.iloc[np.sort(buildings_index.query(halo_geom, predicate="intersects"))]
+            if tile_buildings.empty:
+                continue
+            yield (*tile_layers, tile_buildings)
+
+    combined_service = pd.concat(run_tiles(_services_tile, service_tasks(), max_workers), ignore_index=True)
+
+    # Каждый сервис обработан ровно в одном тайле, поэтому строки не дублируются
+    # (сервис внутри нескольких зданий даёт по строке на здание, как и без тайлов).
+    # Порядок: сначала попавшие в здания, затем привязанные к ближайшему, внутри —
+    # по слою, позиции сервиса и позиции здания
+    build_position = pd.Series(np.arange(len(buildings)), index=buildings["id_build"].to_numpy())
+    order = pd.DataFrame({
+        "nearest": (combined_service["source"] == "nearest").to_numpy(),
+        LAYER_COL: combined_service[LAYER_COL].to_numpy(),
+        POSITION_COL: combined_service[POSITION_COL].to_numpy(),
+        "build": combined_service["id_build"].map(build_position).to_numpy(),
+    })
+    combined_service = combined_service.iloc[order.sort_values(list(order.columns), kind="mergesort").index]
+    combined_service = combined_service.drop(columns=[LAYER_COL, POSITION_COL]).reset_index(drop=True)
+    return gpd.GeoDataFrame(combined_service, geometry="geometry", crs=buildings.crs)
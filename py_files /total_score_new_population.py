@@ -3,30 +3,124 @@
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.cluster import KMeans
 
+from headless import is_headless
+from id_scheme import format_id_columns
+from instrumentation import instrument
+
+# Признаки итогового балла и признаки отрицательного балла для остальных зон
+CORE_COLS = ["new_population", "deficit_density", "difference_from_normative"]
+EXTRA_COLS = ["kindergarten_free_places", "school_employed_places", "polyclinic_free_places"]
+
+# Границы категорий итогового балла и их названия
+SCORE_BOUNDS = (-33, 33)
+SCORE_LABELS = ["низкий потенциал", "средний потенциал", "высокий потенциал"]
+SCORE_DEFAULT = "неопределено"
+
+
+def min_max_scale(values, feature_range=(0, 1)):
+    """
+    Масштабирование столбцов по формуле sklearn.preprocessing.MinMaxScaler (пропуски игнорируются).
+
+    :param values: np.ndarray — матрица признаков (строки × столбцы)
+    :param feature_range: tuple — диапазон результата
+    :return: np.ndarray — масштабированная матрица
+    """
+    values = np.asarray(values, dtype=float)
+    with np.errstate(invalid="ignore"):
+        data_min = np.nanmin(values, axis=0)
+        data_range = np.nanmax(values, axis=0) - data_min
+    data_range[data_range == 0.0] = 1.0
+    scale = (feature_range[1] - feature_range[0]) / data_range
+    return values * scale + (feature_range[0] - data_min * scale)
+
+
+def score_mask(zones: pd.DataFrame) -> pd.Series:
+    """
+    Зоны, для которых считается положительный итоговый балл.
+
+    :param zones: DataFrame с числовыми признаками CORE_COLS
+    :return: pd.Series[bool]
+    """
+    return (
+        (zones["new_population"] > 2) &
+        (zones["deficit_density"] >= 0) &
+        (zones["difference_from_normative"] > 0)
+    )
+
+
+def correlation_weights(corr_matrix: pd.DataFrame) -> pd.Series:
+    """
+    Веса признаков: средняя абсолютная корреляция, нормированная к единице.
+
+    :param corr_matrix: DataFrame — корреляционная матрица признаков
+    :return: pd.Series — веса признаков
+    """
+    mean_corr = corr_matrix.abs().mean()
+    return mean_corr / mean_corr.sum()
+
+
+def positive_score(normalized, weights) -> np.ndarray:
+    """
+    Итоговый балл оцениваемых зон: взвешенная сумма нормированных признаков,
+    приведённая к диапазону 0..100.
+
+    :param normalized: np.ndarray — нормированные признаки CORE_COLS
+    :param weights: веса признаков в порядке CORE_COLS
+    :return: np.ndarray
+    """
+    weights = np.asarray(weights, dtype=float)
+    score = sum(weights[i] * normalized[:, i] for i in range(len(weights)))
+    return np.nan_to_num(min_max_scale(score[:, None], (0, 100))[:, 0], nan=0)
+
+
+def negative_score(extra) -> np.ndarray:
+    """
+    Балл остальных зон: сумма нормированных признаков EXTRA_COLS,
+    приведённая к диапазону -100..0.
+
+    :param extra: np.ndarray — признаки EXTRA_COLS
+    :return: np.ndarray
+    """
+    negative = np.nansum(min_max_scale(extra), axis=1)
+    return min_max_scale(negative[:, None], (-100, 0))[:, 0]
+
+
+def score_category(total_score) -> np.ndarray:
+    """
+    Категория потенциала по итоговому баллу.
+
+    :param total_score: итоговые баллы зон
+    :return: np.ndarray — названия категорий
+    """
+    total_score = np.asarray(total_score, dtype=float)
+    low, high = SCORE_BOUNDS
+    conditions = [
+        (total_score <= low),
+        (total_score > low) & (total_score <= high),
+        (total_score > high),
+    ]
+    return np.select(conditions, SCORE_LABELS, default=SCORE_DEFAULT)
+
+
+@instrument
 def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    from sklearn.cluster import KMeans
+
     zones_0 = living_zones.copy()
 
-    core_cols = ["new_population", "deficit_density", "difference_from_normative"]
-    extra_cols = ["kindergarten_free_places", "school_employed_places", "polyclinic_free_places"]
+    core_cols = CORE_COLS
+    extra_cols = EXTRA_COLS
 
     zones_0[core_cols + extra_cols] = zones_0[core_cols + extra_cols].apply(pd.to_numeric, errors="coerce")
 
-    mask = (
-        (zones_0["new_population"] > 2) &
-        (zones_0["deficit_density"] >= 0) &
-        (zones_0["difference_from_normative"] > 0)
-    )
+    mask = score_mask(zones_0)
 
     zones_to_score = zones_0[mask].copy()
 
-    scaler = MinMaxScaler()
-    for col in core_cols:
-        zones_to_score[f"normalized_{col}"] = scaler.fit_transform(zones_to_score[[col]])
+    normalized = min_max_scale(zones_to_score[core_cols])
+    for i, col in enumerate(core_cols):
+        zones_to_score[f"normalized_{col}"] = normalized[:, i]
 
     # Кластеризация
     kmeans = KMeans(n_clusters=3, random_state=42)
@@ -34,16 +128,10 @@ def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
 
     # Корреляции и веса
     corr_matrix = zones_to_score[core_cols].corr()
-    weights = corr_matrix.abs().mean() / corr_matrix.abs().mean().sum()
+    weights = correlation_weights(corr_matrix)
 
     # Считаем итоговый балл
-    zones_to_score["total_score"] = sum(
-        weights[col] * zones_to_score[f"normalized_{col}"] for col in core_cols
-    )
-
-    zones_to_score["total_score"] = MinMaxScaler(feature_range=(0, 100)).fit_transform(
-        zones_to_score[["total_score"]]
-    )
+    zones_to_score["total_score"] = positive_score(normalized, weights[core_cols])
 
     # Обработка оставшихся зон
     zones_not_to_score = zones_0[~mask].copy()
@@ -53,11 +141,7 @@ def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
         print(f"Отсутствуют следующие колонки: {missing_cols}")
 
     if not missing_cols:
-        zones_not_to_score[extra_cols] = scaler.fit_transform(zones_not_to_score[extra_cols])
-        zones_not_to_score["negative_score"] = zones_not_to_score[extra_cols].sum(axis=1)
-        zones_not_to_score["negative_score"] = MinMaxScaler(feature_range=(-100, 0)).fit_transform(
-            zones_not_to_score[["negative_score"]]
-        )
+        zones_not_to_score["negative_score"] = negative_score(zones_not_to_score[extra_cols])
         zones_not_to_score["total_score"] = zones_not_to_score["negative_score"]
 
     # Объединяем
@@ -65,15 +149,15 @@ def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     zones_0.update(zones_not_to_score[["total_score"]])
 
     # Категории
-    conditions = [
-        (zones_0["total_score"] <= -33),
-        (zones_0["total_score"] > -33) & (zones_0["total_score"] <= 33),
-        (zones_0["total_score"] > 33),
-    ]
-    choices = ["низкий потенциал", "средний потенциал", "высокий потенциал"]
-    zones_0["score_category"] = np.select(conditions, choices, default="неопределено")
+    zones_0["score_category"] = score_category(zones_0["total_score"])
+
+    if is_headless():
+        return zones_0
 
     # Визуализация
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     fig, axs = plt.subplots(1, 2, figsize=(15, 5))
     sns.heatmap(corr_matrix, annot=True, cmap="YlGnBu", fmt=".2f", ax=axs[0])
     axs[0].set_title("Корреляционная матрица признаков")
@@ -87,4 +171,4 @@ def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     return zones_0
 
 def save_to_geojson(gdf: gpd.GeoDataFrame, filename='processed_zones.geojson'):
-    gdf.to_file(filename, driver='GeoJSON')
+    format_id_columns(gdf).to_file(filename, driver='GeoJSON')
@@ -3,12 +3,16 @@
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.cluster import KMeans
 
+from headless import is_headless
+from id_scheme import format_id_columns
+from instrumentation import instrument
+
+@instrument
 def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.cluster import KMeans
+
     zones_dop = living_zones.copy()
 
     # Создаём объединённый столбец
@@ -76,7 +80,13 @@ def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     choices = ["низкий потенциал", "средний потенциал", "высокий потенциал"]
     zones_dop["score_category"] = np.select(conditions, choices, default="неопределено")
 
+    if is_headless():
+        return zones_dop
+
     # Визуализация
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     fig, axs = plt.subplots(1, 2, figsize=(15, 5))
     sns.heatmap(corr_matrix, annot=True, cmap="YlGnBu", fmt=".2f", ax=axs[0])
     axs[0].set_title("Корреляционная матрица признаков")
@@ -90,4 +100,4 @@ def analyze_zones(living_zones: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     return zones_dop
 
 def save_to_geojson(gdf: gpd.GeoDataFrame, filename='processed_zones.geojson'):
-    gdf.to_file(filename, driver='GeoJSON')
+    format_id_columns(gdf).to_file(filename, driver='GeoJSON')
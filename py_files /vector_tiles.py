@@ -0,0 +1,401 @@
+# vector_tiles.py
+
+import gzip
+import json
+import math
+import os
+import sqlite3
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from id_scheme import ID_COLUMNS, format_id_columns, parse_ids
+from instrumentation import collect, instrument, recorded
+from map_rendering import RENDER_CRS, simplify_geometries, zoom_tolerance
+
+# Половина ширины мира в EPSG:3857 (м)
+WORLD_HALF = 20037508.342789244
+# Размер сетки координат тайла и запас по краю (в единицах сетки)
+EXTENT = 4096
+TILE_BUFFER = 64
+
+# Атрибуты по уровням масштаба: для z используется ближайший ключ не больше z
+ZONE_ATTRIBUTES = {
+    0: ["total_score", "score_category"],
+    12: ["id_zones", "city_model", "total_score", "score_category", "need_dop_service"],
+    14: ["id_zones", "city_model", "total_score", "score_category", "need_dop_service",
+         "new_population", "new_population_dop", "sum_population", "deficit_density",
+         "difference_from_normative"],
+}
+VA_ATTRIBUTES = {
+    0: ["city_model"],
+    13: ["city_model", "selected_type_house", "area_va", "total_score"],
+}
+
+_POINT, _LINESTRING, _POLYGON = 1, 2, 3
+
+
+# --- Кодирование Mapbox Vector Tile (protobuf) ---
+
+def _varint(value, out):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field_key(field, wire_type, out):
+    _varint((field << 3) | wire_type, out)
+
+
+def _bytes_field(field, data, out):
+    _field_key(field, 2, out)
+    _varint(len(data), out)
+    out += data
+
+
+def _uint_field(field, value, out):
+    _field_key(field, 0, out)
+    _varint(value, out)
+
+
+def _packed_field(field, values, out):
+    buffer = bytearray()
+    for value in values:
+        _varint(value, buffer)
+    _bytes_field(field, buffer, out)
+
+
+def _encode_value(value):
+    out = bytearray()
+    if isinstance(value, (bool, np.bool_)):
+        _uint_field(7, int(value), out)
+    elif isinstance(value, (int, np.integer)):
+        _uint_field(6, _zigzag(int(value)), out)
+    elif isinstance(value, (float, np.floating)):
+        _field_key(3, 1, out)
+        out += struct.pack("<d", float(value))
+    else:
+        _bytes_field(1, str(value).encode("utf-8"), out)
+    return bytes(out)
+
+
+def _ring_commands(ring, cursor, closed):
+    if closed:
+        ring = ring[:-1]
+    commands = [1 | (1 << 3)]
+    dx, dy = ring[0] - cursor
+    commands += [_zigzag(int(dx)), _zigzag(int(dy))]
+    commands.append(2 | ((len(ring) - 1) << 3))
+    for dx, dy in np.diff(ring, axis=0):
+        commands += [_zigzag(int(dx)), _zigzag(int(dy))]
+    if closed:
+        commands.append(7 | (1 << 3))
+    return commands, ring[-1]
+
+
+def _signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return (np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+
+def _clean_ring(coords):
+    ring = np.round(coords).astype(np.int64)
+    keep = np.ones(len(ring), dtype=bool)
+    keep[1:] = np.any(np.diff(ring, axis=0) != 0, axis=1)
+    ring = ring[keep]
+    if len(ring) < 4 or _signed_area(ring) == 0:
+        return None
+    return ring
+
+
+def _encode_geometry(geom):
+    """
+    Команды геометрии MVT для геометрии в координатах сетки тайла (ось y вниз).
+    Внешние кольца — с положительной площадью, внутренние — с отрицательной.
+    """
+    cursor = np.zeros(2, dtype=np.int64)
+    commands = []
+    type_id = shapely.get_type_id(geom)
+
+    if type_id == 7:
+        # Коллекция после обрезки: оставляем части основного типа
+        parts = shapely.get_parts(geom)
+        types = shapely.get_type_id(parts)
+        main = 3 if (types == 3).any() else 1 if (types == 1).any() else 0
+        geom = shapely.multipolygons(parts[types == 3]) if main == 3 else \
+            shapely.multilinestrings(parts[types == 1]) if main == 1 else shapely.multipoints(parts[types == 0])
+        type_id = shapely.get_type_id(geom)
+
+    if type_id in (3, 6):
+        for polygon in getattr(geom, "geoms", [geom]):
+            exterior = _clean_ring(np.asarray(polygon.exterior.coords))
+            if exterior is None:
+                continue
+            rings = [(exterior, 1)] + [(ring, -1) for ring in
+                                       (_clean_ring(np.asarray(r.coords)) for r in polygon.interiors)
+                                       if ring is not None]
+            for ring, sign in rings:
+                if np.sign(_signed_area(ring)) != sign:
+                    ring = ring[::-1]
+                ring_commands, cursor = _ring_commands(ring, cursor, closed=True)
+                commands += ring_commands
+        return _POLYGON, commands
+
+    if type_id in (0, 4):
+        points = np.round(shapely.get_coordinates(geom)).astype(np.int64)
+        commands.append(1 | (len(points) << 3))
+        for point in points:
+            dx, dy = point - cursor
+            commands += [_zigzag(int(dx)), _zigzag(int(dy))]
+            cursor = point
+        return _POINT, commands
+
+    if type_id in (1, 5):
+        for line in getattr(geom, "geoms", [geom]):
+            coords = np.round(np.asarray(line.coords)).astype(np.int64)
+            if len(coords) < 2:
+                continue
+            line_commands, cursor = _ring_commands(coords, cursor, closed=False)
+            commands += line_commands
+        return _LINESTRING, commands
+
+    return None, []
+
+
+def encode_layer(name, geometries, properties, feature_ids=None):
+    """
+    Кодирование слоя MVT.
+
+    :param name: str — имя слоя
+    :param geometries: list — геометрии в координатах сетки тайла
+    :param properties: list[dict] — атрибуты объектов
+    :param feature_ids: list[int] — идентификаторы объектов (необязательно)
+    :return: bytes — сообщение Layer (пустые байты, если объектов нет)
+    """
+    keys, values = {}, {}
+    features = bytearray()
+    count = 0
+
+    for i, (geom, props) in enumerate(zip(geometries, properties)):
+        geom_type, commands = _encode_geometry(geom)
+        if not commands:
+            continue
+
+        tags = []
+        for key, value in props.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            encoded = _encode_value(value)
+            tags += [keys.setdefault(key, len(keys)), values.setdefault(encoded, len(values))]
+
+        feature = bytearray()
+        if feature_ids is not None and feature_ids[i] is not None:
+            _uint_field(1, int(feature_ids[i]), feature)
+        if tags:
+            _packed_field(2, tags, feature)
+        _uint_field(3, geom_type, feature)
+        _packed_field(4, commands, feature)
+        _bytes_field(2, feature, features)
+        count += 1
+
+    if not count:
+        return b""
+
+    layer = bytearray()
+    _uint_field(15, 2, layer)
+    _bytes_field(1, name.encode("utf-8"), layer)
+    layer += features
+    for key in keys:
+        _bytes_field(3, key.encode("utf-8"), layer)
+    for value in values:
+        _bytes_field(4, value, layer)
+    _uint_field(5, EXTENT, layer)
+    return bytes(layer)
+
+
+# --- Сетка тайлов ---
+
+def tile_bounds(z, x, y):
+    """
+    Границы тайла (minx, miny, maxx, maxy) в EPSG:3857.
+    """
+    size = 2 * WORLD_HALF / 2 ** z
+    minx = -WORLD_HALF + x * size
+    maxy = WORLD_HALF - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tiles_for_bounds(bounds, z):
+    """
+    Тайлы уровня z, покрывающие прямоугольник (minx, miny, maxx, maxy) в EPSG:3857.
+    """
+    size = 2 * WORLD_HALF / 2 ** z
+    last = 2 ** z - 1
+    x0 = min(max(int((bounds[0] + WORLD_HALF) // size), 0), last)
+    x1 = min(max(int((bounds[2] + WORLD_HALF) // size), 0), last)
+    y0 = min(max(int((WORLD_HALF - bounds[3]) // size), 0), last)
+    y1 = min(max(int((WORLD_HALF - bounds[1]) // size), 0), last)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def _to_tile_coords(geoms, bounds):
+    minx, miny, maxx, maxy = bounds
+    scale = EXTENT / (maxx - minx)
+    return shapely.transform(geoms, lambda c: np.column_stack([(c[:, 0] - minx) * scale, (maxy - c[:, 1]) * scale]))
+
+
+def _render_tile(task):
+    z, x, y, layers = task
+    bounds = tile_bounds(z, x, y)
+    margin = (bounds[2] - bounds[0]) * TILE_BUFFER / EXTENT
+
+    tile = bytearray()
+    for name, geoms, properties, feature_ids in layers:
+        clipped = shapely.clip_by_rect(geoms, bounds[0] - margin, bounds[1] - margin,
+                                       bounds[2] + margin, bounds[3] + margin)
+        keep = ~shapely.is_empty(clipped)
+        if not keep.any():
+            continue
+        tile_geoms = _to_tile_coords(clipped[keep], bounds)
+        layer = encode_layer(
+            name,
+            list(tile_geoms),
+            [p for p, k in zip(properties, keep) if k],
+            None if feature_ids is None else [f for f, k in zip(feature_ids, keep) if k],
+        )
+        if layer:
+            _bytes_field(3, layer, tile)
+
+    if not tile:
+        return None
+    return z, x, y, gzip.compress(bytes(tile))
+
+
+# --- Экспорт ---
+
+def _attributes_for_zoom(attributes, z):
+    levels = [level for level in attributes if level <= z]
+    return attributes[max(levels)] if levels else []
+
+
+def _default_attributes(name):
+    return VA_ATTRIBUTES if name.startswith("select_va") else ZONE_ATTRIBUTES
+
+
+def _field_type(series):
+    if series.name in ID_COLUMNS:
+        return "String"
+    if pd.api.types.is_bool_dtype(series):
+        return "Boolean"
+    return "Number" if pd.api.types.is_numeric_dtype(series) else "String"
+
+
+def _prepare_layer(gdf, attributes, z):
+    """
+    Слой для уровня z: упрощение, отбор атрибутов и значения в JSON-совместимых типах.
+    """
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    feature_ids = None
+    id_col = next((col for col in ID_COLUMNS if col in gdf.columns), None)
+    if id_col is not None:
+        feature_ids = [None if pd.isna(v) else int(v) for v in parse_ids(gdf[id_col])]
+
+    columns = [col for col in _attributes_for_zoom(attributes, z) if col in gdf.columns]
+    layer = simplify_geometries(gdf[columns + [gdf.geometry.name]], zoom_tolerance(z))
+    layer = format_id_columns(layer)
+    properties = layer[columns].astype(object).where(layer[columns].notna(), None).to_dict("records")
+    return layer.geometry.values, properties, feature_ids, shapely.STRtree(layer.geometry.values)
+
+
+@instrument
+def export_vector_tiles(layers, path, minzoom=8, maxzoom=14, attributes=None, max_workers=None):
+    """
+    Экспорт слоёв в архив MBTiles (векторные тайлы MVT, gzip) без тайлового сервера.
+    Тайлы генерируются параллельно в пуле процессов.
+
+    :param layers: dict — {имя слоя: GeoDataFrame}, например {"zones_0": zones_0, "select_va_0": select_va_0}
+    :param path: str — путь к файлу .mbtiles (перезаписывается)
+    :param minzoom: int — минимальный уровень масштаба
+    :param maxzoom: int — максимальный уровень масштаба
+    :param attributes: dict — {имя слоя: {уровень: [столбцы]}}; по умолчанию ZONE_ATTRIBUTES / VA_ATTRIBUTES
+    :param max_workers: int — число процессов (1 — последовательно)
+    :return: int — число записанных тайлов
+    """
+    attributes = attributes or {}
+    layers = {name: gdf.to_crs(RENDER_CRS) for name, gdf in layers.items() if gdf is not None and not gdf.empty}
+
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+    """)
+
+    total = 0
+    for z in range(minzoom, maxzoom + 1):
+        prepared = {}
+        tiles = set()
+        for name, gdf in layers.items():
+            prepared[name] = _prepare_layer(gdf, attributes.get(name, _default_attributes(name)), z)
+            tiles.update(tiles_for_bounds(gdf.total_bounds, z))
+
+        tasks = []
+        for x, y in sorted(tiles):
+            bounds = tile_bounds(z, x, y)
+            margin = (bounds[2] - bounds[0]) * TILE_BUFFER / EXTENT
+            query = shapely.box(bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+            tile_layers = []
+            for name, (geoms, properties, feature_ids, tree) in prepared.items():
+                idx = np.sort(tree.query(query, predicate="intersects"))
+                if len(idx):
+                    tile_layers.append((
+                        name, geoms[idx], [properties[i] for i in idx],
+                        None if feature_ids is None else [feature_ids[i] for i in idx],
+                    ))
+            if tile_layers:
+                tasks.append((z, x, y, tile_layers))
+
+        if max_workers == 1:
+            results = map(_render_tile, tasks)
+        else:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+            results = map(collect, executor.map(recorded(_render_tile), tasks, chunksize=max(1, len(tasks) // 64)))
+
+        rows = [(z, x, 2 ** z - 1 - y, data) for z, x, y, data in filter(None, results)]
+        if max_workers != 1:
+            executor.shutdown()
+        connection.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", rows)
+        total += len(rows)
+        print(f"🔹 z{z}: {len(rows)} тайлов")
+
+    bounds = pd.concat([gdf.to_crs(4326).geometry for gdf in layers.values()]).total_bounds
+    vector_layers = []
+    for name, gdf in layers.items():
+        columns = _attributes_for_zoom(attributes.get(name, _default_attributes(name)), maxzoom)
+        fields = {col: _field_type(gdf[col]) for col in columns if col in gdf.columns}
+        vector_layers.append({"id": name, "minzoom": minzoom, "maxzoom": maxzoom, "fields": fields})
+    metadata = {
+        "name": os.path.splitext(os.path.basename(path))[0],
+        "format": "pbf",
+        "minzoom": str(minzoom),
+        "maxzoom": str(maxzoom),
+        "bounds": ",".join(f"{v:.6f}" for v in bounds),
+        "center": f"{(bounds[0] + bounds[2]) / 2:.6f},{(bounds[1] + bounds[3]) / 2:.6f},{minzoom}",
+        "json": json.dumps({"vector_layers": vector_layers}, ensure_ascii=False),
+    }
+    connection.executemany("INSERT INTO metadata VALUES (?, ?)", metadata.items())
+    connection.commit()
+    connection.close()
+
+    print(f"✅ Сохранено тайлов: {total} — {path}")
+    return total
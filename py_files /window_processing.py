@@ -0,0 +1,265 @@
+# window_processing.py
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry.base import BaseGeometry
+
+from check_geojson import LAYERS
+from city_model_processing import (
+    GEO_CRS,
+    load_living_codes,
+    add_zone_attributes,
+    join_zones_to_buildings,
+    aggregate_zone_data,
+    distribute_population_across_zones,
+)
+from service_data_processing import BUFFER_SIZES, process_service_data
+from id_scheme import as_id_key
+from instrumentation import instrument
+
+# Коэффициент увеличения буфера обслуживания (как в calculating_provision и social_infrastructure_mapper)
+BUFFER_FACTOR = 1.2
+# Скорость пешехода для перевода порога времени в расстояние (м/мин, 5 км/ч)
+WALK_SPEED = 5000 / 60
+
+
+def get_halo_size(travel_time_threshold=None):
+    """
+    Ширина зоны захвата вокруг окна (м): максимальный буфер обслуживания
+    или путь, проходимый пешком за порог времени матрицы доступности.
+    Для расчёта обеспеченности здания и сервисы отбираются не по расстоянию,
+    а по самой матрице (select_provision_window).
+    """
+    halo = max(BUFFER_SIZES.values()) * BUFFER_FACTOR
+    if travel_time_threshold:
+        halo = max(halo, travel_time_threshold * WALK_SPEED)
+    return halo
+
+
+def get_window(window):
+    """
+    Приведение окна (путь к файлу, GeoDataFrame, GeoSeries или геометрия в EPSG:4326)
+    к GeoSeries из одной геометрии в GEO_CRS.
+    """
+    if isinstance(window, (str, os.PathLike)):
+        window = gpd.read_file(window)
+    if isinstance(window, BaseGeometry):
+        window = gpd.GeoSeries([window], crs=GEO_CRS)
+    if window.crs is None:
+        window = window.set_crs(GEO_CRS)
+    window = window.to_crs(GEO_CRS)
+    return gpd.GeoSeries([window.union_all()], crs=GEO_CRS)
+
+
+def expand_window(window, halo):
+    """
+    Расширение окна на ширину halo (м) в локальной UTM-проекции.
+    """
+    utm_crs = window.estimate_utm_crs()
+    return window.to_crs(utm_crs).buffer(halo).to_crs(GEO_CRS)
+
+
+def select_window(gdf, window, predicate="intersects"):
+    """
+    Отбор объектов, попадающих в окно, через пространственный индекс слоя.
+    """
+    geom = window.to_crs(gdf.crs).iloc[0]
+    idx = gdf.sindex.query(geom, predicate=predicate)
+    return gdf.iloc[np.sort(idx)]
+
+
+def select_by_point(gdf, window):
+    """
+    Отбор объектов, чья внутренняя точка лежит в окне: каждый объект
+    принадлежит ровно одному окну, даже если пересекает его границу.
+    """
+    points = gdf.geometry.representative_point()
+    idx = points.sindex.query(window.to_crs(gdf.crs).iloc[0], predicate="intersects")
+    return gdf.iloc[np.sort(idx)]
+
+
+def read_layer_window(path, window):
+    """
+    Чтение слоя только в пределах окна: bbox-чтение файла и точная
+    фильтрация по пространственному индексу.
+    """
+    gdf = gpd.read_file(path, bbox=window)
+    if gdf.empty:
+        return gdf
+    return select_window(gdf, window)
+
+
+@instrument
+def load_window_layers(folder, window, halo=None, travel_time_threshold=None):
+    """
+    Загрузка слоёв проекта в пределах окна и зоны захвата.
+
+    :param folder: str — папка со слоями
+    :param window: окно (путь, GeoDataFrame, GeoSeries или геометрия)
+    :param halo: float — ширина зоны захвата в метрах (по умолчанию get_halo_size)
+    :param travel_time_threshold: int — порог времени матрицы доступности, мин
+    :return: dict — {имя слоя: GeoDataFrame}
+    """
+    window = get_window(window)
+    if halo is None:
+        halo = get_halo_size(travel_time_threshold)
+    window_halo = expand_window(window, halo)
+
+    data = {}
+    for name in LAYERS:
+        path = os.path.join(folder, f"{name}.geojson")
+        if name == "boundary" or not os.path.exists(path):
+            continue
+        data[name] = read_layer_window(path, window_halo)
+        print(f"🔹 {name}: {len(data[name])} объектов в окне")
+    return data
+
+
+def merge_window_results(cached, updated, window, id_col):
+    """
+    Замена в кэшированном общегородском слое объектов окна пересчитанными.
+    Принадлежность объекта окну определяется по его внутренней точке;
+    идентификаторы строятся по геометрии, поэтому неизменённые объекты
+    сохраняют свои id.
+    """
+    window = get_window(window)
+    in_window = cached[id_col].isin(select_by_point(cached, window)[id_col])
+    updated = select_by_point(updated.to_crs(cached.crs), window)
+    merged = pd.concat([cached[~in_window], updated], ignore_index=True)
+    return gpd.GeoDataFrame(merged, geometry="geometry", crs=cached.crs)
+
+
+@instrument
+def process_city_model_window(zones, balanced_buildings, window, cached_zones,
+                              living_codes_path="living_codes.json", halo=None):
+    """
+    Пересчёт модели города только для зон окна (например, после изменения ПЗЗ).
+
+    Население зданий берётся из кэшированного расчёта: изменение зонирования
+    не меняет здания, поэтому пересчитываются только привязка зданий к зонам
+    и агрегаты зон окна. Перераспределение населения нежилых зон к ближайшей
+    жилой выполняется по всему городу: ближайшая жилая зона может лежать
+    за пределами окна.
+
+    :param zones: GeoDataFrame — обновлённые территориальные зоны (весь город или окрестность окна)
+    :param balanced_buildings: GeoDataFrame — кэшированные здания с населением
+    :param window: окно пересчёта
+    :param cached_zones: GeoDataFrame — общегородской результат process_city_model
+    :param living_codes_path: str — путь к living_codes.json
+    :param halo: float — ширина зоны захвата в метрах
+    :return: (zones, balanced_buildings) — общегородские слои с обновлённым окном
+    """
+    window = get_window(window)
+    window_halo = expand_window(window, get_halo_size() if halo is None else halo)
+
+    zones_halo = add_zone_attributes(select_window(zones, window_halo), load_living_codes(living_codes_path))
+    print(f"🔹 Зон в окне с зоной захвата: {len(zones_halo)}")
+
+    buildings_halo = select_window(balanced_buildings, window_halo).drop(columns=["id_zones", "city_model"])
+    buildings_halo = join_zones_to_buildings(buildings_halo, zones_halo)
+
+    zones_halo = aggregate_zone_data(buildings_halo, zones_halo)
+
+    zones_out = merge_window_results(cached_zones, zones_halo, window, "id_zones")
+    buildings_out = merge_window_results(balanced_buildings, buildings_halo, window, "id_build")
+
+    # В кэше sum_population уже перераспределено — собственное население зон
+    # восстанавливается по зданиям (как в aggregate_zone_data)
+    own_population = buildings_out.groupby(as_id_key(buildings_out["id_zones"]))["population"].sum().round(2)
+    zones_out["sum_population"] = as_id_key(zones_out["id_zones"]).map(own_population).fillna(0).to_numpy(dtype=float)
+    zones_out = distribute_population_across_zones(zones_out)
+    return zones_out, buildings_out
+
+
+@instrument
+def process_service_data_window(school, kindergarten, polyclinic, balanced_buildings, window,
+                                cached_service, halo=None):
+    """
+    Пересчёт атрибутов сервисов окна с привязкой к зданиям окна и зоны захвата.
+    Результат объединяется с кэшированным общегородским слоем сервисов.
+    """
+    window = get_window(window)
+    window_halo = expand_window(window, get_halo_size() if halo is None else halo)
+
+    layers = [select_by_point(gdf, window).copy() for gdf in (school, kindergarten, polyclinic)]
+    buildings_halo = select_window(balanced_buildings, window_halo)
+
+    combined_service = process_service_data(*layers, buildings_halo)
+    return merge_window_results(cached_service, combined_service, window, "id_service")
+
+
+def select_provision_window(matrix, combined_service, window, thresholds):
+    """
+    Строки и столбцы матрицы для пересчёта обеспеченности сервисов окна:
+    здания, из которых сервисы окна достижимы за порог времени своего типа,
+    и все сервисы, достижимые из этих зданий (они делят тот же спрос).
+
+    :return: (индексы зданий, индексы сервисов окна, индексы всех отобранных сервисов) матрицы
+    """
+    services = combined_service.dropna(subset=["buffer_zone"])
+    services = services[services.index.isin(matrix.columns)]
+    window_index = select_by_point(services, window).index
+
+    rows = pd.Series(False, index=matrix.index)
+    for service_type, group in services.groupby("type"):
+        cols = group.index.intersection(window_index)
+        if len(cols):
+            rows |= (matrix[cols] <= thresholds[service_type]).any(axis=1)
+    rows = matrix.index[rows.to_numpy()]
+
+    cols = [window_index]
+    for service_type, group in services.groupby("type"):
+        reachable = (matrix.loc[rows, group.index] <= thresholds[service_type]).any(axis=0)
+        cols.append(group.index[reachable.to_numpy()])
+    return rows, window_index, cols[0].append(cols[1:]).unique()
+
+
+def merge_by_id(cached, updated, ids, id_col="id_service"):
+    """
+    Замена в кэшированном общегородском слое объектов с идентификаторами ids
+    их пересчитанными версиями.
+    """
+    ids = as_id_key(pd.Series(ids))
+    updated = updated[as_id_key(updated[id_col]).isin(ids).to_numpy()]
+    if cached is None:
+        return updated
+    keep = ~as_id_key(cached[id_col]).isin(ids).to_numpy()
+    merged = pd.concat([cached[keep], updated.to_crs(cached.crs)], ignore_index=True)
+    return gpd.GeoDataFrame(merged, geometry="geometry", crs=cached.crs)
+
+
+@instrument
+def process_services_window(matrix, combined_service, balanced_buildings, window, cached_provision):
+    """
+    Расчёт обеспеченности только для сервисов окна. Матрица доступности
+    сужается до зданий, из которых сервисы окна достижимы за порог времени,
+    и сервисов, достижимых из этих зданий; пороги берутся по всему городу,
+    как в calculating_provision. Промежуточные файлы пишутся во временную папку.
+
+    :param cached_provision: кортеж GeoDataFrame (school, kindergarten, polyclinic) —
+                             общегородской результат calculating_provision
+    :return: кортеж GeoDataFrame: (school, kindergarten, polyclinic) — общегородские слои
+             с пересчитанными сервисами окна
+    """
+    from calculating_provision import get_buffer_threshold, process_services
+
+    window = get_window(window)
+    services = combined_service.dropna(subset=["buffer_zone"])
+    thresholds = {service_type: get_buffer_threshold(group) for service_type, group in services.groupby("type")}
+
+    rows, window_index, cols = select_provision_window(matrix, combined_service, window, thresholds)
+    matrix_halo = matrix.loc[rows, cols]
+    print(f"🔹 Матрица окна: {matrix_halo.shape[0]} зданий × {matrix_halo.shape[1]} сервисов")
+
+    with tempfile.TemporaryDirectory() as output_path:
+        results = process_services(matrix_halo, combined_service.loc[cols], balanced_buildings.loc[rows],
+                                   output_path, thresholds)
+
+    window_ids = combined_service.loc[window_index, "id_service"]
+    return tuple(
+        cached if updated is None else merge_by_id(cached, updated, window_ids)
+        for cached, updated in zip(cached_provision, results)
+    )
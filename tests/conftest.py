@@ -0,0 +1,37 @@
+# conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Модули пайплайна лежат плоско в "py_files ", синтетический город — в benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "py_files "))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_city import generate_city, get_living_population, write_living_codes
+
+
+@pytest.fixture(scope="session")
+def city():
+    """
+    Синтетический город (5 тыс. зданий): здания пересекаются, часть сервисов вне зданий.
+    """
+    return generate_city(5_000, seed=0)
+
+
+@pytest.fixture(scope="session")
+def living_codes_path(tmp_path_factory):
+    return write_living_codes(str(tmp_path_factory.mktemp("codes")))
+
+
+@pytest.fixture(scope="session")
+def city_model(city, living_codes_path):
+    """
+    Результат process_city_model на синтетическом городе: (zones, balanced_buildings).
+    """
+    from city_model_processing import process_city_model
+
+    return process_city_model(city["zones"].copy(), city["buildings"].copy(),
+                              get_living_population(city), living_codes_path)
@@ -0,0 +1,39 @@
+# test_batch_runner.py
+
+import json
+
+import pytest
+
+from batch_runner import REQUIRED_FILES, REQUIRED_LAYERS, run_batch, validate_city_folder
+
+
+def _city_folder(root, skip=()):
+    # Папка города с пустыми файлами: проверка смотрит только на их наличие
+    folder = root / "data_1"
+    folder.mkdir()
+    for name in REQUIRED_FILES + [f"{layer}.geojson" for layer in REQUIRED_LAYERS]:
+        if name not in skip:
+            (folder / name).write_text("{}", encoding="utf-8")
+    (folder / "city_params.json").write_text(json.dumps({"living_population": 1000}), encoding="utf-8")
+    return folder
+
+
+def test_validate_city_folder(tmp_path):
+    folder = _city_folder(tmp_path, skip=("zones.geojson", "living_codes.json"))
+    with pytest.raises(FileNotFoundError, match="living_codes.json, zones.geojson"):
+        validate_city_folder(str(folder))
+
+    (folder / "zones.geojson").write_text("{}", encoding="utf-8")
+    (folder / "living_codes.json").write_text("{}", encoding="utf-8")
+    validate_city_folder(str(folder))
+
+
+def test_run_batch_reports_missing_files(tmp_path):
+    # Город без слоя не отправляется в пул: ошибка фиксируется до загрузки слоёв
+    _city_folder(tmp_path, skip=("buildings.geojson",))
+    score_summary, city_model_summary = run_batch(str(tmp_path), max_workers=1)
+
+    assert score_summary[["city", "status"]].values.tolist() == [["data_1", "error"]]
+    assert "buildings.geojson" in score_summary.loc[0, "error"]
+    assert city_model_summary.empty
+    assert (tmp_path / "result" / "summary_score_stats.csv").exists()
@@ -0,0 +1,63 @@
+# test_id_scheme.py
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import id_scheme
+from id_scheme import format_id_columns, format_ids, make_ids, parse_id_columns, parse_ids
+
+
+def _layer():
+    # Повторяющиеся геометрии с разными атрибутами
+    points = shapely.points([0, 1, 0, 2, 0, 1], [0, 1, 0, 2, 0, 1])
+    return gpd.GeoDataFrame({"name": list("abcdef")}, geometry=points, crs=4326)
+
+
+def test_make_ids_unique():
+    ids = make_ids(_layer(), "school")
+    assert len(set(ids)) == len(ids)
+    assert (ids // id_scheme.PREFIX_BASE == id_scheme.LAYER_PREFIXES["school"]).all()
+
+
+def test_make_ids_geometry_only_layer():
+    layer = _layer()[["geometry"]]
+    ids = make_ids(layer, "green")
+    assert len(set(ids)) == len(ids)
+
+
+def test_make_ids_independent_of_row_order():
+    layer = _layer()
+    expected = pd.Series(make_ids(layer, "school"), index=layer["name"])
+    for seed in range(5):
+        shuffled = layer.sample(frac=1, random_state=seed)
+        result = pd.Series(make_ids(shuffled, "school"), index=shuffled["name"])
+        pd.testing.assert_series_equal(result.loc[expected.index], expected)
+
+
+def test_make_ids_shift_onto_existing_hash(monkeypatch):
+    # Сдвиг при коллизии попадает на хэш другой строки
+    monkeypatch.setattr(id_scheme, "geometry_hash", lambda geometry: np.array([5, 5, 6, 6, 7], dtype=np.uint64))
+    layer = gpd.GeoDataFrame({"name": list("abcde")}, geometry=shapely.points(range(5), range(5)), crs=4326)
+    ids = make_ids(layer, "zones") % id_scheme.PREFIX_BASE
+    assert len(set(ids)) == len(ids)
+    shuffled = layer.iloc[::-1]
+    monkeypatch.setattr(id_scheme, "geometry_hash", lambda geometry: np.array([7, 6, 6, 5, 5], dtype=np.uint64))
+    assert (make_ids(shuffled, "zones")[::-1] % id_scheme.PREFIX_BASE == ids).all()
+
+
+def test_format_parse_roundtrip():
+    ids = pd.Series(make_ids(_layer(), "buildings"))
+    pd.testing.assert_series_equal(parse_ids(format_ids(ids)), ids.astype("Int64"))
+
+
+def test_geojson_roundtrip(tmp_path):
+    # Выгрузка через format_id_columns и обратное чтение сохраняют 64-битные id
+    layer = _layer()
+    layer["id_service"] = make_ids(layer, "school")
+    path = tmp_path / "services.geojson"
+    format_id_columns(layer).to_file(path, driver="GeoJSON")
+
+    restored = parse_id_columns(gpd.read_file(path))
+    pd.testing.assert_series_equal(restored["id_service"], layer["id_service"].astype("Int64"))
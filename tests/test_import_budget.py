@@ -0,0 +1,14 @@
+# test_import_budget.py
+
+from import_budget import HEAVY_MODULES, IMPORT_BUDGET_MS, check_import_budget, measure_import_time
+
+
+def test_import_budget():
+    assert check_import_budget() == []
+
+
+def test_probe_detects_heavy_modules():
+    # Проверка самой пробы: модуль, тянущий тяжёлую зависимость, должен её показать
+    _, heavy = measure_import_time("sklearn")
+    assert "sklearn" in heavy
+    assert set(IMPORT_BUDGET_MS).isdisjoint(HEAVY_MODULES)
@@ -0,0 +1,173 @@
+# test_incremental_recompute.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import city_model_processing as cmp
+from benchmarks.synthetic_city import get_living_population, synthetic_provision
+from calculate_density import calculate_density
+from calculating_potential_populating import calculate_and_update
+from green_analytics_1 import calculate_green_analytics
+from headless import set_headless
+from incremental_recompute import IncrementalModel
+from service_data_processing import process_service_data
+from social_infrastructure_mapper import process_services
+from total_score_new_population import analyze_zones
+
+NUMERIC_COLUMNS = ["sum_population", "sum_living_area", "avg_number_of_floors", "school_free_places",
+                   "kindergarten_employed_places", "polyclinic_id_service", "green_allocated",
+                   "difference_from_normative", "deficit_density", "new_population", "new_population_dop",
+                   "total_score"]
+LABEL_COLUMNS = ["city_model", "score_category", "need_dop_service"]
+# Колонки озеленения, плотности и итогового балла, общие для полного и инкрементального пересчёта
+DERIVED_COLUMNS = ["green_allocated", "green_per_capita", "difference_from_normative", "limit_density",
+                   "area_zone", "density_population", "deficit_density", "total_score"]
+
+
+@pytest.fixture(scope="module")
+def provision(city, city_model):
+    _, balanced_buildings = city_model
+    layers = [city[name].copy() for name in ("school", "kindergarten", "polyclinic")]
+    return synthetic_provision(process_service_data(*layers, balanced_buildings))
+
+
+def run_full(city, zones, buildings, population, living_codes_path, provision, strategy):
+    """
+    Полный прогон пайплайна при неизменной загрузке сервисов (как в IncrementalModel).
+    """
+    set_headless(True)
+    living_zones, balanced = cmp.process_city_model(zones.copy(), buildings.copy(), population,
+                                                    living_codes_path, strategy)
+    layers = [city[name].copy() for name in ("school", "kindergarten", "polyclinic")]
+    combined_service = process_service_data(*layers, balanced)
+    # Радиусы сервисов зависят от city_model зданий
+    school, kindergarten, polyclinic = [
+        layer.assign(buffer_zone=combined_service.loc[layer.index, "buffer_zone"]) for layer in provision
+    ]
+    living_zones = process_services(living_zones, kindergarten, school, polyclinic)
+    living_zones = calculate_green_analytics(city["green"].copy(), city["park"].copy(), living_zones)
+    living_zones = calculate_density(living_zones)
+    living_zones = calculate_and_update(living_zones)
+    return analyze_zones(living_zones)
+
+
+def assert_same_scores(result, expected):
+    assert list(result.index) == list(expected.index)
+    assert list(result.columns) == list(expected.columns)
+    for col in NUMERIC_COLUMNS:
+        np.testing.assert_allclose(pd.to_numeric(result[col], errors="coerce").to_numpy(float),
+                                   pd.to_numeric(expected[col], errors="coerce").to_numpy(float),
+                                   rtol=1e-8, err_msg=col)
+    for col in LABEL_COLUMNS:
+        pd.testing.assert_series_equal(result[col].astype(str), expected[col].astype(str))
+
+
+@pytest.fixture
+def model_inputs(city):
+    # Копии исходных слоёв, которые тест правит параллельно с моделью
+    return city["zones"].copy(), city["buildings"].copy(), get_living_population(city)
+
+
+def _model(city, model_inputs, living_codes_path, provision, strategy):
+    set_headless(True)
+    zones, buildings, population = model_inputs
+    school, kindergarten, polyclinic = provision
+    return IncrementalModel(zones, buildings, population, living_codes_path, city["green"], city["park"],
+                            school, kindergarten, polyclinic, strategy)
+
+
+def test_initial_run_matches_pipeline(city, model_inputs, living_codes_path, provision):
+    model = _model(city, model_inputs, living_codes_path, provision, "living_area")
+    expected = run_full(city, *model_inputs, living_codes_path, provision, "living_area")
+    assert_same_scores(model.zones_0, expected)
+
+
+@pytest.mark.parametrize("strategy", ["living_area", "floor_weighted"])
+def test_zoning_edit_matches_pipeline(city, model_inputs, living_codes_path, provision, strategy):
+    model = _model(city, model_inputs, living_codes_path, provision, strategy)
+    zones, buildings, population = model_inputs
+    ids = model.zones["id_zones"].to_numpy()
+
+    edits = {0: {"city_model": "central"}, 5: {"city_model": None}, 9: {"city_model": "low_rise"}}
+    edits[int(np.flatnonzero(~model.is_living)[0])] = {"code_pzz": "Ж.1"}
+    edits[int(np.flatnonzero(model.is_living)[1])] = {"code_pzz": "П.1"}
+    before = model.zones_0.copy()
+    model.edit_zones({ids[pos]: values for pos, values in edits.items()})
+    for pos, values in edits.items():
+        for col, value in values.items():
+            zones.iat[pos, zones.columns.get_loc(col)] = value
+
+    result = model.update()
+    assert not result["total_score"].equals(before["total_score"])
+    expected = run_full(city, zones, buildings, population, living_codes_path, provision, strategy)
+    assert_same_scores(result, expected)
+
+
+@pytest.mark.parametrize("strategy", ["living_area", "floor_weighted"])
+def test_population_edit_matches_pipeline(city, model_inputs, living_codes_path, provision, strategy):
+    model = _model(city, model_inputs, living_codes_path, provision, strategy)
+    zones, buildings, population = model_inputs
+
+    model.set_living_population(population + 1_234)
+    expected = run_full(city, zones, buildings, population + 1_234, living_codes_path, provision, strategy)
+    assert_same_scores(model.update(), expected)
+
+
+def test_derived_columns_match_full_recompute(city, model_inputs, living_codes_path, provision):
+    model = _model(city, model_inputs, living_codes_path, provision, "living_area")
+    zones, buildings, population = model_inputs
+    ids = model.zones["id_zones"].to_numpy()
+
+    # Смена типа среды и жилого статуса зон вместе с новым населением города
+    edits = {2: {"city_model": "medium"}, 7: {"city_model": "central"}}
+    edits[int(np.flatnonzero(~model.is_living)[1])] = {"code_pzz": "Ж.1"}
+    model.edit_zones({ids[pos]: values for pos, values in edits.items()})
+    for pos, values in edits.items():
+        for col, value in values.items():
+            zones.iat[pos, zones.columns.get_loc(col)] = value
+    model.set_living_population(population - 2_000)
+
+    result = model.update()
+    expected = run_full(city, zones, buildings, population - 2_000, living_codes_path, provision, "living_area")
+    assert list(result.index) == list(expected.index)
+    for col in DERIVED_COLUMNS:
+        np.testing.assert_allclose(result[col].to_numpy(float), expected[col].to_numpy(float),
+                                   rtol=1e-8, err_msg=col)
+    pd.testing.assert_series_equal(result["score_category"].astype(str), expected["score_category"].astype(str))
+
+
+# --- Функции, вынесенные на уровень модулей для IncrementalModel, ведут себя как до выноса ---
+
+def _baseline_fill_city_model(zones):
+    # Заполнение city_model целевых зон в редакции до выноса find_neighbor
+    zones = zones.copy()
+    targets = zones[zones["code_pzz"].isin({"МЦ", "ДУ", "ДС", "ЖР", "Р.1", "Р.2", "Р.3", "СЦ", "УЦ",
+                                            "П.5", "П.6", "П.7"})
+                    & (zones["city_model"].isnull() | (zones["city_model"].str.strip() == ""))]
+    neighbor_zone = zones[zones["city_model"].notnull() & (zones["city_model"] != "")]
+    neighbor_zone = neighbor_zone[neighbor_zone["city_model"].isin({"medium", "low_rise", "central"})]
+    neighbor_zone = neighbor_zone.sort_values("geometry", ascending=False).reset_index(drop=True)
+
+    def find_model(row):
+        buffer_matches = neighbor_zone[neighbor_zone.geometry.intersects(row.geometry.buffer(20))]
+        if not buffer_matches.empty:
+            return buffer_matches.iloc[0]["city_model"]
+        dists = neighbor_zone.geometry.centroid.distance(row.geometry.centroid)
+        return neighbor_zone.loc[dists.idxmin(), "city_model"]
+
+    for _, row in targets.iterrows():
+        zones.loc[row.name, "city_model"] = find_model(row)
+    return zones["city_model"]
+
+
+def test_city_model_fill_unchanged(city, living_codes_path):
+    zones = city["zones"].copy()
+    # Часть целевых зон без модели далеко от источников — проверяется и поиск ближайшей
+    zones.loc[zones.index[:len(zones) // 2], "city_model"] = None
+    zones["code_pzz"] = zones["code_pzz"].astype(str).str.strip().str.upper()
+
+    result = cmp.add_zone_attributes(zones.copy(), cmp.load_living_codes(living_codes_path))
+    expected = _baseline_fill_city_model(zones.to_crs(cmp.GEO_CRS))
+    assert result["city_model"].notna().sum() > zones["city_model"].notna().sum()
+    pd.testing.assert_series_equal(result["city_model"], expected)
@@ -0,0 +1,46 @@
+# test_population_balancing.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from population_balancing import FLOOR_CAPS, balance_population, building_weights, largest_remainder
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("population", [0, 1, 999, 123_457])
+def test_largest_remainder_preserves_sum(seed, population):
+    weights = np.random.default_rng(seed).integers(0, 10_000, 200)
+    result = largest_remainder(weights, population)
+    assert result.dtype == np.int64
+    assert result.sum() == population
+    assert (result >= 0).all()
+    # Каждое здание получает округление своей доли вниз или вверх
+    share = weights * population / weights.sum()
+    assert (np.abs(result - share) < 1).all()
+    assert (result[weights == 0] == 0).all()
+
+
+def test_largest_remainder_ties_follow_building_order():
+    # Равные остатки: лишние жители достаются первым зданиям
+    np.testing.assert_array_equal(largest_remainder(np.array([1, 1, 1, 1]), 6), [2, 2, 1, 1])
+    np.testing.assert_array_equal(largest_remainder(np.array([0, 3, 3, 3]), 2), [0, 1, 1, 0])
+
+
+def test_largest_remainder_needs_positive_weight():
+    with pytest.raises(ValueError):
+        largest_remainder(np.zeros(3, dtype=np.int64), 10)
+
+
+def test_floor_weighted_caps_floors():
+    living = pd.DataFrame({
+        "living_area": [100.0, 100.0],
+        "footprint_area": [100.0, 100.0],
+        "number_of_floors": [20, 20],
+        "city_model": ["low_rise", None],
+    })
+    weights = building_weights(living, "floor_weighted")
+    # Этажность ограничивается только для зданий с city_model
+    np.testing.assert_array_equal(weights, np.array([FLOOR_CAPS["low_rise"], 20]) * 100 * 100)
+    np.testing.assert_array_equal(balance_population(living, 1000, "living_area"), [500, 500])
+    assert balance_population(living, 1000, "floor_weighted").tolist() == [167, 833]
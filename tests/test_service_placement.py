@@ -0,0 +1,112 @@
+# test_service_placement.py
+
+import itertools
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+from shapely.geometry import box
+
+from service_placement import apply_placement, greedy_max_coverage, site_capacity
+
+
+def _coverage(sets, n_zones):
+    rows = [i for i, zones in enumerate(sets) for _ in zones]
+    cols = [j for zones in sets for j in zones]
+    return csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(len(sets), n_zones))
+
+
+def _covered(selected, demand):
+    zones = np.concatenate([covered for _, covered in selected]) if selected else np.empty(0, dtype=int)
+    return demand[zones].sum()
+
+
+def _brute_force(sets, demand, k):
+    return max(demand[list(set().union(*combo))].sum() for combo in itertools.combinations(sets, k))
+
+
+def test_greedy_matches_brute_force():
+    sets = [{0, 1}, {1, 2, 3}, {4}, {3, 4, 5}, {0, 5}]
+    demand = np.array([4.0, 1.0, 2.0, 3.0, 6.0, 5.0])
+    coverage = _coverage(sets, len(demand))
+    for k in (1, 2, 3):
+        assert _covered(greedy_max_coverage(coverage, demand, k), demand) == _brute_force(sets, demand, k)
+
+
+def test_greedy_lazy_equals_eager_and_bound():
+    # Ленивый пересчёт даёт тот же результат, что и полный пересчёт выигрышей на каждом шаге
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        sets = [set(rng.choice(8, rng.integers(1, 4), replace=False)) for _ in range(6)]
+        demand = rng.uniform(1, 10, 8)
+        coverage = _coverage(sets, len(demand))
+
+        # Сравниваются выигрыши шагов: при равных выигрышах кандидаты взаимозаменяемы
+        uncovered, eager = np.ones(len(demand), dtype=bool), []
+        for _ in range(3):
+            gains = [demand[[j for j in s if uncovered[j]]].sum() for s in sets]
+            best = int(np.argmax(gains))
+            if gains[best] <= 0:
+                break
+            eager.append(gains[best])
+            uncovered[list(sets[best])] = False
+
+        selected = greedy_max_coverage(coverage, demand, 3)
+        assert [demand[covered].sum() for _, covered in selected] == pytest.approx(eager)
+        assert _covered(selected, demand) >= (1 - 1 / np.e) * _brute_force(sets, demand, 3)
+
+
+def test_greedy_reevaluates_stale_gain():
+    # После выбора A выигрыш B падает с 25 до 5 (меньше, чем у C) — B возвращается в очередь
+    sets = [{0, 1, 2}, {1, 2, 3}, {4}]
+    demand = np.array([10.0, 10.0, 10.0, 5.0, 12.0])
+    selected = greedy_max_coverage(_coverage(sets, len(demand)), demand)
+
+    assert [i for i, _ in selected] == [0, 2, 1]
+    assert selected[2][1].tolist() == [3]
+
+
+def test_greedy_more_sites_than_candidates():
+    sets = [{0}, {1}, {0, 1}]
+    demand = np.array([1.0, 2.0])
+    coverage = _coverage(sets, len(demand))
+
+    selected = greedy_max_coverage(coverage, demand, max_sites=10)
+    assert [i for i, _ in selected] == [2]
+
+    # Без лучшего кандидата выбираются все остальные, но не больше их числа
+    selected = greedy_max_coverage(coverage, demand, 10, available=np.array([True, True, False]))
+    assert [(i, covered.tolist()) for i, covered in selected] == [(1, [1]), (0, [0])]
+
+
+@pytest.mark.parametrize("service, area, is_integrated, capacity", [
+    ("school", 3000, False, 250),
+    ("school", 5000, False, 600),
+    ("school", 2e9, False, 1100),
+    ("kindergarten", 300, True, 180),
+    ("polyclinic", 900, False, 500),
+])
+def test_site_capacity(service, area, is_integrated, capacity):
+    assert site_capacity(service, area, is_integrated) == capacity
+
+
+def test_apply_placement_updates_provision():
+    living_zones = gpd.GeoDataFrame({
+        "school_free_places": [100.0, 50.0],
+        "kindergarten_free_places": [80.0, 40.0],
+        "polyclinic_free_places": [0.0, 500.0],
+    }, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs=32637)
+    added = pd.DataFrame({"school_free_places": [0, 0], "kindergarten_free_places": [0, 0],
+                          "polyclinic_free_places": [150, 0]}, index=living_zones.index)
+
+    before = apply_placement(living_zones, added * 0)
+    assert before.at[0, "need_dop_service"] == "polyclinic"
+
+    result = apply_placement(living_zones, added)
+    # Зона 0: min(min(100, 80) * 2.8, 150) = 150; зона 1 не меняется
+    assert result.at[0, "new_population"] == 150
+    assert pd.isna(result.at[0, "need_dop_service"])
+    assert result.at[1, "new_population"] == before.at[1, "new_population"] == 112
+    assert living_zones.at[0, "polyclinic_free_places"] == 0
@@ -0,0 +1,90 @@
+# test_social_infrastructure_mapper.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+
+from benchmarks.synthetic_city import generate_matrix, synthetic_provision
+from service_data_processing import process_service_data
+from social_infrastructure_mapper import get_sparse_matrix, network_catchment, process_services
+
+
+def test_sparse_matrix_keeps_reachable_pairs():
+    matrix = pd.DataFrame([[1.5, np.nan, 0.0], [np.inf, 2.0, np.nan]], index=[10, 11], columns=[7, 8, 9])
+    sparse = get_sparse_matrix(matrix)
+
+    assert sparse.format == "csr"
+    # Нулевое время (сервис в самом здании) хранится явно, недостижимые пары — нет
+    coo = sparse.tocoo()
+    stored = sorted(zip(coo.row, coo.col, coo.data))
+    assert stored == [(0, 0, 1.5), (0, 2, 0.0), (1, 1, 2.0)]
+
+
+def test_sparse_matrix_passes_precomputed():
+    sparse = csr_matrix(np.array([[1.0, 0.0], [0.0, 2.0]]))
+    assert get_sparse_matrix(sparse.tocoo()).format == "csr"
+    assert (get_sparse_matrix(sparse) != sparse).nnz == 0
+
+
+@pytest.fixture(scope="module")
+def network_inputs(city, city_model):
+    zones, balanced_buildings = city_model
+    layers = [city[name].copy() for name in ("school", "kindergarten", "polyclinic")]
+    combined_service = process_service_data(*layers, balanced_buildings)
+    school, kindergarten, polyclinic = synthetic_provision(combined_service)
+    matrix = generate_matrix(balanced_buildings, combined_service)
+    # Недостижимые пары — как в матрицах objectnat
+    matrix = matrix.where(matrix <= 20)
+    return zones, kindergarten, school, polyclinic, matrix, balanced_buildings, combined_service
+
+
+def test_network_catchment_with_precomputed_sparse(network_inputs):
+    zones, kindergarten, school, polyclinic, matrix, balanced_buildings, combined_service = network_inputs
+    kwargs = dict(catchment_mode="network", matrix=matrix,
+                  balanced_buildings=balanced_buildings, combined_service=combined_service)
+
+    expected = process_services(zones, kindergarten, school, polyclinic, **kwargs)
+    result = process_services(zones, kindergarten, school, polyclinic,
+                              sparse_matrix=get_sparse_matrix(matrix).tocoo(), **kwargs)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def _small_network():
+    """
+    Три зоны, четыре здания, две школы. Порог школы 100: 500 * 1.2 / 50 = 12 мин,
+    школы 101: 1000 * 1.2 / 50 = 24 мин.
+    """
+    zones = pd.DataFrame({"id_zones": [1, 2, 3]})
+    buildings = pd.DataFrame({"id_zones": [1, 1, 2, 3], "population": [100, 50, 80, 30]}, index=[0, 1, 2, 3])
+    combined_service = pd.DataFrame({"id_service": [100, 101]}, index=[10, 11])
+    services = pd.DataFrame({"id_service": [100, 101], "buffer_zone": [500, 1000],
+                             "carried_capacity_without": [40, 60], "carried_capacity_within": [10, 20]})
+    matrix = pd.DataFrame({10: [5.0, 12.0, 13.0, np.nan],     # 12 мин — ровно на пороге
+                           11: [np.nan, np.nan, 30.0, 20.0]}, index=[0, 1, 2, 3])
+    return services, zones, matrix, buildings, combined_service
+
+
+def test_network_catchment_respects_travel_time():
+    services, zones, matrix, buildings, combined_service = _small_network()
+    result = network_catchment(services, zones, "school", matrix, buildings, combined_service)
+
+    # Зона 1 обслуживается школой 100, зона 2 не достигает ни одной школы за порог, зона 3 — школой 101
+    assert result["school_id_service"].tolist() == [100, pd.NA, 101]
+    assert result["school_free_places"].tolist()[::2] == [40, 60]
+    assert pd.isna(result["school_free_places"].iloc[1])
+
+
+def test_network_catchment_follows_rebuilt_matrix():
+    services, zones, matrix, buildings, combined_service = _small_network()
+    first = network_catchment(services, zones, "school", matrix, buildings, combined_service)
+
+    # Пересобранная матрица с теми же значениями даёт тот же результат
+    rebuilt = pd.DataFrame(matrix.to_numpy().copy(), index=matrix.index.copy(), columns=matrix.columns.copy())
+    pd.testing.assert_frame_equal(
+        network_catchment(services, zones, "school", rebuilt, buildings, combined_service), first)
+
+    # Изменение матрицы на месте (тот же объект) учитывается: зона 2 теперь достигает школы 100
+    matrix.loc[2, 10] = 8.0
+    changed = network_catchment(services, zones, "school", matrix, buildings, combined_service)
+    assert changed["school_id_service"].tolist() == [100, 100, 101]
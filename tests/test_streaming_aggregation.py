@@ -0,0 +1,49 @@
+# test_streaming_aggregation.py
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+
+import city_model_processing as cmp
+from benchmarks.synthetic_city import get_living_population
+from streaming_aggregation import aggregate_zone_data_streaming, iter_building_chunks
+
+
+@pytest.fixture(scope="module")
+def buildings_path(city, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("streaming") / "buildings.gpkg")
+    city["buildings"].to_file(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def zones(city, living_codes_path):
+    return cmp.add_zone_attributes(city["zones"].copy(), cmp.load_living_codes(living_codes_path))
+
+
+def _in_memory(buildings_path, zones, population, strategy):
+    buildings = cmp.prepare_building_data(gpd.read_file(buildings_path))
+    buildings = cmp.join_zones_to_buildings(buildings, zones)
+    balanced = cmp.assign_population_to_buildings(buildings, population, strategy)
+    return cmp.aggregate_zone_data(balanced, zones)
+
+
+@pytest.mark.parametrize("chunk_size", [1_000, 1_234, 10_000])
+def test_chunks_cover_layer(buildings_path, city, chunk_size):
+    sizes = [len(chunk) for chunk in iter_building_chunks(buildings_path, chunk_size)]
+    assert sum(sizes) == len(city["buildings"])
+    assert max(sizes) <= chunk_size
+
+
+# 1_234 не делит число зданий: последняя порция неполная
+@pytest.mark.parametrize("chunk_size", [1_000, 1_234])
+@pytest.mark.parametrize("strategy", ["living_area", "floor_weighted"])
+def test_streaming_matches_in_memory(buildings_path, zones, city, chunk_size, strategy):
+    population = get_living_population(city)
+    expected = _in_memory(buildings_path, zones, population, strategy)
+    result = aggregate_zone_data_streaming(buildings_path, zones, population, strategy, chunk_size=chunk_size)
+
+    pd.testing.assert_frame_equal(pd.DataFrame(result.drop(columns="geometry")),
+                                  pd.DataFrame(expected.drop(columns="geometry")))
+    assert result.geometry.geom_equals_exact(expected.geometry, 0).all()
+    assert result["sum_population"].sum() == population
@@ -0,0 +1,51 @@
+# test_synthetic_city.py
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from benchmarks.run_benchmarks import STAGES
+from benchmarks.synthetic_city import SCALES, generate_city, synthetic_provision, write_living_codes
+from headless import set_headless
+
+PROVISION_STAGE = "calculating_provision.process_services"
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_small_city_reaches_scoring(tmp_path, seed):
+    # Все стадии, кроме objectnat (обеспеченность берётся из synthetic_provision)
+    set_headless(True)
+    city = generate_city(SCALES["1k"], seed=seed)
+    state = {"city": city, "living_codes_path": write_living_codes(str(tmp_path)), "output_path": str(tmp_path)}
+    for name, stage in STAGES:
+        if name == PROVISION_STAGE:
+            state["provision"] = synthetic_provision(state["combined_service"])
+            continue
+        func, args, store = stage(state)
+        store(func(*args))
+
+    zones = state["living_zones"]
+    scored = ((zones["new_population"] > 2) & (zones["deficit_density"] >= 0)
+              & (zones["difference_from_normative"] > 0))
+    assert scored.sum() >= 3
+    assert state["zones_0"]["total_score"].notna().all()
+
+
+def test_benchmark_run_writes_report(tmp_path):
+    # Несовместимый или отсутствующий objectnat не прерывает замер, а отмечается пропуском.
+    # Отдельный процесс: импорт objectnat мешает пулам процессов в остальных тестах
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = os.path.join(root, "benchmarks", "run_benchmarks.py")
+    output = tmp_path / "benchmark_results.json"
+    subprocess.run([sys.executable, script, "--scales", "1k", "--no-memory", "--output", str(output)],
+                   check=True, capture_output=True)
+
+    with open(output, "r", encoding="utf-8") as f:
+        results = json.load(f)["results"]
+    assert [r["stage"] for r in results] == [name for name, _ in STAGES]
+    provision = next(r for r in results if r["stage"] == PROVISION_STAGE)
+    assert provision["status"] == "ok" or provision["error"]
+    assert all(r["status"] == "ok" for r in results if r["stage"] != PROVISION_STAGE)
@@ -0,0 +1,91 @@
+# test_tiled_processing.py
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import box
+from shapely.ops import unary_union
+
+from benchmarks.synthetic_city import BUILD_CRS
+from city_model_processing import process_city_model
+from service_data_processing import process_service_data
+from tiled_processing import (
+    assign_to_tiles,
+    make_tiles,
+    process_city_model_tiled,
+    process_service_data_tiled,
+    run_tiles,
+)
+
+
+def _square(x):
+    return x * x
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_run_tiles_keeps_task_order(max_workers):
+    # Генератор задач длиннее окна задач в пуле
+    assert run_tiles(_square, (i for i in range(25)), max_workers) == [i * i for i in range(25)]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_service_data_tiled_matches_single_process(city, city_model, max_workers):
+    _, balanced_buildings = city_model
+    layers = [city[name] for name in ("school", "kindergarten", "polyclinic")]
+
+    expected = process_service_data(*[gdf.copy() for gdf in layers], balanced_buildings)
+    result = process_service_data_tiled(*[gdf.copy() for gdf in layers], balanced_buildings,
+                                        tile_size=1000, max_workers=max_workers)
+
+    # Сервисы внутри нескольких зданий дают несколько строк — их нельзя терять
+    assert expected["id_service"].duplicated().any()
+    pd.testing.assert_frame_equal(result, expected.reset_index(drop=True))
+
+
+def _strip_city():
+    # Семь зон 1 × 1 км в ряд, по жилому зданию в каждой
+    x0, y0 = 400_000, 6_390_000
+    zones = gpd.GeoDataFrame({"code_pzz": ["Ж.1"] * 7, "city_model": ["medium"] * 7},
+                             geometry=[box(x0 + i * 1000, y0, x0 + (i + 1) * 1000, y0 + 1000) for i in range(7)],
+                             crs=BUILD_CRS)
+    simple = [box(x0 + i * 1000 + 600, y0 + 600, x0 + i * 1000 + 640, y0 + 640) for i in range(7)]
+    # Вогнутое здание: центроид в первой зоне, внутренняя точка — в четвёртой
+    concave = unary_union([box(x0 + 200, y0, x0 + 1500, y0 + 400),
+                           box(x0 + 1500, y0, x0 + 3450, y0 + 5),
+                           box(x0 + 3450, y0, x0 + 3470, y0 + 1000)])
+    buildings = gpd.GeoDataFrame({"is_living": [1] * 8, "number_of_floors": [5.0] * 8},
+                                 geometry=simple + [concave], crs=BUILD_CRS)
+    return zones.to_crs(4326), buildings.to_crs(4326)
+
+
+def test_city_model_tiled_concave_building(living_codes_path):
+    zones, buildings = _strip_city()
+    concave = buildings.geometry.to_crs(BUILD_CRS).iloc[-1]
+    assert concave.centroid.x - 400_000 < 1000 < 3000 < concave.representative_point().x - 400_000
+
+    expected_zones, expected_buildings = process_city_model(zones.copy(), buildings.copy(), 10_000, living_codes_path)
+    result_zones, result_buildings = process_city_model_tiled(zones.copy(), buildings.copy(), 10_000,
+                                                              living_codes_path, tile_size=1000, max_workers=1)
+
+    assert result_buildings["id_zones"].notna().all()
+    pd.testing.assert_series_equal(result_zones.set_index("id_zones")["sum_population"].sort_index(),
+                                   expected_zones.set_index("id_zones")["sum_population"].sort_index())
+
+
+def test_service_data_tiled_single_service(city, city_model):
+    _, balanced_buildings = city_model
+    layers = [city["school"].iloc[:1], city["kindergarten"].iloc[:0], city["polyclinic"].iloc[:0]]
+
+    expected = process_service_data(*[gdf.copy() for gdf in layers], balanced_buildings)
+    result = process_service_data_tiled(*[gdf.copy() for gdf in layers], balanced_buildings, max_workers=1)
+    pd.testing.assert_frame_equal(result, expected.reset_index(drop=True))
+
+
+def test_make_tiles_degenerate_extent(city):
+    point = city["school"].iloc[:1]
+    tiles = make_tiles([point], tile_size=1000)
+    assert len(tiles) == 1
+    assert (assign_to_tiles(point, tiles) == 0).all()
+
+    with pytest.raises(ValueError, match="пусты"):
+        make_tiles([point.iloc[:0], None])
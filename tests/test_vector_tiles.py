@@ -0,0 +1,160 @@
+# test_vector_tiles.py
+
+import gzip
+import math
+import sqlite3
+import struct
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon, box
+
+from id_scheme import format_ids, make_ids
+from vector_tiles import EXTENT, export_vector_tiles
+
+LON, LAT, ZOOM = 39.87, 57.63, 14
+
+
+# --- Минимальный декодер protobuf/MVT для проверки ---
+
+def _varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        result |= (byte & 0x7F) << shift
+        pos += 1
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(data):
+    pos = 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        else:
+            length, pos = _varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        yield field, value
+
+
+def _packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = _varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _decode_value(data):
+    field, value = next(_fields(data))
+    if field == 1:
+        return value.decode("utf-8")
+    if field == 3:
+        return struct.unpack("<d", value)[0]
+    if field == 6:
+        return _unzigzag(value)
+    return bool(value)
+
+
+def _decode_rings(commands):
+    rings, cursor, i = [], [0, 0], 0
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if command == 7:
+            continue
+        for _ in range(count):
+            cursor = [cursor[0] + _unzigzag(commands[i]), cursor[1] + _unzigzag(commands[i + 1])]
+            i += 2
+            if command == 1:
+                rings.append([])
+            rings[-1].append(cursor)
+    return [np.array(ring) for ring in rings]
+
+
+def _decode_tile(blob):
+    layers = {}
+    for field, layer_data in _fields(gzip.decompress(blob)):
+        assert field == 3
+        layer = {"features": [], "keys": [], "values": []}
+        for field, value in _fields(layer_data):
+            if field == 1:
+                layer["name"] = value.decode("utf-8")
+            elif field == 2:
+                layer["features"].append(dict(_fields(value)))
+            elif field == 3:
+                layer["keys"].append(value.decode("utf-8"))
+            elif field == 4:
+                layer["values"].append(_decode_value(value))
+            elif field == 5:
+                layer["extent"] = value
+        layers[layer["name"]] = layer
+    return layers
+
+
+def _signed_area(ring):
+    x, y = ring[:, 0], np.r_[ring[1:, 1], ring[0, 1]]
+    return (np.dot(x, y) - np.dot(np.r_[ring[1:, 0], ring[0, 0]], ring[:, 1])) / 2
+
+
+# --- Тест ---
+
+def _slippy_tile(lon, lat, z):
+    # Номер тайла по схеме XYZ (строки сверху вниз)
+    n = 2 ** z
+    lat = math.radians(lat)
+    return int((lon + 180) / 360 * n), int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+
+
+def test_export_decodes_one_tile(tmp_path):
+    center = gpd.GeoSeries.from_xy([LON], [LAT], crs=4326).to_crs(3857).iloc[0]
+    cx, cy = center.x, center.y
+    with_hole = Polygon(box(cx - 300, cy - 300, cx, cy).exterior.coords,
+                        [box(cx - 200, cy - 200, cx - 100, cy - 100).exterior.coords])
+    square = box(cx + 50, cy + 50, cx + 250, cy + 250)
+    zones = gpd.GeoDataFrame({"total_score": [12.5, 80.0], "score_category": ["low", "low"]},
+                             geometry=[with_hole, square], crs=3857)
+    zones.insert(0, "id_zones", make_ids(zones, "zones"))
+
+    path = str(tmp_path / "zones.mbtiles")
+    attributes = {"zones_0": {0: ["id_zones", "total_score", "score_category"]}}
+    assert export_vector_tiles({"zones_0": zones}, path, ZOOM, ZOOM, attributes, max_workers=1) >= 1
+
+    x, y = _slippy_tile(LON, LAT, ZOOM)
+    with sqlite3.connect(path) as connection:
+        # MBTiles хранит строки по схеме TMS (снизу вверх)
+        blob = connection.execute("SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? "
+                                  "AND tile_row = ?", (ZOOM, x, 2 ** ZOOM - 1 - y)).fetchone()[0]
+    layer = _decode_tile(blob)["zones_0"]
+    assert layer["extent"] == EXTENT
+
+    features = {feature[1]: feature for feature in layer["features"]}
+    assert set(features) == set(int(v) for v in zones["id_zones"])
+    # Одинаковое значение категории хранится в таблице значений один раз
+    assert layer["values"].count("low") == 1
+
+    for row in zones.itertuples():
+        feature = features[int(row.id_zones)]
+        assert feature[3] == 3
+        tags = _packed(feature[2])
+        props = {layer["keys"][k]: layer["values"][v] for k, v in zip(tags[::2], tags[1::2])}
+        assert props == {"id_zones": format_ids(pd.Series([row.id_zones])).iloc[0],
+                         "total_score": row.total_score, "score_category": "low"}
+
+        rings = _decode_rings(_packed(feature[4]))
+        assert len(rings) == len(row.geometry.interiors) + 1
+        # Ось y вниз: внешнее кольцо с положительной площадью, дырки — с отрицательной
+        assert _signed_area(rings[0]) > 0
+        assert all(_signed_area(ring) < 0 for ring in rings[1:])
+        assert rings[0].min() >= 0 and rings[0].max() <= EXTENT
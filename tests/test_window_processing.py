@@ -0,0 +1,32 @@
+# test_window_processing.py
+
+import numpy as np
+import pandas as pd
+
+import city_model_processing as cmp
+from benchmarks.synthetic_city import get_living_population
+from window_processing import process_city_model_window
+
+COLUMNS = ["is_living_zones", "city_model", "sum_living_area", "sum_population"]
+
+
+def _by_id(zones):
+    return pd.DataFrame(zones[["id_zones"] + COLUMNS]).set_index("id_zones").sort_index()
+
+
+def test_window_edit_matches_full_run(city, city_model, living_codes_path):
+    cached_zones, balanced_buildings = city_model
+    population = get_living_population(city)
+
+    # Три жилые зоны становятся нежилыми: их население уходит к ближайшим жилым,
+    # в том числе за пределами окна
+    positions = np.flatnonzero(cached_zones["is_living_zones"].to_numpy())[:3]
+    window = cached_zones.geometry.iloc[positions].union_all()
+    zones = city["zones"].copy()
+    zones.iloc[positions, zones.columns.get_loc("code_pzz")] = "П.1"
+
+    result, _ = process_city_model_window(zones, balanced_buildings, window, cached_zones, living_codes_path)
+    expected, _ = cmp.process_city_model(zones.copy(), city["buildings"].copy(), population, living_codes_path)
+
+    assert result["sum_population"].sum() == population
+    pd.testing.assert_frame_equal(_by_id(result), _by_id(expected), check_dtype=False)